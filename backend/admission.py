@@ -0,0 +1,265 @@
+"""
+准入控制：按客户端限流 + 带优先级的 LLM 并发控制
+
+说明：
+- 每个客户端（按 API Key，没有则按 IP）一个令牌桶，超出速率直接返回 429 和 Retry-After
+- 全局 LLM 并发由 PrioritySemaphore 控制：名额释放时优先交给交互请求，批量/任务排在后面
+- 交互请求的等待队列有上限，已满时不再排队，直接返回 429（批量请求的并发由各自批次限制）
+- 请求优先级通过 contextvar 传递，不需要在各层函数之间逐个传参
+"""
+import asyncio
+import contextvars
+import hashlib
+import heapq
+import hmac
+import itertools
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from starlette.requests import HTTPConnection
+
+from config import (
+    ADMIN_API_KEYS,
+    LLM_MAX_CONCURRENCY,
+    LLM_QUEUE_MAX,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_RPS,
+    TRUST_PROXY_HEADERS,
+)
+from metrics import LLM_ADMISSION_REJECTED, RATE_LIMITED
+
+# 优先级：数值越小越先获得 LLM 名额
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# 当前请求的优先级；批量接口和后台任务在入口处设置为 BATCH
+llm_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+class QueueFullError(Exception):
+    """等待队列已满"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM 等待队列已满，请 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+
+
+class PrioritySemaphore:
+    """按优先级分配名额的信号量，交互请求的等待数有上限"""
+
+    def __init__(self, limit: int, max_interactive_waiting: int, wait_samples: int = 200):
+        self.limit = limit
+        self.max_interactive_waiting = max_interactive_waiting
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._waiting: Dict[int, int] = {INTERACTIVE: 0, BATCH: 0}
+        self._wait_times: Dict[int, Deque[float]] = {INTERACTIVE: deque(maxlen=wait_samples), BATCH: deque(maxlen=wait_samples)}
+        self._hold_times: Deque[float] = deque(maxlen=wait_samples)
+        self._rejected = 0
+
+    def retry_after(self) -> int:
+        """按当前排队数和平均占用时长估算的重试等待（秒）"""
+        hold = sum(self._hold_times) / len(self._hold_times) if self._hold_times else 1.0
+        return max(1, math.ceil((sum(self._waiting.values()) + 1) * hold / self.limit))
+
+    def saturated(self, priority: int = INTERACTIVE) -> bool:
+        """该优先级的新请求是否会被拒绝"""
+        return (
+            priority == INTERACTIVE
+            and self._active >= self.limit
+            and self._waiting[INTERACTIVE] >= self.max_interactive_waiting
+        )
+
+    def check(self, priority: int = INTERACTIVE) -> None:
+        """该优先级的请求已无法排队时抛出 QueueFullError"""
+        if self.saturated(priority):
+            self._rejected += 1
+            LLM_ADMISSION_REJECTED.inc()
+            raise QueueFullError(self.retry_after())
+
+    async def acquire(self, priority: int = INTERACTIVE) -> float:
+        """获取名额，返回排队等待的秒数；交互队列已满时抛出 QueueFullError"""
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            self._wait_times[priority].append(0.0)
+            return 0.0
+        self.check(priority)
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._waiting[priority] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名额已经分配给了本请求，转交给下一个
+                self.release()
+            raise
+        finally:
+            self._waiting[priority] -= 1
+        waited = time.monotonic() - started
+        self._wait_times[priority].append(waited)
+        return waited
+
+    def release(self, held: Optional[float] = None) -> None:
+        """归还名额并唤醒优先级最高的等待者；held 为占用时长（秒），用于估算 Retry-After"""
+        if held is not None:
+            self._hold_times.append(held)
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE) -> AsyncIterator[None]:
+        """async with 形式：进入时获取名额，退出时归还"""
+        await self.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, object]:
+        """当前占用、各优先级的排队数和最近等待时间（毫秒）"""
+
+        def percentile(samples: Deque[float], q: float) -> Optional[float]:
+            if not samples:
+                return None
+            ordered = sorted(samples)
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 1)
+
+        return {
+            "limit": self.limit,
+            "active": self._active,
+            "max_interactive_waiting": self.max_interactive_waiting,
+            "rejected": self._rejected,
+            "queues": {
+                PRIORITY_NAMES[priority]: {
+                    "waiting": self._waiting[priority],
+                    "wait_ms_p50": percentile(self._wait_times[priority], 0.5),
+                    "wait_ms_p95": percentile(self._wait_times[priority], 0.95),
+                }
+                for priority in (INTERACTIVE, BATCH)
+            },
+        }
+
+
+class TokenBucketLimiter:
+    """按客户端的令牌桶限流；只保留最近活跃的 max_clients 个客户端"""
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._stats: Dict[str, int] = {"allowed": 0, "limited": 0}
+
+    def acquire(self, client: str, cost: float = 1.0) -> float:
+        """消耗令牌；允许时返回 0，否则返回需要等待的秒数"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(client, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        if tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+            self._stats["allowed"] += 1
+        else:
+            wait = (cost - tokens) / self.rate
+            self._stats["limited"] += 1
+        self._buckets[client] = (tokens, now)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> Dict[str, object]:
+        return {"rate": self.rate, "burst": self.burst, "clients": len(self._buckets), **self._stats}
+
+
+def request_api_key(request: HTTPConnection) -> Optional[str]:
+    """请求携带的 API Key：X-API-Key 或 Authorization: Bearer"""
+    api_key = request.headers.get("x-api-key")
+    authorization = request.headers.get("authorization", "")
+    if not api_key and authorization.lower().startswith("bearer "):
+        api_key = authorization[7:].strip()
+    return api_key or None
+
+
+def is_admin(request: Request) -> bool:
+    """请求是否携带管理员 API Key"""
+    api_key = request_api_key(request)
+    if not api_key:
+        return False
+    return any(hmac.compare_digest(api_key.encode("utf-8"), key.encode("utf-8")) for key in ADMIN_API_KEYS)
+
+
+def client_key(request: HTTPConnection) -> str:
+    """限流使用的客户端标识：API Key（只保留摘要）或 IP；HTTP 请求和 WebSocket 连接通用"""
+    api_key = request_api_key(request)
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return "ip:" + forwarded.split(",")[0].strip()
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+def too_many_requests(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+# 进程内共享实例；RATE_LIMIT_RPS=0（默认）时不限流
+llm_slots = PrioritySemaphore(LLM_MAX_CONCURRENCY, LLM_QUEUE_MAX)
+rate_limiter: Optional[TokenBucketLimiter] = (
+    TokenBucketLimiter(RATE_LIMIT_RPS, RATE_LIMIT_BURST) if RATE_LIMIT_RPS > 0 else None
+)
+
+
+async def admit_client(request: Request) -> None:
+    """FastAPI 依赖：按客户端限流，超出时返回 429"""
+    if rate_limiter is None:
+        return
+    wait = rate_limiter.acquire(client_key(request))
+    if wait > 0:
+        RATE_LIMITED.inc()
+        raise too_many_requests("请求过于频繁，请稍后重试", wait)
+
+
+def admit_connection(connection: HTTPConnection) -> float:
+    """WebSocket 握手时按一次请求限流，返回需要等待的秒数（0 表示放行）"""
+    if rate_limiter is None:
+        return 0.0
+    wait = rate_limiter.acquire(client_key(connection))
+    if wait > 0:
+        RATE_LIMITED.inc()
+    return wait
+
+
+def ensure_llm_capacity() -> None:
+    """交互请求需要调用 LLM 前检查排队情况，队列已满时返回 429（不再排队等待）"""
+    try:
+        llm_slots.check(llm_priority.get())
+    except QueueFullError as e:
+        raise too_many_requests("LLM 繁忙，请稍后重试", e.retry_after)
+
+
+def admission_stats() -> Dict[str, object]:
+    """LLM 排队情况和限流统计（调试端点使用）"""
+    return {
+        "llm": llm_slots.stats(),
+        "rate_limit": rate_limiter.stats() if rate_limiter is not None else None,
+    }
@@ -0,0 +1,287 @@
+"""
+评分引擎与 API 的基准测试
+
+说明：
+- 合成脚本由信号词、普通汉字和标点拼接，长度 10-5000，信号词密度分 low/medium/high 三档；固定随机种子，结果可复现
+- rules：逐条调用 score_by_rules，统计每种长度/密度下的吞吐（最快一轮）、总耗时和各阶段（断句、三个维度、证据、响应构造）
+  耗时的 p50/p99；阶段耗时通过 profiling.stage_profile 取得
+- api：进程内 ASGI 客户端并发调用 /api/analyze（规则引擎、不读缓存、不限流），统计吞吐和延迟分位数，
+  以及响应序列化的平均耗时和占服务端请求耗时的比例（serialize_share，取自 response_serialize_seconds 和
+  http_request_duration_seconds）。只发送能正常评分的脚本（校验不通过返回 400、引擎异常返回 500 的事先剔除，
+  数量记在 excluded_texts），吞吐和延迟只统计 200 响应
+- 结果写成 JSON；指定 --baseline 时与之前的结果逐项比较，超过阈值的退化会列出并以退出码 1 结束。
+  各阶段的 p99 只记录不比较：亚毫秒级的阶段偶尔一次调度抖动就会让 p99 翻几倍
+- 规则引擎对部分输入会抛出异常（只有一条优化方向时响应校验失败），rules 中这些调用计入 errors，耗时照常统计
+
+用法：
+    python benchmark.py --output bench.json
+    python benchmark.py --output new.json --baseline bench.json --max-regression 0.15
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 只测规则引擎路径：在导入 config 之前关闭 LLM 和限流
+os.environ["ENABLE_LLM"] = "false"
+os.environ["LLM_ENABLED"] = "false"
+os.environ["RATE_LIMIT_RPS"] = "0"
+
+from profiling import stage_profile  # noqa: E402
+from scorer_rules import score_by_rules  # noqa: E402
+from synthetic import percentile, signal_words, synthetic_script  # noqa: E402
+
+LENGTHS = (10, 50, 200, 1000, 2000, 5000)
+# 每个片段是信号词的概率
+DENSITIES = {"low": 0.02, "medium": 0.08, "high": 0.2}
+
+
+def synthetic_corpus(seed: int, per_case: int) -> Dict[Tuple[int, str], List[str]]:
+    """每种（长度, 密度）组合生成 per_case 条脚本"""
+    rng = random.Random(seed)
+    words = signal_words()
+    return {
+        (length, name): [synthetic_script(rng, length, density, words) for _ in range(per_case)]
+        for length in LENGTHS
+        for name, density in DENSITIES.items()
+    }
+
+
+def _latency_summary(samples: Sequence[float]) -> Dict[str, Optional[float]]:
+    """秒 -> 毫秒的 p50/p99"""
+    p50, p99 = percentile(samples, 0.5), percentile(samples, 0.99)
+    return {
+        "p50_ms": round(p50 * 1000, 4) if p50 is not None else None,
+        "p99_ms": round(p99 * 1000, 4) if p99 is not None else None,
+    }
+
+
+def bench_rules(texts: List[str], repeat: int) -> Dict[str, object]:
+    """
+    逐条评分 repeat 轮，返回吞吐、总耗时和各阶段耗时。
+    吞吐取最快一轮（与 timeit 相同，减少机器上其他负载的干扰），分位数使用全部样本
+    """
+    totals: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    rounds: List[float] = []
+    errors = 0
+    gc.collect()
+    for _ in range(repeat):
+        round_started = time.perf_counter()
+        for text in texts:
+            timings: Dict[str, float] = {}
+            token = stage_profile.set(timings)
+            started = time.perf_counter()
+            try:
+                score_by_rules(text)
+            except Exception:  # noqa: BLE001
+                errors += 1
+            totals.append(time.perf_counter() - started)
+            stage_profile.reset(token)
+            for stage, seconds in timings.items():
+                stages.setdefault(stage, []).append(seconds)
+        rounds.append(time.perf_counter() - round_started)
+
+    return {
+        "calls": len(totals),
+        "errors": errors,
+        "throughput_per_s": round(len(texts) / min(rounds), 1),
+        **_latency_summary(totals),
+        "stages": {stage: _latency_summary(samples) for stage, samples in stages.items()},
+    }
+
+
+def _api_scorable(texts: List[str]) -> List[str]:
+    """剔除 /api/analyze 不会返回 200 的脚本：与接口相同的文本校验，再用规则引擎评分一次"""
+    from main import validate_script_text
+
+    scorable = []
+    for text in texts:
+        try:
+            score_by_rules(validate_script_text(text))
+        # 校验不通过（HTTPException）或规则引擎异常
+        except Exception:  # noqa: BLE001
+            continue
+        scorable.append(text)
+    return scorable
+
+
+async def _bench_api(texts: List[str], requests: int, concurrency: int) -> Dict[str, object]:
+    import httpx
+
+    from main import app
+    from metrics import HTTP_REQUEST_SECONDS, RESPONSE_SERIALIZE_SECONDS
+
+    scorable = _api_scorable(texts)
+    latencies: List[float] = []
+    status_counts: Dict[str, int] = {}
+    next_index = iter(range(requests))
+
+    async def worker(client: "httpx.AsyncClient") -> None:
+        for index in next_index:
+            body = {"text": scorable[index % len(scorable)], "use_cache": False}
+            started = time.perf_counter()
+            resp = await client.post("/api/analyze", json=body)
+            if resp.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            status_counts[str(resp.status_code)] = status_counts.get(str(resp.status_code), 0) + 1
+
+    # 万一仍有请求失败，计入 status_counts 而不是中断测试，也不计入吞吐和延迟
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        # 预热：导入、首次编译等不计入结果
+        await client.post("/api/analyze", json={"text": scorable[0], "use_cache": False})
+        serialize_before = RESPONSE_SERIALIZE_SECONDS.total(route="/api/analyze")
+        request_before = HTTP_REQUEST_SECONDS.total(route="/api/analyze")
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        serialize_count, serialize_seconds = (
+            after - before for after, before in zip(RESPONSE_SERIALIZE_SECONDS.total(route="/api/analyze"), serialize_before)
+        )
+        request_seconds = HTTP_REQUEST_SECONDS.total(route="/api/analyze")[1] - request_before[1]
+
+    p90 = percentile(latencies, 0.9)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "excluded_texts": len(texts) - len(scorable),
+        "status_counts": status_counts,
+        "throughput_per_s": round(len(latencies) / elapsed, 1),
+        **_latency_summary(latencies),
+        "p90_ms": round(p90 * 1000, 4) if p90 is not None else None,
+        "serialize_mean_ms": round(serialize_seconds / serialize_count * 1000, 4) if serialize_count else None,
+        "serialize_share": round(serialize_seconds / request_seconds, 4) if request_seconds else None,
+    }
+
+
+def bench_api(texts: List[str], requests: int, concurrency: int) -> Dict[str, object]:
+    """进程内调用 /api/analyze（规则引擎）"""
+    return asyncio.run(_bench_api(texts, requests, concurrency))
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(results: Dict[str, object], prefix: str = "") -> Dict[str, float]:
+    """把结果展平为 {路径: 数值}，只保留吞吐和延迟指标"""
+    flat: Dict[str, float] = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and (key == "throughput_per_s" or key.endswith("_ms")):
+            flat[path] = float(value)
+    return flat
+
+
+def compare(
+    baseline: Dict[str, object],
+    current: Dict[str, object],
+    max_regression: float,
+    max_p99_regression: float,
+    min_ms: float,
+) -> List[str]:
+    """
+    与基线比较，返回超过阈值的退化描述：
+
+    - 吞吐下降超过 max_regression
+    - p50/p90 增加超过 max_regression，p99 增加超过 max_p99_regression
+    - 基线低于 min_ms 的延迟项和各阶段的 p99 噪声太大，不参与比较
+    """
+    old, new = _flatten(baseline["results"]), _flatten(current["results"])
+    regressions = []
+    for path in sorted(old.keys() & new.keys()):
+        before, after = old[path], new[path]
+        if path.endswith("throughput_per_s"):
+            change = (before - after) / before if before else 0.0
+            limit = max_regression
+        else:
+            if before < min_ms or (".stages." in path and path.endswith("p99_ms")):
+                continue
+            change = (after - before) / before
+            limit = max_p99_regression if path.endswith("p99_ms") else max_regression
+        if change > limit:
+            regressions.append(f"{path}: {before} -> {after}（退化 {change:.0%}，阈值 {limit:.0%}）")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="评分引擎与 /api/analyze 的基准测试")
+    parser.add_argument("--output", help="结果 JSON 文件；不指定时打印到标准输出")
+    parser.add_argument("--baseline", help="对比的基线结果 JSON")
+    parser.add_argument("--seed", type=int, default=0, help="合成脚本的随机种子")
+    parser.add_argument("--per-case", type=int, default=30, help="每种长度/密度生成的脚本数")
+    parser.add_argument("--repeat", type=int, default=5, help="规则引擎每条脚本评分的轮数")
+    parser.add_argument("--api-requests", type=int, default=600, help="/api/analyze 请求总数，0 表示跳过")
+    parser.add_argument("--api-concurrency", type=int, default=8, help="/api/analyze 并发数")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="吞吐、p50 允许的退化比例")
+    parser.add_argument("--max-p99-regression", type=float, default=0.30, help="p99 允许的退化比例")
+    parser.add_argument("--min-ms", type=float, default=0.5, help="基线低于该值（毫秒）的延迟项不比较")
+    args = parser.parse_args(argv)
+
+    # 规则引擎的部分输入会抛出校验异常，API 端会记录错误日志，基准测试中不输出
+    logging.disable(logging.ERROR)
+
+    corpus = synthetic_corpus(args.seed, args.per_case)
+    all_texts = [text for texts in corpus.values() for text in texts]
+    # 预热：信号匹配器、Pydantic 校验器等首次调用开销不计入结果
+    bench_rules(all_texts[: len(DENSITIES) * args.per_case], 1)
+
+    results: Dict[str, object] = {"rules": {}}
+    for (length, density), texts in corpus.items():
+        results["rules"][f"{length}/{density}"] = bench_rules(texts, args.repeat)
+        print(f"rules {length}/{density}: {results['rules'][f'{length}/{density}']['throughput_per_s']} 条/秒", file=sys.stderr)
+    results["rules_all"] = bench_rules(all_texts, 1)
+    if args.api_requests > 0:
+        results["api"] = bench_api(all_texts, args.api_requests, args.api_concurrency)
+        print(f"api: {results['api']['throughput_per_s']} 请求/秒", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        regressions = compare(baseline, report, args.max_regression, args.max_p99_regression, args.min_ms)
+        for line in regressions:
+            print(f"退化：{line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"与基线 {baseline['meta'].get('commit')} 相比没有超过阈值的退化", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
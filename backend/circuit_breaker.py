@@ -0,0 +1,166 @@
+"""
+上游熔断器与自适应超时
+
+说明：
+- 最近 window 次调用中失败（HTTP 错误/超时）比例超过阈值时打开熔断器，
+  打开期间直接跳过上游，调用方立即回退到规则引擎
+- 打开 open_seconds 秒后进入半开状态，只放行少量试探调用：
+  试探成功则关闭，失败则重新打开
+- allow() 放行时返回本次调用的凭据（放行时所处状态阶段的编号），每次调用都必须以
+  record_success / record_failure / release 之一结束并带上该凭据；
+  被取消或在排队阶段就放弃的调用在 finally 中调用 release，归还半开状态的试探名额。
+  调用方遗漏时，超过 max_timeout + open_seconds 仍未结束的试探也会作废，熔断器不会停在半开状态
+- 半开状态只认本阶段放行的试探：打开之前放行、之后才结束的调用，结果不改变状态，也不占用或归还试探名额
+- 调用总时长上限（timeout()）根据最近成功调用的 p95 总耗时自适应调整，并限制在 [min_timeout, max_timeout] 之间
+"""
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """基于失败率的熔断器"""
+
+    def __init__(
+        self,
+        failure_rate: float,
+        min_calls: int,
+        window: int,
+        open_seconds: float,
+        half_open_calls: int,
+        min_timeout: float,
+        max_timeout: float,
+        timeout_multiplier: float,
+        latency_samples: int = 100,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+
+        self.state = CLOSED
+        # 状态每变化一次加一；allow() 返回放行时的编号，用来识别跨越状态变化的旧调用
+        self._phase = 0
+        self._outcomes: Deque[bool] = deque(maxlen=window)  # True 表示失败
+        self._latencies: Deque[float] = deque(maxlen=latency_samples)
+        self._opened_at = 0.0
+        # 半开状态下已放行、尚未结束的试探调用的开始时间
+        self._trials: Deque[float] = deque()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"success": 0, "error": 0, "timeout": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> Optional[int]:
+        """是否允许本次调用上游：放行时返回凭据（传给 record_* / release），返回 None 时调用方应直接回退"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self._counters["rejected"] += 1
+                    return None
+                self._set_state(HALF_OPEN)
+                self._trials.clear()
+            if self.state == HALF_OPEN:
+                self._expire_trials()
+                if len(self._trials) >= self.half_open_calls:
+                    self._counters["rejected"] += 1
+                    return None
+                self._trials.append(time.monotonic())
+            return self._phase
+
+    def release(self, ticket: int) -> None:
+        """
+        放弃一次已放行的调用（没有得到上游结果：被取消、排队时被拒绝等），不计入成功或失败。
+
+        本阶段放行的半开试探归还一个试探名额；其他情况无需处理。
+        """
+        with self._lock:
+            if self._is_trial(ticket) and self._trials:
+                self._trials.popleft()
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        self._phase += 1
+
+    def _is_trial(self, ticket: int) -> bool:
+        """凭据是否为当前半开阶段放行的试探"""
+        return self.state == HALF_OPEN and ticket == self._phase
+
+    def _expire_trials(self) -> None:
+        """作废超时仍未结束的试探（调用方没有调用 record_* 或 release 时的兜底）"""
+        deadline = time.monotonic() - (self.max_timeout + self.open_seconds)
+        while self._trials and self._trials[0] < deadline:
+            self._trials.popleft()
+
+    def record_success(self, ticket: int, latency: float) -> None:
+        """记录一次成功调用及其总耗时（秒）"""
+        with self._lock:
+            self._counters["success"] += 1
+            self._latencies.append(latency)
+            if self.state == OPEN:
+                return
+            if self.state == HALF_OPEN:
+                if not self._is_trial(ticket):
+                    # 打开之前放行的调用：试探尚未有结果，不能据此关闭
+                    return
+                self._set_state(CLOSED)
+                self._outcomes.clear()
+            self._outcomes.append(False)
+
+    def record_failure(self, ticket: int, kind: str = "error") -> None:
+        """记录一次失败调用，kind 为 error 或 timeout"""
+        with self._lock:
+            self._counters[kind] = self._counters.get(kind, 0) + 1
+            if self.state == OPEN:
+                # 打开之前已发出的调用，结果不再计入窗口
+                return
+            if self.state == HALF_OPEN:
+                if self._is_trial(ticket):
+                    self._open()
+                return
+            self._outcomes.append(True)
+            if len(self._outcomes) >= self.min_calls and self._current_failure_rate() >= self.failure_rate:
+                self._open()
+
+    def _open(self) -> None:
+        self._set_state(OPEN)
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._counters["opened"] += 1
+
+    def _current_failure_rate(self) -> float:
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def p95_latency(self) -> Optional[float]:
+        """最近成功调用的 p95 延迟（秒），样本不足时返回 None"""
+        if len(self._latencies) < self.min_calls:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def timeout(self) -> float:
+        """本次调用的总时长上限（秒），与 p95 统计的总耗时口径一致"""
+        p95 = self.p95_latency()
+        if p95 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.timeout_multiplier))
+
+    def snapshot(self) -> dict:
+        """当前状态，用于调试端点和监控"""
+        with self._lock:
+            failure_rate = self._current_failure_rate()
+        p95 = self.p95_latency()
+        return {
+            "state": self.state,
+            "failure_rate": round(failure_rate, 3),
+            "window_calls": len(self._outcomes),
+            "p95_latency_s": round(p95, 3) if p95 is not None else None,
+            "call_timeout_s": round(self.timeout(), 3),
+            **self._counters,
+        }
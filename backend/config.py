@@ -17,9 +17,87 @@ ENABLE_LLM = (
 LLM_API_KEY = os.getenv("QWEN_API_KEY") or os.getenv("LLM_API_KEY", "")
 LLM_API_URL = os.getenv("LLM_API_URL", "")
 
+# LLM 上游调用参数：连接/读取超时（秒）、连接池大小、并发上限
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "40"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# 异步路径是否使用增量输出（SSE）边接收边解析
+LLM_STREAM = os.getenv("LLM_STREAM", "true").lower() == "true"
+
+# LLM 熔断器：最近 BREAKER_WINDOW 次调用中失败率达到阈值（且至少 BREAKER_MIN_CALLS 次）时打开，
+# 打开 BREAKER_OPEN_SECONDS 秒后放行 BREAKER_HALF_OPEN_CALLS 次试探调用
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "50"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "1"))
+# 自适应调用总时长上限 = p95 总耗时 × 倍数，限制在 [LLM_MIN_READ_TIMEOUT, LLM_READ_TIMEOUT] 之间
+LLM_MIN_READ_TIMEOUT = float(os.getenv("LLM_MIN_READ_TIMEOUT", "5"))
+LLM_TIMEOUT_P95_MULTIPLIER = float(os.getenv("LLM_TIMEOUT_P95_MULTIPLIER", "1.5"))
+# LLM 结果的默认截止时间（毫秒）：超时先返回规则引擎结果（前端请求超时为 10 秒）
+LLM_DEADLINE_MS = int(os.getenv("LLM_DEADLINE_MS", "8000"))
+
+# 流式接口（SSE）心跳间隔（秒）
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "10"))
+# 实时评分会话（WebSocket）：停止输入多久后发起 LLM 评分（毫秒）、同时在线的会话上限
+LIVE_LLM_IDLE_MS = int(os.getenv("LIVE_LLM_IDLE_MS", "1500"))
+LIVE_MAX_SESSIONS = int(os.getenv("LIVE_MAX_SESSIONS", "200"))
+
+# 结果缓存：内存 LRU（条目上限 + TTL），可选 SQLite 持久层（留空则不启用）
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2000"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "86400"))
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "")
+# 近似重复复用（仅 LLM 模式）：与最近 LLM 评分过的脚本的 3-gram Jaccard 相似度不低于阈值、
+# 且开头和结尾各 NEAR_DUP_EDGE_CHARS 个字符未改动时复用其结果；索引最多保留 NEAR_DUP_MAX_ENTRIES 条
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "true").lower() == "true"
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.9"))
+NEAR_DUP_EDGE_CHARS = int(os.getenv("NEAR_DUP_EDGE_CHARS", "50"))
+NEAR_DUP_MAX_ENTRIES = int(os.getenv("NEAR_DUP_MAX_ENTRIES", "1000"))
+
+# 批量评分：单次请求条目上限、规则引擎进程数（0 表示不使用进程池）、每个批次同时进行的 LLM 调用数
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+RULE_WORKERS = int(os.getenv("RULE_WORKERS", str(os.cpu_count() or 1)))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
+# 异步任务：SQLite 文件、worker 数、排队上限、结果保留时间（秒）、租约时长（秒）、最多执行次数、
+# 长轮询最长等待（秒）、任务中 LLM 结果的默认截止时间（毫秒，任务不受前端超时限制）
+# SQLite 文件默认放在 backend/data/ 下，与启动时的工作目录无关
+JOBS_SQLITE_PATH = os.getenv("JOBS_SQLITE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "jobs.db")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", "1000"))
+JOBS_TTL_SECONDS = float(os.getenv("JOBS_TTL_SECONDS", "86400"))
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "60"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+JOBS_MAX_WAIT_SECONDS = float(os.getenv("JOBS_MAX_WAIT_SECONDS", "30"))
+JOBS_LLM_DEADLINE_MS = int(os.getenv("JOBS_LLM_DEADLINE_MS", "60000"))
+# 准入控制：LLM 交互请求等待队列上限（超出直接 429）、每个客户端的令牌桶速率（次/秒，默认 0 不限流）和突发量、
+# 是否信任 X-Forwarded-For（部署在反向代理之后时开启）。
+# 托管平台（Railway/Render）的请求都经过平台代理，开启限流时必须同时开启 TRUST_PROXY_HEADERS，否则所有用户共用代理 IP 的令牌桶
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "64"))
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "").lower() == "true"
+# 管理员 API Key（逗号分隔）：只有管理员可以使用 profile 耗时分解
+ADMIN_API_KEYS = frozenset(key.strip() for key in os.getenv("ADMIN_API_KEYS", "").split(",") if key.strip())
+
 # 默认使用规则引擎
 DEFAULT_ENGINE: EngineType = "llm" if ENABLE_LLM and LLM_API_KEY else "rule"
 
+# 评分规则表（A1-C3 的区段、阈值、扣分和文案）；留空使用内置的 rubric.json
+RUBRIC_PATH = os.getenv("RUBRIC_PATH", "")
+
+# 信号词库：每个分析模式一个 JSON 文件（<mode>.json）；请求未指定模式时使用 DEFAULT_MODE
+DEFAULT_MODE = "drama_emotion"
+LEXICON_DIR = os.getenv("LEXICON_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicons"))
+# 检查词库文件（和规则表）是否变化的间隔（秒），变化后自动重新加载；0 表示只通过管理接口重新加载
+LEXICON_RELOAD_SECONDS = float(os.getenv("LEXICON_RELOAD_SECONDS", "10"))
+
+# 冷启动：开始接收请求前是否预热（各模式评分一次、业务路由各调用一次、创建规则引擎进程池），见 warmup.py；
+# 关闭时启动后立即就绪
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+
 # 文本长度限制
 MIN_TEXT_LENGTH = 10
 MAX_TEXT_LENGTH = 5000
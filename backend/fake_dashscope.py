@@ -0,0 +1,201 @@
+"""
+本地模拟的 DashScope（通义千问）文本生成接口，用于离线压测 LLM 路径
+
+说明：
+- 响应结构随机使用 output.text 或 output.choices[0].message.content 两种格式（与 llm_scorer 支持的一致）
+- 请求带 X-DashScope-SSE: enable 时按增量输出（SSE）分块返回
+- 可配置延迟分布（对数正态，中位数 + sigma）、偶发长时间卡顿、HTTP 错误、
+  非 JSON 输出、不符合响应模型的 JSON（schema 校验失败）以及截断的响应
+- 模型输出按脚本文本的哈希确定，相同文本得到相同结果
+
+用法：
+    python fake_dashscope.py --port 9100 --latency-ms 800 --error-rate 0.05 --truncate-rate 0.05
+    LLM_API_URL=http://127.0.0.1:9100/api/v1/services/aigc/text-generation/generation \\
+        ENABLE_LLM=true LLM_API_KEY=fake RATE_LIMIT_RPS=0 python run.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+GENERATION_PATH = "/api/v1/services/aigc/text-generation/generation"
+
+
+@dataclass
+class FakeSettings:
+    """模拟行为配置；各比例互斥，按 error、malformed、invalid、truncate 的顺序抽样"""
+
+    latency_ms: float = 800.0
+    latency_sigma: float = 0.5
+    stall_rate: float = 0.0
+    stall_ms: float = 30000.0
+    error_rate: float = 0.0
+    malformed_rate: float = 0.0
+    invalid_rate: float = 0.0
+    truncate_rate: float = 0.0
+    choices_ratio: float = 0.5
+    chunk_chars: int = 24
+    seed: Optional[int] = None
+
+
+def _script_text(payload: dict) -> str:
+    """从请求体中取出用户消息（脚本文本）"""
+    messages = (payload.get("input") or {}).get("messages") or []
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message.get("content") or ""
+    return ""
+
+
+def fake_content(text: str) -> Dict[str, object]:
+    """按文本哈希生成一份符合 AnalyzeResponse 的模型输出"""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    score = 40 + digest[0] % 55
+    risk_level = "safe" if score >= 75 else "warn" if score >= 60 else "bad"
+    snippet = text[-12:] or "开头"
+    return {
+        "score": score,
+        "risk_level": risk_level,
+        "summary": ["开头冲突不够明确", "中段节奏偏慢"][: 1 + digest[1] % 2],
+        "issues_high": [{"text": "前5秒缺少悬念", "reason": "开头信息密度低"}] if score < 60 else [],
+        "issues_mid": [{"text": "情绪转折偏少", "reason": "缺少反差"}],
+        "risky_section": ["前段", "中段", "后段"][digest[2] % 3],
+        "viewer_reaction": "如果我是观众，我会在中段觉得节奏太慢就划走了",
+        "directions": ["在开头建立明确的冲突或悬念", "增加至少一次情绪或剧情转折"],
+        "evidence": [{"text": snippet, "position": "后段", "reason": "结尾落点"}],
+        "meta": {"model": "fake-qwen"},
+    }
+
+
+def _envelope(content: str, choices: bool) -> Dict[str, object]:
+    """包装成 DashScope 的响应结构"""
+    if choices:
+        output = {"choices": [{"finish_reason": "stop", "message": {"role": "assistant", "content": content}}]}
+    else:
+        output = {"text": content, "finish_reason": "stop"}
+    return {"output": output, "usage": {"input_tokens": 0, "output_tokens": len(content)}, "request_id": "fake"}
+
+
+class FakeDashScope:
+    """模拟服务：决定每个请求的延迟和故障类型，并生成对应的响应"""
+
+    def __init__(self, settings: FakeSettings):
+        self.settings = settings
+        self.rng = random.Random(settings.seed)
+        self.counts: Dict[str, int] = {}
+
+    def _latency(self) -> float:
+        """本次响应的总延迟（秒）"""
+        settings = self.settings
+        if settings.stall_rate and self.rng.random() < settings.stall_rate:
+            return settings.stall_ms / 1000
+        if settings.latency_sigma <= 0:
+            return settings.latency_ms / 1000
+        return self.rng.lognormvariate(0, settings.latency_sigma) * settings.latency_ms / 1000
+
+    def _fault(self) -> str:
+        settings = self.settings
+        roll = self.rng.random()
+        for fault, rate in (
+            ("error", settings.error_rate),
+            ("malformed", settings.malformed_rate),
+            ("invalid", settings.invalid_rate),
+            ("truncate", settings.truncate_rate),
+        ):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return "ok"
+
+    def _content(self, text: str, fault: str) -> str:
+        content = fake_content(text)
+        if fault == "malformed":
+            return "抱歉，我暂时无法完成这段脚本的分析。"
+        if fault == "invalid":
+            content.update(score="高", directions="增加冲突")
+        return json.dumps(content, ensure_ascii=False)
+
+    async def handle(self, request: Request) -> Response:
+        payload = await request.json()
+        stream = request.headers.get("x-dashscope-sse", "").lower() == "enable"
+        fault = self._fault()
+        self.counts[fault] = self.counts.get(fault, 0) + 1
+        latency = self._latency()
+        choices = self.rng.random() < self.settings.choices_ratio
+
+        if fault == "error":
+            await asyncio.sleep(latency * self.rng.random())
+            status_code = self.rng.choice([429, 500, 502, 503])
+            return JSONResponse({"code": "InternalError", "message": "fake upstream error"}, status_code=status_code)
+
+        content = self._content(_script_text(payload), fault)
+        if stream:
+            return StreamingResponse(
+                self._stream(content, choices, latency, truncate=fault == "truncate"),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(latency)
+        body = json.dumps(_envelope(content, choices), ensure_ascii=False)
+        if fault == "truncate":
+            body = body[: self.rng.randint(1, len(body) - 1)]
+        return Response(body, media_type="application/json")
+
+    async def _stream(self, content: str, choices: bool, latency: float, truncate: bool) -> AsyncIterator[str]:
+        """按 chunk_chars 分块输出；首块前等待约一半延迟，其余延迟均摊到各块之间"""
+        size = max(1, self.settings.chunk_chars)
+        chunks: List[str] = [content[i:i + size] for i in range(0, len(content), size)]
+        if truncate:
+            chunks = chunks[: self.rng.randint(1, max(1, len(chunks) - 1))]
+        await asyncio.sleep(latency / 2)
+        for index, chunk in enumerate(chunks):
+            if index:
+                await asyncio.sleep(latency / 2 / len(chunks))
+            event = json.dumps(_envelope(chunk, choices), ensure_ascii=False)
+            yield f"id:{index + 1}\nevent:result\ndata:{event}\n\n"
+
+
+def create_app(settings: FakeSettings) -> FastAPI:
+    fake = FakeDashScope(settings)
+    app = FastAPI(title="fake DashScope")
+    app.add_api_route(GENERATION_PATH, fake.handle, methods=["POST"])
+
+    @app.get("/stats")
+    async def stats():
+        """各故障类型已返回的次数"""
+        return fake.counts
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="本地模拟的 DashScope 文本生成接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="延迟中位数（毫秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="对数正态分布的 sigma，0 表示固定延迟")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="长时间卡顿的比例（用于触发读取超时）")
+    parser.add_argument("--stall-ms", type=float, default=30000.0, help="卡顿时长（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 429/5xx 的比例")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="模型输出不是 JSON 的比例")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="输出 JSON 不符合响应模型的比例")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="响应被截断的比例")
+    parser.add_argument("--choices-ratio", type=float, default=0.5, help="使用 output.choices 结构的比例")
+    parser.add_argument("--chunk-chars", type=int, default=24, help="增量输出每块的字符数")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    args = parser.parse_args(argv)
+
+    settings = FakeSettings(**{k: v for k, v in vars(args).items() if k not in ("host", "port")})
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
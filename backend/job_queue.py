@@ -0,0 +1,348 @@
+"""
+异步任务队列（SQLite 持久化）
+
+说明：
+- 提交任务后立即返回任务 id，由后台 worker 从队列中领取执行，客户端轮询或长轮询结果
+- 队列有容量上限，排队中的任务达到上限时拒绝新任务（QueueFullError）
+- 任务、状态和结果都保存在 SQLite 中：worker 领取任务时写入租约并在执行期间续约，
+  进程退出后租约过期的任务会被重新领取执行；正常关闭时正在执行的任务直接放回队列
+- 完成的任务保留 ttl_seconds 秒，过期后查询返回 None，并由清理任务删除
+- SQLite 读写放到线程池执行，不阻塞事件循环
+- 队列在应用启动时创建（start_job_queue，lifespan 中调用），导入本模块不会创建数据库文件；
+  未启动时 get_job_queue 返回 None
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import JOBS_LEASE_SECONDS, JOBS_MAX_ATTEMPTS, JOBS_MAX_QUEUED, JOBS_SQLITE_PATH, JOBS_TTL_SECONDS
+
+# 进程内共享的任务队列（应用启动时创建）
+_queue: Optional["JobQueue"] = None
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+# 任务处理函数：(kind, payload) -> 可 JSON 序列化的结果；
+# 抛出的异常若带 status_code / detail 属性（如 HTTPException），会原样记录到任务的 error 中
+JobHandler = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+_COLUMNS = (
+    "id", "kind", "status", "payload", "result", "error", "attempts",
+    "created_at", "started_at", "finished_at", "expires_at", "lease_until",
+)
+
+
+class QueueFullError(Exception):
+    """排队中的任务已达上限"""
+
+
+class JobQueue:
+    """SQLite 持久化的任务队列 + asyncio worker 池"""
+
+    def __init__(
+        self,
+        sqlite_path: str,
+        max_queued: int,
+        ttl_seconds: float,
+        lease_seconds: float,
+        max_attempts: int,
+        poll_interval: float = 1.0,
+    ):
+        self.max_queued = max_queued
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+
+        directory = os.path.dirname(sqlite_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+        self._db_lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, payload TEXT NOT NULL, "
+            "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL, expires_at REAL, lease_until REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished_events: Dict[str, asyncio.Event] = {}
+        # 每个任务正在长轮询的请求数：多个请求共用一个事件，最后一个离开时才删除
+        self._waiters: Dict[str, int] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._stats: Dict[str, int] = {"submitted": 0, "succeeded": 0, "failed": 0, "rejected": 0, "requeued": 0}
+
+    # ---- SQLite 操作（在线程池中执行） ----
+
+    def _row_to_job(self, row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        for field in ("payload", "result", "error"):
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+    def _insert(self, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                (queued,) = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()
+                if queued >= self.max_queued:
+                    raise QueueFullError(f"排队中的任务已达上限（{self.max_queued}）")
+                self._db.execute(
+                    "INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, kind, QUEUED, json.dumps(payload, ensure_ascii=False), now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self._get(job_id)
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        job = self._row_to_job(row)
+        if job is not None and job["expires_at"] is not None and job["expires_at"] < time.time():
+            return None
+        return job
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """领取最早的排队任务（或租约已过期的执行中任务），写入租约"""
+        now = time.time()
+        with self._db_lock:
+            while True:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self._db.execute(
+                        f"SELECT {', '.join(_COLUMNS)} FROM jobs "
+                        "WHERE status = ? OR (status = ? AND lease_until < ?) "
+                        "ORDER BY created_at LIMIT 1",
+                        (QUEUED, RUNNING, now),
+                    ).fetchone()
+                    if row is None:
+                        self._db.execute("COMMIT")
+                        return None
+                    job = self._row_to_job(row)
+                    if job["attempts"] >= self.max_attempts:
+                        # 多次执行都因进程退出而中断，不再重试
+                        self._db.execute(
+                            "UPDATE jobs SET status = ?, error = ?, finished_at = ?, expires_at = ?, lease_until = NULL "
+                            "WHERE id = ?",
+                            (FAILED, json.dumps({"status_code": 500, "detail": "任务多次执行中断，已放弃"}, ensure_ascii=False),
+                             now, now + self.ttl_seconds, job["id"]),
+                        )
+                        self._db.execute("COMMIT")
+                        continue
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, lease_until = ? WHERE id = ?",
+                        (RUNNING, now, now + self.lease_seconds, job["id"]),
+                    )
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+                job.update(status=RUNNING, attempts=job["attempts"] + 1, started_at=now)
+                return job
+
+    def _renew(self, job_id: str) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ?",
+                (time.time() + self.lease_seconds, job_id, RUNNING),
+            )
+
+    def _finish(self, job_id: str, result: Any = None, error: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ?, lease_until = NULL "
+                "WHERE id = ?",
+                (
+                    FAILED if error is not None else SUCCEEDED,
+                    json.dumps(result, ensure_ascii=False) if error is None else None,
+                    json.dumps(error, ensure_ascii=False) if error is not None else None,
+                    now, now + self.ttl_seconds, job_id,
+                ),
+            )
+
+    def _release(self, job_id: str) -> None:
+        """正常关闭时把执行中的任务放回队列（不计入执行次数）"""
+        with self._db_lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts - 1, started_at = NULL, lease_until = NULL "
+                "WHERE id = ? AND status = ?",
+                (QUEUED, job_id, RUNNING),
+            )
+
+    def _purge(self) -> int:
+        with self._db_lock:
+            return self._db.execute("DELETE FROM jobs WHERE expires_at < ?", (time.time(),)).rowcount
+
+    def _counts(self) -> Dict[str, int]:
+        with self._db_lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    # ---- 对外接口 ----
+
+    async def submit(self, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """提交任务，返回任务记录；队列已满时抛出 QueueFullError"""
+        try:
+            job = await asyncio.to_thread(self._insert, kind, payload)
+        except QueueFullError:
+            self._stats["rejected"] += 1
+            raise
+        self._stats["submitted"] += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务；不存在或已过期返回 None"""
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """长轮询：等待任务结束或超时，返回最新的任务记录"""
+        deadline = time.monotonic() + timeout
+        event = self._finished_events.setdefault(job_id, asyncio.Event())
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+        try:
+            while True:
+                job = await self.get(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job["status"] in FINISHED or remaining <= 0:
+                    return job
+                # 本进程内完成会立即唤醒；其他进程完成的任务靠定期查询发现
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=min(remaining, self.poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._waiters[job_id] -= 1
+            if not self._waiters[job_id]:
+                del self._waiters[job_id]
+                self._finished_events.pop(job_id, None)
+
+    def start(self, handler: JobHandler, workers: int) -> None:
+        """启动 worker 和过期清理任务（在事件循环中调用）"""
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(handler)) for _ in range(workers)]
+        self._tasks.append(asyncio.create_task(self._janitor()))
+
+    async def stop(self) -> None:
+        """停止 worker；正在执行的任务放回队列，下次启动继续"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, handler: JobHandler) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:  # noqa: BLE001
+                logger.error("领取任务失败：%s", e)
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._run(handler, job)
+
+    async def _run(self, handler: JobHandler, job: Dict[str, Any]) -> None:
+        renewal = asyncio.create_task(self._keep_lease(job["id"]))
+        try:
+            result = await handler(job["kind"], job["payload"])
+        except asyncio.CancelledError:
+            await asyncio.shield(asyncio.to_thread(self._release, job["id"]))
+            self._stats["requeued"] += 1
+            raise
+        except Exception as e:  # noqa: BLE001
+            logger.error("任务 %s 执行失败：%s", job["id"], e)
+            error = {
+                "status_code": getattr(e, "status_code", 500),
+                "detail": getattr(e, "detail", None) or "任务执行失败，请稍后重试",
+            }
+            await asyncio.to_thread(self._finish, job["id"], None, error)
+            self._stats["failed"] += 1
+        else:
+            await asyncio.to_thread(self._finish, job["id"], result)
+            self._stats["succeeded"] += 1
+        finally:
+            renewal.cancel()
+        event = self._finished_events.pop(job["id"], None)
+        if event is not None:
+            event.set()
+
+    async def _keep_lease(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await asyncio.to_thread(self._renew, job_id)
+
+    async def _janitor(self) -> None:
+        while True:
+            try:
+                removed = await asyncio.to_thread(self._purge)
+                if removed:
+                    logger.info("已清理 %d 个过期任务", removed)
+            except Exception as e:  # noqa: BLE001
+                logger.error("清理过期任务失败：%s", e)
+            await asyncio.sleep(max(1.0, min(60.0, self.ttl_seconds / 10)))
+
+    async def stats(self) -> Dict[str, Any]:
+        """各状态的任务数和本进程的计数"""
+        counts = await asyncio.to_thread(self._counts)
+        return {"by_status": counts, **self._stats, "workers": len(self._tasks) - 1 if self._tasks else 0}
+
+    def close(self) -> None:
+        """关闭数据库连接（stop 之后调用）"""
+        with self._db_lock:
+            self._db.close()
+
+
+def get_job_queue() -> Optional[JobQueue]:
+    """应用启动后创建的任务队列；未启动时（如只导入 main 的命令行工具）返回 None"""
+    return _queue
+
+
+async def start_job_queue(handler: JobHandler, workers: int) -> JobQueue:
+    """打开 JOBS_SQLITE_PATH 并启动 worker（lifespan 中调用）"""
+    global _queue
+    _queue = await asyncio.to_thread(
+        JobQueue, JOBS_SQLITE_PATH, JOBS_MAX_QUEUED, JOBS_TTL_SECONDS, JOBS_LEASE_SECONDS, JOBS_MAX_ATTEMPTS,
+    )
+    _queue.start(handler, workers)
+    return _queue
+
+
+async def stop_job_queue() -> None:
+    """停止 worker 并关闭数据库（应用退出时调用）"""
+    global _queue
+    if _queue is not None:
+        queue, _queue = _queue, None
+        await queue.stop()
+        queue.close()
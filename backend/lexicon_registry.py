@@ -0,0 +1,195 @@
+"""
+按分析模式注册的信号词库（可热加载、带版本）
+
+说明：
+- 每个模式一个 JSON 数据文件（LEXICON_DIR/<mode>.json）：版本号、各类别词表、反差句式（起始词, 结束词）和分隔符
+- 加载时词表去重（保留首次出现的顺序），再编译成 SignalMatcher，并用同一份规则表（RUBRIC_PATH）编译求值函数；
+  一个 Lexicon 把匹配器和规则表绑在一起，评分时整体取用
+- 重新加载时先完整编译所有模式，成功后一次性替换注册表（单次引用赋值），进行中的请求继续使用旧版本；
+  任一文件有误时抛出 LexiconError，注册表保持不变
+- 版本号 = 文件中的 version + 词库文件与规则表内容的哈希前缀：只改文件不改 version 也会得到新版本，
+  结果缓存键和 meta.lexicon 都使用它
+- 规则引擎进程池的子进程各有一份注册表，主进程传入的版本与本地不一致时在子进程内重新加载
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from config import DEFAULT_MODE, LEXICON_DIR, RUBRIC_PATH
+from rubric import DEFAULT_RUBRIC_PATH, CompiledRubric, RubricError
+from signal_matcher import SignalMatcher
+
+logger = logging.getLogger(__name__)
+
+# 规则表之外、评分代码直接使用的类别（证据提取和 analyze_* 参考实现）
+REQUIRED_CATEGORIES = ("conflict", "emotion", "suspense", "empty", "flat_narration")
+
+
+class LexiconError(ValueError):
+    """词库文件无法加载或编译"""
+
+
+class UnknownModeError(LexiconError):
+    """请求的分析模式没有对应的词库"""
+
+
+class Lexicon(NamedTuple):
+    """一个模式的一个词库版本：匹配器和据此编译的规则表"""
+    mode: str
+    version: str
+    categories: Dict[str, Tuple[str, ...]]
+    pairs: Tuple[Tuple[str, str], ...]
+    matcher: SignalMatcher
+    rubric: CompiledRubric
+
+
+def _dedupe(words: List[str], where: str) -> Tuple[str, ...]:
+    """去掉重复词（保留首次出现的顺序）；重复项只记录警告"""
+    unique = tuple(dict.fromkeys(words))
+    if len(unique) != len(words):
+        duplicates = sorted({word for word in words if words.count(word) > 1})
+        logger.warning("%s 中有重复的词，已去重：%s", where, "、".join(duplicates))
+    return unique
+
+
+def build_lexicon(mode: str, data: Dict[str, Any], rubric_table: Dict[str, Any], digest: str) -> Lexicon:
+    """由词库数据和规则表编译一个 Lexicon；数据有误时抛出 LexiconError"""
+    categories = data.get("categories")
+    if not isinstance(categories, dict) or not categories:
+        raise LexiconError(f"词库 {mode}：categories 必须是非空对象")
+    words: Dict[str, Tuple[str, ...]] = {}
+    for category, items in categories.items():
+        if not isinstance(items, list) or not all(isinstance(word, str) and word for word in items):
+            raise LexiconError(f"词库 {mode}：类别 {category} 必须是非空字符串列表")
+        words[category] = _dedupe(items, f"词库 {mode} 的类别 {category}")
+    missing = [category for category in REQUIRED_CATEGORIES if category not in words]
+    if missing:
+        raise LexiconError(f"词库 {mode}：缺少类别 {', '.join(missing)}")
+
+    pairs = data.get("pairs", [])
+    if not isinstance(pairs, list) or not all(
+        isinstance(pair, list) and len(pair) == 2 and all(isinstance(word, str) and word for word in pair)
+        for pair in pairs
+    ):
+        raise LexiconError(f"词库 {mode}：pairs 必须是 [起始词, 结束词] 列表")
+    pairs = tuple(dict.fromkeys(tuple(pair) for pair in pairs))
+    barrier = data.get("barrier") or None
+
+    matcher = SignalMatcher(words, pairs=pairs, barrier=barrier)
+    try:
+        rubric = CompiledRubric(rubric_table, matcher)
+    except RubricError as e:
+        raise LexiconError(f"词库 {mode}：规则表编译失败：{e}") from e
+    version = f"{data.get('version', '0')}-{digest[:8]}"
+    return Lexicon(mode, version, words, pairs, matcher, rubric)
+
+
+class LexiconRegistry:
+    """模式 -> 当前 Lexicon；get 无锁读取，reload 串行执行并整体替换"""
+
+    def __init__(self, directory: str, rubric_path: str = ""):
+        self.directory = directory
+        self.rubric_path = rubric_path or DEFAULT_RUBRIC_PATH
+        self._lexicons: Dict[str, Lexicon] = {}
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"reloads": 0, "failures": 0}
+        self._last_error: Optional[str] = None
+
+    def _paths(self) -> List[str]:
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+        except OSError as e:
+            raise LexiconError(f"无法读取词库目录 {self.directory}：{e}") from e
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _file_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """词库文件和规则表的（修改时间, 大小），用于判断是否需要重新加载"""
+        snapshot = {}
+        for path in self._paths() + [self.rubric_path]:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _read(self, path: str) -> Tuple[bytes, Any]:
+        try:
+            with open(path, "rb") as handle:
+                raw = handle.read()
+            return raw, json.loads(raw)
+        except (OSError, ValueError) as e:
+            raise LexiconError(f"无法读取 {path}：{e}") from e
+
+    def _compile_all(self) -> Dict[str, Lexicon]:
+        rubric_raw, rubric_table = self._read(self.rubric_path)
+        lexicons: Dict[str, Lexicon] = {}
+        for path in self._paths():
+            mode = os.path.splitext(os.path.basename(path))[0]
+            raw, data = self._read(path)
+            if not isinstance(data, dict):
+                raise LexiconError(f"词库 {mode}：文件内容必须是 JSON 对象")
+            digest = hashlib.sha256(raw + b"\0" + rubric_raw).hexdigest()
+            lexicons[mode] = build_lexicon(mode, data, rubric_table, digest)
+        if DEFAULT_MODE not in lexicons:
+            raise LexiconError(f"词库目录 {self.directory} 中没有默认模式 {DEFAULT_MODE}")
+        return lexicons
+
+    def reload(self) -> Dict[str, str]:
+        """重新加载全部词库，成功后整体替换并返回各模式的版本；失败时抛出 LexiconError，保留当前词库"""
+        with self._lock:
+            snapshot = self._file_snapshot()
+            try:
+                lexicons = self._compile_all()
+            except LexiconError as e:
+                self._stats["failures"] += 1
+                self._last_error = str(e)
+                raise
+            self._lexicons = lexicons
+            self._snapshot = snapshot
+            self._stats["reloads"] += 1
+            self._last_error = None
+        versions = self.versions()
+        logger.info("词库已加载：%s", versions)
+        return versions
+
+    def reload_if_changed(self) -> bool:
+        """文件有变化时重新加载；返回是否替换了词库（失败只记录日志）"""
+        try:
+            if self._file_snapshot() == self._snapshot:
+                return False
+            self.reload()
+        except LexiconError as e:
+            logger.error("词库重新加载失败，继续使用当前版本：%s", e)
+            return False
+        return True
+
+    def get(self, mode: str = DEFAULT_MODE) -> Lexicon:
+        """当前版本的词库；模式不存在时抛出 UnknownModeError"""
+        lexicon = self._lexicons.get(mode)
+        if lexicon is None:
+            raise UnknownModeError(f"不支持的分析模式：{mode}，可选：{', '.join(sorted(self._lexicons))}")
+        return lexicon
+
+    def get_version(self, mode: str, version: str) -> Lexicon:
+        """取指定版本的词库，本地版本不一致时先重新加载（进程池子进程使用）"""
+        lexicon = self.get(mode)
+        if lexicon.version != version:
+            self.reload_if_changed()
+            lexicon = self.get(mode)
+        return lexicon
+
+    def versions(self) -> Dict[str, str]:
+        return {mode: lexicon.version for mode, lexicon in self._lexicons.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "versions": self.versions(), "last_error": self._last_error}
+
+
+# 进程内共享的注册表，导入时加载；词库有误时启动失败
+lexicons = LexiconRegistry(LEXICON_DIR, RUBRIC_PATH)
+lexicons.reload()
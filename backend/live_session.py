@@ -0,0 +1,186 @@
+"""
+编辑器实时评分会话（WebSocket）
+
+说明：
+- 客户端连接后先发送 init（全文），之后每次输入只发送一段编辑：把 [start, end) 替换为 text，
+  偏移量按 Unicode 字符计（前端可用新旧文本的公共前缀/后缀算出唯一的替换区间）
+- 会话保存上一版的 ScriptDocument；编辑时只对编辑区附近重新断句和扫描信号词，其余命中和句子边界平移复用，
+  之后直接用规则引擎重新评分并推送 score 事件（带 version 和服务端耗时）
+- LLM 模式下，停止输入 LIVE_LLM_IDLE_MS 毫秒后才对最新版本发起一次 LLM 评分（与 /api/analyze 相同的
+  校验、缓存和近似重复复用），结果对应的版本仍是最新时推送 llm 事件；新的编辑会取消等待，
+  已发出的 LLM 调用继续执行并写入缓存
+- 实时评分使用编辑器中的原始文本（不做首尾空白规范化），偏移量才能与编辑器一致
+- 消息格式错误、编辑区间越界或文本超过 MAX_TEXT_LENGTH 时推送 error 事件，会话保持上一个有效版本
+- 会话绑定 init 时模式的词库；词库热加载后的下一次编辑用新版本完整重建文档（之后继续增量更新）
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect, status
+from pydantic_core import to_json
+
+from config import DEFAULT_MODE, LIVE_LLM_IDLE_MS, MAX_TEXT_LENGTH, MIN_TEXT_LENGTH
+from lexicon_registry import Lexicon, UnknownModeError, lexicons
+from schema import AnalyzeResponse
+from scorer_rules import build_document, score_document
+from script_document import ScriptDocument
+
+logger = logging.getLogger(__name__)
+
+# 停止输入后的 LLM 评分：(规范化前的全文, 模式) -> 结果
+LlmPass = Callable[[str, str], Awaitable[AnalyzeResponse]]
+
+
+class LiveSessionError(Exception):
+    """客户端消息无法处理（推送 error 事件，连接保持）"""
+
+
+class LiveSession:
+    """一个编辑器连接的会话状态：当前版本号、模式、词库和脚本文档"""
+
+    def __init__(self):
+        self.doc: Optional[ScriptDocument] = None
+        self.lexicon: Optional[Lexicon] = None
+        self.mode = DEFAULT_MODE
+        self.version = 0
+
+    def handle(self, message: Dict[str, Any]) -> None:
+        """应用一条客户端消息（init 或 edit），成功时版本号加一"""
+        kind = message.get("type")
+        if kind == "init":
+            self.init(message.get("text"), message.get("mode", self.mode))
+        elif kind == "edit":
+            self.edit(message.get("start"), message.get("end"), message.get("text", ""), message.get("version"))
+        else:
+            raise LiveSessionError(f"未知的消息类型：{kind}")
+
+    def init(self, text: Any, mode: Any) -> None:
+        if not isinstance(text, str) or not isinstance(mode, str):
+            raise LiveSessionError("init 需要字符串类型的 text 和 mode")
+        if len(text) > MAX_TEXT_LENGTH:
+            raise LiveSessionError(f"文本长度超过限制，最多支持 {MAX_TEXT_LENGTH} 个字符")
+        try:
+            self.lexicon = lexicons.get(mode)
+        except UnknownModeError as e:
+            raise LiveSessionError(str(e))
+        self.doc = build_document(text, self.lexicon)
+        self.mode = mode
+        self.version += 1
+
+    def edit(self, start: Any, end: Any, text: Any, base_version: Any = None) -> None:
+        """把 [start, end) 替换为 text；base_version 与当前版本不一致时拒绝（客户端应重新 init）"""
+        if self.doc is None:
+            raise LiveSessionError("请先发送 init")
+        if base_version is not None and base_version != self.version:
+            raise LiveSessionError(f"版本不一致：当前版本为 {self.version}，请重新发送 init")
+        if not isinstance(text, str) or type(start) is not int or type(end) is not int:
+            raise LiveSessionError("edit 需要整数 start/end 和字符串 text")
+        if not 0 <= start <= end <= self.doc.length:
+            raise LiveSessionError(f"编辑区间越界：[{start}, {end})，当前文本长度 {self.doc.length}")
+        if self.doc.length - (end - start) + len(text) > MAX_TEXT_LENGTH:
+            raise LiveSessionError(f"文本长度超过限制，最多支持 {MAX_TEXT_LENGTH} 个字符")
+        try:
+            lexicon = lexicons.get(self.mode)
+        except UnknownModeError:
+            # 模式在重新加载后被移除：会话继续使用已有的词库
+            lexicon = self.lexicon
+        if lexicon is not self.lexicon:
+            # 词库已重新加载：旧文档的命中来自旧词库，整体重建
+            self.lexicon = lexicon
+            self.doc = build_document(self.doc.text, lexicon)
+        self.doc = self.doc.edit(start, end, text)
+        self.version += 1
+
+    def score(self) -> Dict[str, Any]:
+        """对当前版本用规则引擎评分，返回 score 事件（文本过短或评分失败时为 error 事件）"""
+        started = time.perf_counter()
+        if len(self.doc.text.strip()) < MIN_TEXT_LENGTH:
+            return {"type": "error", "version": self.version, "detail": f"文本长度过短，至少需要 {MIN_TEXT_LENGTH} 个字符"}
+        try:
+            result = score_document(self.doc, self.lexicon)
+        except Exception as e:  # noqa: BLE001
+            logger.error("实时评分失败：%s", e)
+            return {"type": "error", "version": self.version, "detail": "评分失败，请稍后重试"}
+        return {
+            "type": "score",
+            "version": self.version,
+            "result": result,
+            "server_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+
+class LiveConnection:
+    """WebSocket 连接：收消息、推送规则评分，并在停止输入后调度 LLM 评分"""
+
+    def __init__(self, websocket: WebSocket, llm_pass: Optional[LlmPass], idle_ms: int = LIVE_LLM_IDLE_MS):
+        self.websocket = websocket
+        self.llm_pass = llm_pass
+        self.idle_ms = idle_ms
+        self.session = LiveSession()
+        self._idle_task: Optional[asyncio.Task] = None
+        # 规则评分和 LLM 结果在不同任务中推送，发送需要串行
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, event: Dict[str, Any]) -> None:
+        """推送一个事件；result 保持为 AnalyzeResponse，由 pydantic-core 直接序列化"""
+        async with self._send_lock:
+            await self.websocket.send_text(to_json(event).decode())
+
+    async def run(self) -> None:
+        """处理消息直到客户端断开"""
+        try:
+            while True:
+                await self.on_message(await self.websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self._cancel_idle()
+
+    async def on_message(self, raw: str) -> None:
+        session = self.session
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            message = None
+        try:
+            if not isinstance(message, dict):
+                raise LiveSessionError("消息必须是 JSON 对象")
+            session.handle(message)
+        except LiveSessionError as e:
+            # 无效消息不改变文本，也不打断等待中的 LLM 评分
+            await self.send({"type": "error", "version": session.version, "detail": str(e)})
+            return
+
+        self._cancel_idle()
+        await self.send(session.score())
+        # 规则引擎失败时同样安排 LLM 评分；过短的文本 LLM 也会拒绝
+        if self.llm_pass is not None and len(session.doc.text.strip()) >= MIN_TEXT_LENGTH:
+            self._idle_task = asyncio.ensure_future(self._llm_after_idle(session.version, session.doc.text, session.mode))
+
+    def _cancel_idle(self) -> None:
+        if self._idle_task is not None and not self._idle_task.done():
+            self._idle_task.cancel()
+        self._idle_task = None
+
+    async def _llm_after_idle(self, version: int, text: str, mode: str) -> None:
+        """停止输入 idle_ms 后评分；期间有新的编辑时本任务被取消"""
+        await asyncio.sleep(self.idle_ms / 1000)
+        event: Dict[str, Any] = {"type": "llm", "version": version, "status": "ok", "result": None}
+        try:
+            result = await self.llm_pass(text, mode)
+        except HTTPException as e:
+            event["status"] = "busy" if e.status_code == status.HTTP_429_TOO_MANY_REQUESTS else "rejected"
+        except Exception as e:  # noqa: BLE001
+            logger.error("实时会话 LLM 评分失败：%s", e)
+            event["status"] = "failed"
+        else:
+            if result.meta.get("engine") == "rule":
+                # LLM 失败或晚于截止时间；规则结果客户端已经有了
+                event["status"] = result.meta.get("llm_status", "failed")
+            else:
+                event["result"] = result
+        if version == self.session.version:
+            await self.send(event)
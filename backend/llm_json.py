@@ -0,0 +1,154 @@
+"""
+LLM 输出的增量 / 容错 JSON 解析
+
+说明（对应《评分体系设计文档》5.2 JSON解析与修复策略）：
+1. 先尝试直接解析
+2. 失败则截取第一个 { 到最后一个 } 之间的内容再解析（模型在 JSON 前后多输出了文字）
+3. 仍失败则按截断处理：保留已完整输出的顶层字段，补全未闭合的字符串和括号
+4. 校验必需字段，能推导的缺失字段用默认值填充；无法推导时交给调用方回退规则引擎
+
+IncrementalJSONParser 可以逐块喂入流式输出，每当一个顶层字段输出完整就解析它，
+调用方据此判断必需字段是否已经齐全，从而提前结束生成。
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+# AnalyzeResponse 中必须由模型给出的字段
+REQUIRED_FIELDS = ("score", "risk_level", "summary", "risky_section", "viewer_reaction", "directions")
+# 全部内容字段（meta 由服务端补充，不需要等待）
+CONTENT_FIELDS = REQUIRED_FIELDS + ("issues_high", "issues_mid", "evidence")
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class IncrementalJSONParser:
+    """逐块解析一个 JSON 对象，记录已经完整输出的顶层字段"""
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields: Dict[str, Any] = {}
+        self.finished = False
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._member_start = -1  # 当前顶层成员在 buffer 中的起点
+
+    def feed(self, chunk: str) -> None:
+        """喂入一段新输出"""
+        if self.finished or not chunk:
+            return
+        self.buffer += chunk
+        buffer = self.buffer
+        stack = self._stack
+        for pos in range(self._pos, len(buffer)):
+            char = buffer[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if not stack:
+                # 跳过对象之前的文字（如 Markdown 代码块标记）
+                if char == "{":
+                    stack.append(char)
+                    self._member_start = pos + 1
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                stack.append(char)
+            elif char in "}]":
+                stack.pop()
+                if not stack:
+                    self._close_member(pos)
+                    self.finished = True
+                    self._pos = pos + 1
+                    return
+            elif char == "," and len(stack) == 1:
+                self._close_member(pos)
+                self._member_start = pos + 1
+        self._pos = len(buffer)
+
+    def _close_member(self, end: int) -> None:
+        """顶层成员 buffer[_member_start:end] 已完整，解析并合并"""
+        member = self.buffer[self._member_start:end]
+        if not member.strip():
+            return
+        try:
+            self.fields.update(json.loads("{" + member + "}"))
+        except ValueError:
+            pass
+
+    def has_fields(self, names: Iterable[str]) -> bool:
+        """指定字段是否都已完整输出"""
+        return all(name in self.fields for name in names)
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """
+        当前能得到的最完整对象：
+        - 对象已闭合：返回全部字段
+        - 输出被截断：尝试补全最后一个未完成的成员，失败则丢弃它
+
+        调用方主动停止接收时不应使用本方法（补全会得到截断的值），直接取 fields。
+        """
+        if not self._stack and not self.finished:
+            return None
+        fields = dict(self.fields)
+        if not self.finished:
+            partial = self.buffer[self._member_start:]
+            if self._in_string:
+                partial += "\\" if self._escape else ""
+                partial += '"'
+            partial = partial.rstrip().rstrip(",")
+            partial += "".join(_CLOSERS[opener] for opener in reversed(self._stack[1:]))
+            try:
+                fields.update(json.loads("{" + partial + "}"))
+            except ValueError:
+                pass
+        return fields
+
+
+def repair_json(raw: str) -> Optional[Dict[str, Any]]:
+    """按 5.2 的顺序解析模型输出，全部失败返回 None"""
+    try:
+        parsed = json.loads(raw)
+        if isinstance(parsed, dict):
+            return parsed
+    except ValueError:
+        pass
+
+    start = raw.find("{")
+    end = raw.rfind("}")
+    if start >= 0 and end > start:
+        try:
+            parsed = json.loads(raw[start:end + 1])
+            if isinstance(parsed, dict):
+                return parsed
+        except ValueError:
+            pass
+
+    parser = IncrementalJSONParser()
+    parser.feed(raw)
+    return parser.result() or None
+
+
+def fill_missing_fields(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """填充可推导的缺失字段，并裁剪超出上限的列表"""
+    for name in ("issues_high", "issues_mid", "evidence", "summary"):
+        if not isinstance(parsed.get(name), list):
+            parsed[name] = []
+    if not parsed.get("risk_level") and isinstance(parsed.get("score"), (int, float)):
+        # 与规则引擎相同的风险等级阈值
+        score = parsed["score"]
+        parsed["risk_level"] = "safe" if score >= 75 else "warn" if score >= 60 else "bad"
+    parsed["summary"] = parsed["summary"][:4]
+    parsed["evidence"] = parsed["evidence"][:6]
+    if isinstance(parsed.get("directions"), list):
+        parsed["directions"] = parsed["directions"][:3]
+    if not isinstance(parsed.get("meta"), dict):
+        parsed["meta"] = {}
+    return parsed
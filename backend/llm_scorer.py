@@ -4,19 +4,52 @@
 说明：
 - 只有在环境变量 LLM_ENABLED=true 且提供 QWEN_API_KEY/LLM_API_KEY 时才会被调用
 - 调用失败时，调用方必须回退到规则引擎（见 main.py）
+- API 服务使用异步路径 score_by_llm_async：共享一个保持长连接的 httpx.AsyncClient，
+  连接/读取超时分开配置，并用信号量限制同时进行的上游调用数，不会阻塞事件循环
+- 同步路径 score_by_llm 保留给脚本和命令行使用（requests 在首次调用时才导入）
+- 两条路径共用熔断器 llm_breaker：上游持续出错时直接跳过调用；调用总时长上限随 p95 总耗时自适应，
+  异步路径用 asyncio.timeout 限制整个调用（增量输出时每收到一块都会重置 httpx 的读取超时，它限制不了总时长），
+  同步路径不使用增量输出，读取超时即等待完整响应的时间
+- 异步路径默认使用增量输出（SSE），边接收边解析，必需字段齐全后提前结束；
+  模型输出按设计文档 5.2 容错解析（见 llm_json.py），减少因 JSON 格式问题回退规则引擎
 """
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
-from typing import Optional
+import time
+from typing import TYPE_CHECKING, Any, Optional
 
-import requests
+import httpx
 
-from config import LLM_API_KEY, LLM_API_URL, API_VERSION
+from admission import PRIORITY_NAMES, QueueFullError, llm_priority, llm_slots
+from circuit_breaker import CircuitBreaker
+from config import (
+    API_VERSION,
+    BREAKER_FAILURE_RATE,
+    BREAKER_HALF_OPEN_CALLS,
+    BREAKER_MIN_CALLS,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_WINDOW,
+    LLM_API_KEY,
+    LLM_API_URL,
+    LLM_CONNECT_TIMEOUT,
+    LLM_MIN_READ_TIMEOUT,
+    LLM_POOL_SIZE,
+    LLM_READ_TIMEOUT,
+    LLM_STREAM,
+    LLM_TIMEOUT_P95_MULTIPLIER,
+)
+from llm_json import CONTENT_FIELDS, IncrementalJSONParser, fill_missing_fields, repair_json
+from metrics import LLM_FALLBACKS, LLM_PARSE_SECONDS, LLM_QUEUE_WAIT_SECONDS, LLM_UPSTREAM_SECONDS
+from profiling import record_stage
 from schema import AnalyzeResponse
 
+if TYPE_CHECKING:
+    import requests
+
 logger = logging.getLogger(__name__)
 
 
@@ -60,25 +93,38 @@ def _build_user_prompt(script_text: str) -> str:
     return f"下面是一段短视频脚本，请按照上面的规则进行体检和评分，只返回 JSON：\n\n{script_text}"
 
 
-def score_by_llm(text: str) -> Optional[AnalyzeResponse]:
-    """
-    使用通义千问进行评分。
+# 异步客户端（进程内共享，首次使用时创建）；上游并发上限由 admission.llm_slots 控制
+_async_client: Optional[httpx.AsyncClient] = None
 
-    返回：
-    - 成功：AnalyzeResponse 实例
-    - 失败：None（调用方需要回退到规则引擎）
-    """
+# 同步路径复用的会话（保持长连接）
+_sync_session: Optional["requests.Session"] = None
 
-    if not LLM_API_KEY:
-        logger.warning("LLM_API_KEY 未配置，跳过 LLM 调用。")
-        return None
+# 上游熔断器（同步/异步路径共用）
+llm_breaker = CircuitBreaker(
+    failure_rate=BREAKER_FAILURE_RATE,
+    min_calls=BREAKER_MIN_CALLS,
+    window=BREAKER_WINDOW,
+    open_seconds=BREAKER_OPEN_SECONDS,
+    half_open_calls=BREAKER_HALF_OPEN_CALLS,
+    min_timeout=LLM_MIN_READ_TIMEOUT,
+    max_timeout=LLM_READ_TIMEOUT,
+    timeout_multiplier=LLM_TIMEOUT_P95_MULTIPLIER,
+)
 
-    headers = {
+
+def _build_headers() -> dict:
+    """构造请求头"""
+
+    return {
         "Authorization": f"Bearer {LLM_API_KEY}",
         "Content-Type": "application/json",
     }
 
-    payload = {
+
+def _build_payload(text: str) -> dict:
+    """构造请求体"""
+
+    return {
         "model": "qwen-plus",
         "input": {
             "messages": [
@@ -93,17 +139,54 @@ def score_by_llm(text: str) -> Optional[AnalyzeResponse]:
         },
     }
 
-    try:
-        resp = requests.post(DEFAULT_QWEN_API_URL, headers=headers, json=payload, timeout=40)
-        resp.raise_for_status()
-    except Exception as e:  # noqa: BLE001
-        logger.error("调用通义千问 API 失败：%s", e)
-        return None
 
-    try:
-        data = resp.json()
-    except Exception as e:  # noqa: BLE001
-        logger.error("解析通义千问响应为 JSON 失败：%s", e)
+def get_async_client() -> httpx.AsyncClient:
+    """获取共享的异步 HTTP 客户端（连接池 + keep-alive）"""
+
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=LLM_POOL_SIZE,
+                max_keepalive_connections=LLM_POOL_SIZE,
+            ),
+        )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """关闭共享的异步客户端（应用关闭时调用）"""
+
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def _observe_upstream(outcome: str, seconds: float) -> None:
+    """记录一次上游调用的耗时（监控指标和请求的耗时分解）"""
+    LLM_UPSTREAM_SECONDS.labels(outcome).observe(seconds)
+    record_stage("llm_network", seconds)
+
+
+def _get_sync_session() -> "requests.Session":
+    """获取同步路径复用的会话"""
+
+    # requests 只在同步路径使用，API 服务不加载它（减少冷启动导入时间）
+    import requests
+
+    global _sync_session
+    if _sync_session is None:
+        _sync_session = requests.Session()
+    return _sync_session
+
+
+def extract_raw_content(data: Any) -> Any:
+    """从通义千问响应中取出模型输出（字符串或 dict），找不到返回 None"""
+
+    if not isinstance(data, dict):
+        logger.error("通义千问响应不是 JSON 对象：%r", type(data))
         return None
 
     # 通义千问响应结构可能有多种格式：
@@ -130,39 +213,258 @@ def score_by_llm(text: str) -> Optional[AnalyzeResponse]:
 
     if not raw_content:
         # 有些情况下模型直接返回 JSON 对象
-        if isinstance(data, dict) and {"score", "risk_level"} <= data.keys():
+        if {"score", "risk_level"} <= data.keys():
             raw_content = data
             logger.info("从 data 根对象获取内容")
         else:
             logger.error("通义千问响应中未找到有效内容字段，output 结构：%s", output)
             return None
 
+    return raw_content
+
+
+def parse_llm_content(raw_content: Any) -> Optional[AnalyzeResponse]:
+    """
+    把模型输出转换为 AnalyzeResponse（按设计文档 5.2 容错解析并填充缺失字段）。
+
+    返回：
+    - 成功：AnalyzeResponse 实例
+    - 失败：None（失败原因计入 llm_fallback_total）
+    """
+
+    started = time.perf_counter()
+    try:
+        return _content_to_response(raw_content)
+    finally:
+        elapsed = time.perf_counter() - started
+        LLM_PARSE_SECONDS.observe(elapsed)
+        record_stage("llm_parse", elapsed)
+
+
+def _content_to_response(raw_content: Any) -> Optional[AnalyzeResponse]:
     # raw_content 可能是字符串形式的 JSON，也可能已经是 dict
     if isinstance(raw_content, str):
-        try:
-            parsed = json.loads(raw_content)
-        except Exception as e:  # noqa: BLE001
-            logger.error("解析通义千问 content 字符串为 JSON 失败：%s；content=%r", e, raw_content)
+        parsed = repair_json(raw_content)
+        if parsed is None:
+            LLM_FALLBACKS.labels("json_parse").inc()
+            logger.error("解析通义千问 content 字符串为 JSON 失败；content=%r", raw_content)
             return None
     elif isinstance(raw_content, dict):
         parsed = raw_content
     else:
+        LLM_FALLBACKS.labels("json_parse").inc()
         logger.error("未知的 content 类型：%r", type(raw_content))
         return None
 
+    parsed = fill_missing_fields(parsed)
+
     # 补充 meta 信息
-    meta = parsed.get("meta") or {}
+    meta = parsed["meta"]
     meta.setdefault("version", API_VERSION)
     meta.setdefault("engine", "llm-qwen")
-    parsed["meta"] = meta
 
     try:
         # 使用 Pydantic 校验并构造响应对象（Pydantic v2 API）
         result = AnalyzeResponse.model_validate(parsed)
     except Exception as e:  # noqa: BLE001
+        LLM_FALLBACKS.labels("schema_validation").inc()
         logger.error("将通义千问结果转换为 AnalyzeResponse 失败：%s；parsed=%r", e, parsed)
         return None
 
     return result
 
 
+def parse_llm_response(data: Any) -> Optional[AnalyzeResponse]:
+    """把通义千问的响应 JSON 转换为 AnalyzeResponse，失败返回 None"""
+
+    raw_content = extract_raw_content(data)
+    if raw_content is None:
+        LLM_FALLBACKS.labels("json_parse").inc()
+        return None
+    return parse_llm_content(raw_content)
+
+
+def _stream_chunk(event: dict) -> str:
+    """取出增量输出事件中的文本片段"""
+
+    output = event.get("output") or {}
+    if output.get("text"):
+        return output["text"]
+    choices = output.get("choices") or []
+    if choices:
+        return (choices[0].get("message") or {}).get("content") or ""
+    return ""
+
+
+async def _stream_llm_content(client: httpx.AsyncClient, text: str) -> Any:
+    """
+    以增量输出模式调用通义千问，边接收边解析。
+
+    必需字段全部输出完整后立即断开连接，不再等待模型生成剩余内容（如 meta），
+    此时只使用已完整输出的字段；正在输出的成员不经 repair 补全，避免截断的值进入结果。
+    上游未返回 SSE 时按普通 JSON 响应处理。
+    """
+
+    headers = {**_build_headers(), "Accept": "text/event-stream", "X-DashScope-SSE": "enable"}
+    payload = _build_payload(text)
+    payload["parameters"]["incremental_output"] = True
+
+    async with client.stream("POST", DEFAULT_QWEN_API_URL, headers=headers, json=payload) as resp:
+        resp.raise_for_status()
+        if "text/event-stream" not in resp.headers.get("content-type", ""):
+            return extract_raw_content(json.loads(await resp.aread()))
+
+        parser = IncrementalJSONParser()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            try:
+                event = json.loads(line[5:])
+            except ValueError:
+                continue
+            if "output" not in event and event.get("code"):
+                logger.error("通义千问流式输出返回错误：%s", event)
+                break
+            parser.feed(_stream_chunk(event))
+            if parser.finished:
+                break
+            if parser.has_fields(CONTENT_FIELDS):
+                # 主动提前断开：最后一个成员只收到一半，只返回已完整输出的字段，不做补全
+                return dict(parser.fields)
+
+    # 对象已闭合，或上游输出确实被截断（此时补全最后一个未完成的成员）
+    return parser.result()
+
+
+def score_by_llm(text: str) -> Optional[AnalyzeResponse]:
+    """
+    使用通义千问进行评分（同步版本，供脚本和命令行使用）。
+
+    返回：
+    - 成功：AnalyzeResponse 实例
+    - 失败：None（调用方需要回退到规则引擎）
+    """
+
+    if not LLM_API_KEY:
+        logger.warning("LLM_API_KEY 未配置，跳过 LLM 调用。")
+        return None
+
+    ticket = llm_breaker.allow()
+    if ticket is None:
+        LLM_FALLBACKS.labels("breaker_open").inc()
+        logger.warning("LLM 熔断器已打开，跳过上游调用。")
+        return None
+
+    started = time.monotonic()
+    try:
+        resp = _get_sync_session().post(
+            DEFAULT_QWEN_API_URL,
+            headers=_build_headers(),
+            json=_build_payload(text),
+            # 同步路径不使用增量输出，读取超时即等待完整响应的时间，近似于总时长上限
+            timeout=(LLM_CONNECT_TIMEOUT, llm_breaker.timeout()),
+        )
+        resp.raise_for_status()
+    except Exception as e:  # noqa: BLE001
+        import requests
+
+        reason = "timeout" if isinstance(e, requests.Timeout) else "http_error"
+        _observe_upstream(reason, time.monotonic() - started)
+        LLM_FALLBACKS.labels(reason).inc()
+        llm_breaker.record_failure(ticket, "timeout" if reason == "timeout" else "error")
+        logger.error("调用通义千问 API 失败：%s", e)
+        return None
+    except BaseException:
+        # 被中断（如 KeyboardInterrupt）：没有上游结果，归还半开状态的试探名额
+        llm_breaker.release(ticket)
+        raise
+    llm_breaker.record_success(ticket, time.monotonic() - started)
+    _observe_upstream("ok", time.monotonic() - started)
+
+    try:
+        data = resp.json()
+    except Exception as e:  # noqa: BLE001
+        LLM_FALLBACKS.labels("json_parse").inc()
+        logger.error("解析通义千问响应为 JSON 失败：%s", e)
+        return None
+
+    return parse_llm_response(data)
+
+
+async def score_by_llm_async(text: str) -> Optional[AnalyzeResponse]:
+    """
+    使用通义千问进行评分（异步版本，API 服务使用）。
+
+    - 复用连接池中的长连接
+    - 同时进行的上游调用数不超过 LLM_MAX_CONCURRENCY，其余请求按优先级排队（交互请求优先）
+
+    返回：
+    - 成功：AnalyzeResponse 实例
+    - 失败：None（调用方需要回退到规则引擎）
+    """
+
+    if not LLM_API_KEY:
+        logger.warning("LLM_API_KEY 未配置，跳过 LLM 调用。")
+        return None
+
+    ticket = llm_breaker.allow()
+    if ticket is None:
+        LLM_FALLBACKS.labels("breaker_open").inc()
+        logger.warning("LLM 熔断器已打开，跳过上游调用。")
+        return None
+
+    # allow() 之后的每条退出路径都要结束这次调用：排队被拒、被取消时没有上游结果，在 finally 中归还试探名额
+    settled = False
+    try:
+        client = get_async_client()
+        deadline = llm_breaker.timeout()
+        priority = llm_priority.get()
+        try:
+            waited = await llm_slots.acquire(priority)
+        except QueueFullError as e:
+            LLM_FALLBACKS.labels("queue_full").inc()
+            logger.warning("%s，跳过上游调用。", e)
+            return None
+        LLM_QUEUE_WAIT_SECONDS.labels(PRIORITY_NAMES[priority]).observe(waited)
+        record_stage("llm_queue", waited)
+        started = time.monotonic()
+        try:
+            # 总时长上限覆盖连接、等待首字节和整个增量输出；连接和单次读取仍受客户端的超时配置限制
+            async with asyncio.timeout(deadline):
+                if LLM_STREAM:
+                    raw_content = await _stream_llm_content(client, text)
+                else:
+                    resp = await client.post(DEFAULT_QWEN_API_URL, headers=_build_headers(), json=_build_payload(text))
+                    resp.raise_for_status()
+                    raw_content = extract_raw_content(resp.json())
+        except (httpx.HTTPError, TimeoutError) as e:
+            reason = "timeout" if isinstance(e, (httpx.TimeoutException, TimeoutError)) else "http_error"
+            _observe_upstream(reason, time.monotonic() - started)
+            LLM_FALLBACKS.labels(reason).inc()
+            settled = True
+            llm_breaker.record_failure(ticket, "timeout" if reason == "timeout" else "error")
+            logger.error("调用通义千问 API 失败：%s", str(e) or f"超过总时长上限 {deadline:.1f}s")
+            return None
+        except Exception as e:  # noqa: BLE001
+            # 上游有响应但内容无法解析，不计入熔断
+            _observe_upstream("ok", time.monotonic() - started)
+            LLM_FALLBACKS.labels("json_parse").inc()
+            settled = True
+            llm_breaker.record_success(ticket, time.monotonic() - started)
+            logger.error("解析通义千问响应失败：%s", e)
+            return None
+        finally:
+            llm_slots.release(time.monotonic() - started)
+        settled = True
+        llm_breaker.record_success(ticket, time.monotonic() - started)
+        _observe_upstream("ok", time.monotonic() - started)
+    finally:
+        if not settled:
+            llm_breaker.release(ticket)
+
+    if raw_content is None:
+        LLM_FALLBACKS.labels("json_parse").inc()
+        return None
+    return parse_llm_content(raw_content)
+
+
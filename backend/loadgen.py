@@ -0,0 +1,168 @@
+"""
+/api/analyze 压测工具（asyncio 开环负载）
+
+说明：
+- 按目标 RPS 匀速发起请求，不等待前一个请求完成；同时进行的请求超过 --max-in-flight 时丢弃该次发送并计数
+- 报告实际吞吐、延迟分位数、状态码分布，以及 LLM 回退比例：
+  200 响应中 meta.engine 为 rule 的比例，和 meta.llm_status（ok/failed/late）的分布
+- 随机脚本与 benchmark.py 使用同一个生成器（synthetic.py），信号词取自本地默认词库
+- 默认不读缓存（use_cache=false），每个请求都经过引擎；服务端开启了客户端限流（RATE_LIMIT_RPS）时会返回 429，压测时应关闭
+- 配合 fake_dashscope.py 可以完全离线地测量超时、连接池和回退行为
+
+用法：
+    python loadgen.py http://127.0.0.1:8000 --rps 50 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from synthetic import percentile, signal_words, synthetic_script
+
+# 随机脚本的信号词密度（与 benchmark.py 的 medium 档相同）
+DENSITY = 0.08
+
+
+def load_texts(path: Optional[str], count: int, seed: int) -> List[str]:
+    """从 JSONL（text 字段）读取脚本；不指定时随机生成 50-2000 字的脚本"""
+    if path:
+        with open(path, "r", encoding="utf-8") as handle:
+            return [json.loads(line)["text"] for line in handle if line.strip()]
+    rng = random.Random(seed)
+    words = signal_words()
+    return [synthetic_script(rng, rng.randint(50, 2000), DENSITY, words) for _ in range(count)]
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class LoadStats:
+    """压测过程中的统计"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.status_counts: Dict[str, int] = {}
+        self.engines: Dict[str, int] = {}
+        self.llm_status: Dict[str, int] = {}
+        self.dropped = 0
+
+    def record(self, status: str, latency: float, meta: Optional[dict]) -> None:
+        self.latencies.append(latency)
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if meta is not None:
+            engine = meta.get("engine", "unknown")
+            self.engines[engine] = self.engines.get(engine, 0) + 1
+            if meta.get("llm_status"):
+                self.llm_status[meta["llm_status"]] = self.llm_status.get(meta["llm_status"], 0) + 1
+
+    def report(self, elapsed: float, target_rps: float) -> Dict[str, object]:
+        ok = sum(self.engines.values())
+        return {
+            "target_rps": target_rps,
+            "completed": len(self.latencies),
+            "dropped": self.dropped,
+            "elapsed_s": round(elapsed, 2),
+            "throughput_per_s": round(len(self.latencies) / elapsed, 1) if elapsed else None,
+            "latency_ms": {
+                "p50": _ms(percentile(self.latencies, 0.5)),
+                "p90": _ms(percentile(self.latencies, 0.9)),
+                "p99": _ms(percentile(self.latencies, 0.99)),
+                "max": _ms(max(self.latencies, default=None)),
+            },
+            "status_counts": self.status_counts,
+            "engines": self.engines,
+            "llm_status": self.llm_status,
+            "fallback_rate": round(self.engines.get("rule", 0) / ok, 4) if ok else None,
+        }
+
+
+async def _send(client: httpx.AsyncClient, body: dict, stats: LoadStats) -> None:
+    started = time.perf_counter()
+    meta: Optional[dict] = None
+    try:
+        resp = await client.post("/api/analyze", json=body)
+        status = str(resp.status_code)
+        if resp.status_code == 200:
+            meta = resp.json().get("meta") or {}
+    except (httpx.HTTPError, ValueError) as e:
+        # 连接错误、超时，或 200 响应不是 JSON（例如代理返回的错误页）：按异常类型计入状态码分布
+        status = type(e).__name__
+    stats.record(status, time.perf_counter() - started, meta)
+
+
+async def run_load(
+    base_url: str,
+    texts: List[str],
+    rps: float,
+    duration: float,
+    max_in_flight: int,
+    timeout: float,
+    use_cache: bool = False,
+    deadline_ms: Optional[int] = None,
+    api_key: Optional[str] = None,
+) -> Dict[str, object]:
+    """以 rps 的速率持续 duration 秒发起请求，等待全部完成后返回报告"""
+    stats = LoadStats()
+    headers = {"X-API-Key": api_key} if api_key else {}
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    in_flight: set = set()
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        total = int(rps * duration)
+        for index in range(total):
+            # 按计划时间发送，不受前面请求耗时影响
+            delay = started + index / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= max_in_flight:
+                stats.dropped += 1
+                continue
+            body = {"text": texts[index % len(texts)], "use_cache": use_cache}
+            if deadline_ms is not None:
+                body["deadline_ms"] = deadline_ms
+            task = asyncio.ensure_future(_send(client, body, stats))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.wait(in_flight)
+        elapsed = time.perf_counter() - started
+    return stats.report(elapsed, rps)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="/api/analyze 压测工具")
+    parser.add_argument("base_url", help="服务地址，如 http://127.0.0.1:8000")
+    parser.add_argument("--rps", type=float, default=20.0, help="目标每秒请求数")
+    parser.add_argument("--duration", type=float, default=30.0, help="持续时间（秒）")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="同时进行的请求上限，超出的发送被丢弃")
+    parser.add_argument("--timeout", type=float, default=30.0, help="单个请求的客户端超时（秒）")
+    parser.add_argument("--corpus", help="JSONL 语料（text 字段）；不指定时随机生成")
+    parser.add_argument("--count", type=int, default=500, help="随机生成的脚本数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--use-cache", action="store_true", help="允许读取结果缓存")
+    parser.add_argument("--deadline-ms", type=int, default=None, help="每个请求的 LLM 截止时间")
+    parser.add_argument("--api-key", help="请求携带的 X-API-Key")
+    parser.add_argument("--output", help="报告写入的 JSON 文件")
+    args = parser.parse_args(argv)
+
+    texts = load_texts(args.corpus, args.count, args.seed)
+    report = asyncio.run(run_load(
+        args.base_url, texts, args.rps, args.duration, args.max_in_flight, args.timeout,
+        use_cache=args.use_cache, deadline_ms=args.deadline_ms, api_key=args.api_key,
+    ))
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
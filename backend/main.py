@@ -1,15 +1,121 @@
 """
 FastAPI 主入口
 """
-from fastapi import FastAPI, HTTPException, status
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, WebSocket, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from pydantic_core import to_json
 
-from config import API_VERSION, DEFAULT_ENGINE, MAX_TEXT_LENGTH, MIN_TEXT_LENGTH
-from llm_scorer import score_by_llm
-from schema import AnalyzeRequest, AnalyzeResponse, HealthResponse
+from config import (
+    API_VERSION,
+    BATCH_LLM_CONCURRENCY,
+    DEFAULT_ENGINE,
+    JOBS_LLM_DEADLINE_MS,
+    JOBS_MAX_WAIT_SECONDS,
+    JOBS_WORKERS,
+    LEXICON_RELOAD_SECONDS,
+    LIVE_MAX_SESSIONS,
+    LLM_DEADLINE_MS,
+    MAX_TEXT_LENGTH,
+    MIN_TEXT_LENGTH,
+    SSE_HEARTBEAT_SECONDS,
+)
+from admission import (
+    BATCH,
+    admission_stats,
+    admit_client,
+    admit_connection,
+    ensure_llm_capacity,
+    is_admin,
+    llm_priority,
+)
+from job_queue import QueueFullError, get_job_queue, start_job_queue, stop_job_queue
+from lexicon_registry import Lexicon, LexiconError, UnknownModeError, lexicons
+from live_session import LiveConnection
+from metrics import (
+    CACHE_LOOKUPS,
+    CONTENT_TYPE,
+    ENGINE_RESULTS,
+    LLM_ADMISSION_ACTIVE,
+    LLM_ADMISSION_WAITING,
+    LLM_BREAKER_FAILURE_RATE,
+    LLM_BREAKER_STATE,
+    LIVE_SESSIONS,
+    REGISTRY,
+    RESPONSE_SERIALIZE_SECONDS,
+    TEXT_LENGTH_CHARS,
+    MetricsMiddleware,
+)
+from profiling import profile_request, record_stage
+from result_cache import make_cache_key, normalize_text, result_cache, with_cache_status
+from rule_pool import score_by_rules_pooled, shutdown_rule_pool
+from schema import (
+    AnalyzeRequest,
+    AnalyzeResponse,
+    BatchAnalyzeRequest,
+    BatchAnalyzeResponse,
+    BatchItemError,
+    BatchItemResult,
+    HealthResponse,
+    JobCreateRequest,
+    JobResponse,
+)
 from scorer_rules import score_by_rules
+from single_flight import SingleFlight
+from warmup import startup_report, warm_up
+
+# LLM 调用栈（httpx、熔断器）和近似重复索引（NumPy）只在 LLM 模式下使用，规则模式不导入，缩短冷启动
+if DEFAULT_ENGINE == "llm":
+    from circuit_breaker import CLOSED, HALF_OPEN, OPEN
+    from llm_scorer import close_async_client, llm_breaker, score_by_llm_async
+    from near_duplicate import near_duplicates
+else:
+    llm_breaker = None
+    near_duplicates = None
+
+logger = logging.getLogger(__name__)
+
+# 相同文本 + 引擎的并发请求只发起一次 LLM 调用
+engine_flights = SingleFlight()
+# 在线的实时评分会话数
+live_sessions = 0
+
 
-app = FastAPI(title="剧情短视频体检器 API", version=API_VERSION)
+async def watch_lexicons(interval: float) -> None:
+    """定期检查词库文件和规则表，有变化时在线程中重新加载（编译期间不阻塞事件循环）"""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(lexicons.reload_if_changed)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    应用生命周期：启动任务 worker 和词库检查，预热后标记就绪（见 warmup.py）；
+    关闭时先取消就绪，再停止它们，释放 LLM 连接池和规则引擎进程池
+    """
+    await start_job_queue(run_job, JOBS_WORKERS)
+    lexicon_watch = asyncio.ensure_future(watch_lexicons(LEXICON_RELOAD_SECONDS)) if LEXICON_RELOAD_SECONDS > 0 else None
+    await warm_up(app)
+    yield
+    startup_report.ready = False
+    if lexicon_watch is not None:
+        lexicon_watch.cancel()
+    await stop_job_queue()
+    if DEFAULT_ENGINE == "llm":
+        await close_async_client()
+    shutdown_rule_pool()
+
+
+app = FastAPI(title="剧情短视频体检器 API", version=API_VERSION, lifespan=lifespan)
 
 # 配置 CORS
 app.add_middleware(
@@ -19,6 +125,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 请求耗时（放在最外层，包含 CORS 处理）；启动报告记录就绪后第一个成功响应
+app.add_middleware(MetricsMiddleware, on_response=startup_report.observe_response)
 
 
 @app.get("/health", response_model=HealthResponse)
@@ -27,6 +135,18 @@ async def health_check():
     return HealthResponse(ok=True)
 
 
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """
+    就绪检查：启动预热完成前返回 503，之后返回 200 和启动耗时报告
+
+    托管平台的健康检查应使用本端点；/health 只表示进程存活。
+    """
+    if not startup_report.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return startup_report.snapshot()
+
+
 @app.get("/debug/config")
 async def debug_config():
     """调试端点：显示当前配置状态"""
@@ -34,6 +154,7 @@ async def debug_config():
     
     # 检查环境变量（不暴露完整 API Key）
     has_api_key = bool(LLM_API_KEY)
+    job_queue = get_job_queue()
     api_key_preview = f"{LLM_API_KEY[:8]}..." if LLM_API_KEY else "未设置"
     
     import os
@@ -62,19 +183,57 @@ async def debug_config():
             "api_key_check": "✅ 已设置" if has_api_key else "❌ 未设置",
             "engine_selection": DEFAULT_ENGINE,
             "expected_engine": "llm" if (ENABLE_LLM and has_api_key) else "rule",
-        }
+        },
+        "cache": result_cache.stats() if result_cache is not None else None,
+        "single_flight": engine_flights.stats(),
+        "llm_breaker": llm_breaker.snapshot() if llm_breaker is not None else None,
+        "jobs": await job_queue.stats() if job_queue is not None else None,
+        "admission": admission_stats(),
+        "near_duplicates": near_duplicates.stats() if near_duplicates is not None else None,
+        "live_sessions": live_sessions,
+        "lexicons": lexicons.stats(),
+        "startup": startup_report.snapshot(),
     }
 
 
-@app.post("/api/analyze", response_model=AnalyzeResponse)
-async def analyze_script(request: AnalyzeRequest):
+@app.post("/admin/lexicons/reload")
+async def reload_lexicons(http_request: Request):
     """
-    分析剧情短视频脚本
-    
-    - **text**: 要分析的脚本文本
-    - **mode**: 分析模式（目前仅支持 drama_emotion）
+    立即重新加载词库和规则表（仅管理员 API Key）
+
+    成功返回各模式的新版本；文件有误时返回 422，继续使用当前版本。
+    多 worker 部署时只作用于处理本请求的进程，其他进程在 LEXICON_RELOAD_SECONDS 内自动跟进。
     """
-    text = request.text.strip()
+    if not is_admin(http_request):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="仅限管理员使用")
+    try:
+        versions = await asyncio.to_thread(lexicons.reload)
+    except LexiconError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return {"versions": versions}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 指标（文本格式）；熔断器（仅 LLM 模式）和排队情况在抓取时读取"""
+    if llm_breaker is not None:
+        breaker = llm_breaker.snapshot()
+        for state in (CLOSED, OPEN, HALF_OPEN):
+            LLM_BREAKER_STATE.labels(state).set(1 if breaker["state"] == state else 0)
+        LLM_BREAKER_FAILURE_RATE.set(breaker["failure_rate"])
+
+    admission = admission_stats()
+    LLM_ADMISSION_ACTIVE.set(admission["llm"]["active"])
+    for priority, queue in admission["llm"]["queues"].items():
+        LLM_ADMISSION_WAITING.labels(priority).set(queue["waiting"])
+    LIVE_SESSIONS.set(live_sessions)
+
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def validate_script_text(raw_text: str) -> str:
+    """规范化并校验脚本文本，返回规范化后的文本"""
+    text = normalize_text(raw_text)
     
     # 验证文本长度
     if not text:
@@ -95,24 +254,515 @@ async def analyze_script(request: AnalyzeRequest):
             detail=f"文本长度超过限制，最多支持 {MAX_TEXT_LENGTH} 个字符"
         )
 
-    # 根据配置选择评分引擎
+    TEXT_LENGTH_CHARS.observe(len(text))
+    return text
+
+
+def resolve_lexicon(mode: str) -> Lexicon:
+    """取分析模式当前的词库；模式不存在时返回 400"""
+    try:
+        return lexicons.get(mode)
+    except UnknownModeError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def json_response(content: Any, route: str) -> Response:
+    """
+    直接把已构造的响应模型序列化为 JSON（pydantic-core 的序列化器）。
+
+    返回 Response 时 FastAPI 不再按 response_model 做 model_dump -> 重新校验 -> jsonable_encoder -> json.dumps；
+    这些模型在构造时已经校验过（规则引擎直接构造，LLM 输出和磁盘缓存经 model_validate），不需要第二次。
+    response_model 仍保留在路由上，用于接口文档。
+    """
+    started = time.perf_counter()
+    body = to_json(content)
+    RESPONSE_SERIALIZE_SECONDS.labels(route).observe(time.perf_counter() - started)
+    return Response(content=body, media_type="application/json")
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+async def _call_llm(text: str, key: str, mode: str) -> Tuple[Optional[AnalyzeResponse], float]:
+    """
+    调用 LLM 并返回（结果, 耗时毫秒）。
+
+    成功的结果在这里写入缓存和近似重复索引：即使发起请求的一方已经因截止时间先返回了规则结果，
+    晚到的 LLM 结果仍会进入缓存，下一次相同（或只改动了中间几个字的）请求直接拿到 LLM 结果。
+    """
+    started = time.perf_counter()
+    result: Optional[AnalyzeResponse] = None
+    try:
+        result = await score_by_llm_async(text)
+    except Exception as e:  # noqa: BLE001
+        # 这里不抛出错误，而是记录日志并回退规则引擎
+        logger.error("LLM 评分失败，回退到规则引擎：%s", e)
+
+    if result is not None and near_duplicates is not None:
+        near_duplicates.add(key, mode, text, result)
+    if result is not None and result_cache is not None:
+        await result_cache.set(key, result)
+    return result, _elapsed_ms(started)
+
+
+RuleScorer = Callable[[str, Lexicon], Awaitable[AnalyzeResponse]]
+
+
+async def run_engines(
+    text: str,
+    key: str,
+    lexicon: Lexicon,
+    deadline_ms: Optional[int] = None,
+    rule_scorer: Optional[RuleScorer] = None,
+    llm_slots: Optional[asyncio.Semaphore] = None,
+) -> AnalyzeResponse:
+    """
+    根据配置选择评分引擎
+
+    LLM 模式下与规则引擎赛跑：规则结果立即算出，LLM 结果只有在截止时间前到达才会替换它。
+    相同请求的 LLM 调用通过 engine_flights 合并为一次。
+
+    - lexicon：本次请求的模式和词库版本（与缓存键一致，评分期间的热加载不影响本次请求）
+    - rule_scorer：规则引擎的异步执行方式（如进程池），默认在当前线程直接计算
+    - llm_slots：限制同时等待 LLM 的请求数（批量评分使用）；截止时间从拿到名额时开始计算
+    """
     if DEFAULT_ENGINE == "rule":
         # 仅使用规则引擎
-        result = score_by_rules(text)
+        return score_by_rules(text, lexicon) if rule_scorer is None else await rule_scorer(text, lexicon)
+
+    # 交互请求在 LLM 排队已满时直接返回 429（批量请求继续排队）
+    ensure_llm_capacity()
+    # 规则引擎不受 llm_slots 限制，先行开始
+    rule_call = asyncio.ensure_future(rule_scorer(text, lexicon)) if rule_scorer is not None else None
+    try:
+        async with llm_slots or nullcontext():
+            return await _race_engines(text, key, lexicon, deadline_ms, rule_call)
+    finally:
+        if rule_call is not None and not rule_call.done():
+            rule_call.cancel()
+
+
+async def _race_engines(
+    text: str,
+    key: str,
+    lexicon: Lexicon,
+    deadline_ms: Optional[int],
+    rule_call: Optional[Awaitable[AnalyzeResponse]],
+) -> AnalyzeResponse:
+    """LLM 与规则引擎赛跑，meta 中记录胜出方、LLM 状态和各自耗时"""
+    started = time.perf_counter()
+    deadline_ms = LLM_DEADLINE_MS if deadline_ms is None else deadline_ms
+    llm_call = asyncio.ensure_future(engine_flights.run(key, lambda: _call_llm(text, key, lexicon.mode)))
+
+    rule_result: Optional[AnalyzeResponse] = None
+    rule_error: Optional[Exception] = None
+    try:
+        rule_result = score_by_rules(text, lexicon) if rule_call is None else await rule_call
+    except Exception as e:  # noqa: BLE001
+        rule_error = e
+    rule_ms = _elapsed_ms(started)
+
+    llm_result: Optional[AnalyzeResponse] = None
+    llm_ms: Optional[float] = None
+    llm_status = "late"
+    try:
+        # 规则引擎没有结果时只能等待 LLM（受上游读取超时约束）
+        remaining = max(0.0, deadline_ms / 1000 - (time.perf_counter() - started)) if rule_result else None
+        llm_result, llm_ms = await asyncio.wait_for(llm_call, timeout=remaining)
+        llm_status = "ok" if llm_result is not None else "failed"
+    except asyncio.TimeoutError:
+        pass
+
+    if llm_result is not None:
+        result, winner = llm_result, "llm"
+    elif rule_result is not None:
+        result, winner = rule_result, "rule"
     else:
-        # 优先尝试 LLM，引擎失败时自动回退到规则引擎
-        llm_result: AnalyzeResponse | None = None
+        raise rule_error
+
+    return result.model_copy(update={"meta": {
+        **result.meta,
+        "engine_winner": winner,
+        "deadline_ms": deadline_ms,
+        "llm_status": llm_status,
+        "timings_ms": {"rule": rule_ms, "llm": llm_ms},
+    }})
+
+
+def lookup_near_duplicate(key: str, mode: str, text: str) -> Optional[AnalyzeResponse]:
+    """LLM 模式下复用近似重复脚本的 LLM 结果（meta.cache 为 near_hit，meta.reused 记录来源）"""
+    if near_duplicates is None or DEFAULT_ENGINE != "llm":
+        return None
+    reused = near_duplicates.lookup(key, mode, text)
+    if reused is None:
+        return None
+    CACHE_LOOKUPS.labels("near_hit").inc()
+    return with_cache_status(reused, "near_hit")
+
+
+async def analyze_text(
+    text: str,
+    mode: str,
+    use_cache: bool = True,
+    deadline_ms: Optional[int] = None,
+    rule_scorer: Optional[RuleScorer] = None,
+    llm_slots: Optional[asyncio.Semaphore] = None,
+) -> AnalyzeResponse:
+    """分析已校验的文本：先查结果缓存，再查近似重复的 LLM 结果，都未命中再调用引擎；模式不存在时返回 400"""
+    lexicon = resolve_lexicon(mode)
+    key = make_cache_key(text, DEFAULT_ENGINE, mode, lexicon.version)
+    if result_cache is not None and use_cache:
+        cached = await result_cache.get(key)
+        CACHE_LOOKUPS.labels("miss" if cached is None else "hit").inc()
+        if cached is not None:
+            return with_cache_status(cached, "hit")
+    if use_cache:
+        reused = lookup_near_duplicate(key, mode, text)
+        if reused is not None:
+            return reused
+
+    result = await run_engines(text, key, lexicon, deadline_ms, rule_scorer, llm_slots)
+    ENGINE_RESULTS.labels(result.meta.get("engine", "unknown")).inc()
+    if result_cache is None:
+        return result
+    # LLM 结果由 _call_llm 写入缓存；规则结果只在规则模式下缓存，LLM 模式下次仍会尝试 LLM
+    if DEFAULT_ENGINE == "rule":
+        await result_cache.set(key, result)
+    return with_cache_status(result, "miss" if use_cache else "bypass")
+
+
+@app.post("/api/analyze", response_model=AnalyzeResponse, dependencies=[Depends(admit_client)])
+async def analyze_script(request: AnalyzeRequest, http_request: Request):
+    """
+    分析剧情短视频脚本
+    
+    - **text**: 要分析的脚本文本
+    - **mode**: 分析模式（LEXICON_DIR 中有对应词库的模式，默认 drama_emotion；不存在时返回 400）
+    - **use_cache**: 是否读取结果缓存
+    - **deadline_ms**: LLM 结果的截止时间（毫秒），超时先返回规则引擎结果
+    - **profile** / **profile_top**: 在 meta.profile 中返回耗时分解（仅管理员 API Key，否则 403）
+
+    超出客户端限流或 LLM 排队已满时返回 429（带 Retry-After）。
+    """
+    if request.profile:
+        if not is_admin(http_request):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="profile 仅限管理员使用")
+        return json_response(await analyze_profiled(request), "/api/analyze")
+
+    text = validate_script_text(request.text)
+    result = await analyze_text(text, request.mode, request.use_cache, request.deadline_ms)
+    return json_response(result, "/api/analyze")
+
+
+async def analyze_profiled(request: AnalyzeRequest) -> AnalyzeResponse:
+    """带耗时分解的分析：不读取缓存，各阶段耗时和可选的 cProfile 结果放在 meta.profile 中"""
+    with profile_request(request.profile_top) as report:
+        started = time.perf_counter()
+        text = validate_script_text(request.text)
+        record_stage("validation", time.perf_counter() - started)
+        result = await analyze_text(text, request.mode, use_cache=False, deadline_ms=request.deadline_ms)
+    return result.model_copy(update={"meta": {**result.meta, "profile": report}})
+
+
+async def analyze_batch_item(
+    index: int,
+    item: AnalyzeRequest,
+    llm_slots: Optional[asyncio.Semaphore],
+    default_deadline_ms: Optional[int] = None,
+) -> BatchItemResult:
+    """分析批量请求中的一条；错误按单条接口的状态码记录，不影响其他条目"""
+    deadline_ms = item.deadline_ms if item.deadline_ms is not None else default_deadline_ms
+    try:
+        text = validate_script_text(item.text)
+        result = await analyze_text(
+            text, item.mode, item.use_cache, deadline_ms,
+            rule_scorer=score_by_rules_pooled, llm_slots=llm_slots,
+        )
+    except HTTPException as e:
+        return BatchItemResult(index=index, ok=False, error=BatchItemError(status_code=e.status_code, detail=e.detail))
+    except Exception as e:  # noqa: BLE001
+        logger.error("批量评分第 %d 条失败：%s", index, e)
+        return BatchItemResult(
+            index=index, ok=False,
+            error=BatchItemError(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="评分失败，请稍后重试"),
+        )
+    return BatchItemResult(index=index, ok=True, result=result)
+
+
+def _start_batch(
+    items: List[AnalyzeRequest],
+    default_deadline_ms: Optional[int] = None,
+) -> List["asyncio.Task[BatchItemResult]"]:
+    """为每条创建任务；同一批次共享 LLM 并发名额，全局 LLM 排队中优先级低于交互请求"""
+    llm_slots = asyncio.Semaphore(BATCH_LLM_CONCURRENCY) if DEFAULT_ENGINE == "llm" else None
+    # 任务创建时复制当前 context，优先级随之传入各条目
+    token = llm_priority.set(BATCH)
+    try:
+        return [
+            asyncio.ensure_future(analyze_batch_item(index, item, llm_slots, default_deadline_ms))
+            for index, item in enumerate(items)
+        ]
+    finally:
+        llm_priority.reset(token)
+
+
+async def run_batch(items: List[AnalyzeRequest], default_deadline_ms: Optional[int] = None) -> BatchAnalyzeResponse:
+    """执行整个批次，结果与 items 顺序一致"""
+    started = time.perf_counter()
+    tasks = _start_batch(items, default_deadline_ms)
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    succeeded = sum(1 for item in results if item.ok)
+    return BatchAnalyzeResponse(results=results, meta={
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsed_ms": _elapsed_ms(started),
+    })
+
+
+async def stream_batch(items: List[AnalyzeRequest]) -> AsyncIterator[str]:
+    """按完成顺序逐行输出 BatchItemResult（NDJSON）"""
+    tasks = _start_batch(items)
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield (await next_done).model_dump_json() + "\n"
+    finally:
+        # 客户端断开时取消尚未完成的条目
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/api/analyze/batch", response_model=BatchAnalyzeResponse, dependencies=[Depends(admit_client)])
+async def analyze_script_batch(request: BatchAnalyzeRequest):
+    """
+    批量分析剧情短视频脚本
+
+    - **items**: AnalyzeRequest 列表，每条独立校验，错误只影响该条
+    - **stream**: 为 true 时以 NDJSON 流式返回，每条完成即输出一行（带 index）
+
+    规则引擎在进程池中并行执行，LLM 调用按 BATCH_LLM_CONCURRENCY 限制并发。
+    """
+    if request.stream:
+        return StreamingResponse(
+            stream_batch(request.items),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    return json_response(await run_batch(request.items), "/api/analyze/batch")
+
+
+async def run_job(kind: str, payload: dict) -> dict:
+    """任务 worker 的处理函数；LLM 结果的截止时间默认为 JOBS_LLM_DEADLINE_MS，LLM 排队优先级为批量"""
+    llm_priority.set(BATCH)
+    if kind == "batch":
+        batch = BatchAnalyzeRequest.model_validate(payload)
+        response = await run_batch(batch.items, JOBS_LLM_DEADLINE_MS)
+        return response.model_dump()
+
+    request = AnalyzeRequest.model_validate(payload)
+    text = validate_script_text(request.text)
+    deadline_ms = request.deadline_ms if request.deadline_ms is not None else JOBS_LLM_DEADLINE_MS
+    result = await analyze_text(text, request.mode, request.use_cache, deadline_ms)
+    return result.model_dump()
+
+
+@app.post(
+    "/api/jobs",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(admit_client)],
+)
+async def create_job(request: JobCreateRequest, response: Response):
+    """
+    提交异步分析任务，立即返回任务 id
+
+    - **kind**: analyze（单条）或 batch（批量）
+    - **payload**: 对应的 AnalyzeRequest / BatchAnalyzeRequest
+
+    请求体在提交时校验（单条任务的文本长度也在此校验），排队已满时返回 503。
+    """
+    try:
+        if request.kind == "batch":
+            payload = BatchAnalyzeRequest.model_validate(request.payload).model_dump()
+        else:
+            payload = AnalyzeRequest.model_validate(request.payload).model_dump()
+            validate_script_text(payload["text"])
+            resolve_lexicon(payload["mode"])
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=e.errors(include_url=False, include_context=False),
+        )
+
+    job_queue = get_job_queue()
+    if job_queue is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="任务队列未启动")
+    try:
+        job = await job_queue.submit(request.kind, payload)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+    response.headers["Location"] = f"/api/jobs/{job['id']}"
+    return JobResponse(**job)
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="长轮询：最多等待多少秒直到任务结束"),
+):
+    """
+    查询异步任务状态和结果
+
+    - **wait**: 大于 0 时为长轮询，任务结束或等待超时后返回（上限 JOBS_MAX_WAIT_SECONDS）
+
+    任务不存在或结果已过期时返回 404。
+    """
+    job_queue = get_job_queue()
+    if job_queue is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="任务队列未启动")
+    if wait > 0:
+        job = await job_queue.wait(job_id, min(wait, JOBS_MAX_WAIT_SECONDS))
+    else:
+        job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在或已过期")
+    return JobResponse(**job)
+
+
+def _sse(event: str, data: str) -> str:
+    """格式化一条 Server-Sent Event"""
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+def _phase_of(result: AnalyzeResponse) -> str:
+    """结果对应的阶段事件名：rule 或 llm"""
+    return "rule" if result.meta.get("engine") == "rule" else "llm"
+
+
+async def stream_analysis(text: str, lexicon: Lexicon, use_cache: bool = True) -> AsyncIterator[str]:
+    """
+    两阶段分析的事件流：
+
+    1. rule：规则引擎结果（毫秒级）
+    2. heartbeat：等待 LLM 期间定期发送，防止代理断开空闲连接
+    3. llm：LLM 结果（仅 LLM 模式，且调用成功时）
+    4. done：结束，data 中给出最终采用的阶段
+    """
+    mode = lexicon.mode
+    key = make_cache_key(text, DEFAULT_ENGINE, mode, lexicon.version)
+    if result_cache is not None and use_cache:
+        cached = await result_cache.get(key)
+        CACHE_LOOKUPS.labels("miss" if cached is None else "hit").inc()
+        if cached is not None:
+            phase = _phase_of(cached)
+            yield _sse(phase, with_cache_status(cached, "hit").model_dump_json())
+            yield _sse("done", json.dumps({"final": phase, "cache": "hit"}))
+            return
+    if use_cache:
+        reused = lookup_near_duplicate(key, mode, text)
+        if reused is not None:
+            yield _sse("llm", reused.model_dump_json())
+            yield _sse("done", json.dumps({"final": "llm", "cache": "near_hit"}))
+            return
+
+    llm_call: Optional[asyncio.Future] = None
+    if DEFAULT_ENGINE == "llm":
+        llm_call = asyncio.ensure_future(engine_flights.run(key, lambda: _call_llm(text, key, mode)))
+
+    final: Optional[str] = None
+    llm_status: Optional[str] = None
+    try:
+        started = time.perf_counter()
         try:
-            llm_result = score_by_llm(text)
+            rule_result = score_by_rules(text, lexicon)
         except Exception as e:  # noqa: BLE001
-            # 这里不抛出错误，而是记录日志并回退规则引擎
-            import logging
+            logger.error("规则引擎评分失败：%s", e)
+        else:
+            final = "rule"
+            rule_result = rule_result.model_copy(update={"meta": {
+                **rule_result.meta, "timings_ms": {"rule": _elapsed_ms(started)},
+            }})
+            if result_cache is not None and DEFAULT_ENGINE == "rule":
+                await result_cache.set(key, rule_result)
+            yield _sse("rule", rule_result.model_dump_json())
 
-            logging.getLogger(__name__).error("LLM 评分失败，回退到规则引擎：%s", e)
+        if llm_call is not None:
+            while not (await asyncio.wait({llm_call}, timeout=SSE_HEARTBEAT_SECONDS))[0]:
+                yield _sse("heartbeat", json.dumps({"elapsed_ms": _elapsed_ms(started)}))
+            llm_result, llm_ms = llm_call.result()
+            llm_status = "ok" if llm_result is not None else "failed"
+            if llm_result is not None:
+                final = "llm"
+                yield _sse("llm", llm_result.model_copy(update={"meta": {
+                    **llm_result.meta, "timings_ms": {"llm": llm_ms},
+                }}).model_dump_json())
+
+        if final is not None:
+            ENGINE_RESULTS.labels("rule" if final == "rule" else llm_result.meta.get("engine", "llm")).inc()
+        if final is None:
+            yield _sse("error", json.dumps({"detail": "评分失败，请稍后重试"}, ensure_ascii=False))
+        yield _sse("done", json.dumps({"final": final, "llm_status": llm_status}))
+    finally:
+        # 客户端断开时只取消本请求的等待，共享的 LLM 调用继续执行并写入缓存
+        if llm_call is not None and not llm_call.done():
+            llm_call.cancel()
+
+
+@app.post("/api/analyze/stream", dependencies=[Depends(admit_client)])
+async def analyze_script_stream(request: AnalyzeRequest):
+    """
+    流式分析（Server-Sent Events）
 
-        result = llm_result or score_by_rules(text)
+    先推送规则引擎的 AnalyzeResponse，LLM 结果就绪后再推送一次，最后推送 done 事件。
+    """
+    text = validate_script_text(request.text)
+    lexicon = resolve_lexicon(request.mode)
+    if DEFAULT_ENGINE == "llm":
+        ensure_llm_capacity()
+    return StreamingResponse(
+        stream_analysis(text, lexicon, request.use_cache),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def live_llm_pass(text: str, mode: str) -> AnalyzeResponse:
+    """实时会话停止输入后的评分：与 /api/analyze 相同的校验、缓存、近似重复复用和排队检查"""
+    text = validate_script_text(text)
+    ensure_llm_capacity()
+    return await analyze_text(text, mode)
+
+
+@app.websocket("/api/live")
+async def live_scoring(websocket: WebSocket):
+    """
+    编辑器实时评分（WebSocket）
+
+    客户端先发送 {"type": "init", "text", "mode"}，之后每次输入发送 {"type": "edit", "start", "end", "text", "version"}；
+    每条消息后推送规则引擎的 score 事件，LLM 模式下停止输入一段时间后再推送 llm 事件。
+    握手按一次请求限流；超出限流或会话数达到 LIVE_MAX_SESSIONS 时以 1013（稍后重试）关闭。
+    """
+    global live_sessions
+    if admit_connection(websocket) > 0 or live_sessions >= LIVE_MAX_SESSIONS:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
 
-    return result
+    await websocket.accept()
+    live_sessions += 1
+    try:
+        await LiveConnection(websocket, live_llm_pass if DEFAULT_ENGINE == "llm" else None).run()
+    finally:
+        live_sessions -= 1
 
 
 if __name__ == "__main__":
@@ -0,0 +1,309 @@
+"""
+Prometheus 监控指标
+
+说明：
+- 不依赖 prometheus_client，按 Prometheus 文本格式（0.0.4）自行输出，/metrics 端点直接返回 render() 的结果
+- 指标为进程内全局实例；多进程部署（多个 uvicorn worker、规则引擎进程池）时各进程分别统计，
+  进程池中的规则评分不计入各阶段耗时
+- 规则引擎热路径上每个阶段只有一次 perf_counter 和一次直方图累加，不加锁，
+  并发写入时偶尔丢失一次计数可以接受
+"""
+import bisect
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from profiling import stage_profile
+
+# 默认耗时分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 规则引擎各阶段耗时分桶（秒），单个阶段通常在亚毫秒到几毫秒之间
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+# 文本长度分桶（字符）
+LENGTH_BUCKETS = (50, 100, 200, 500, 1000, 2000, 3000, 4000, 5000)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _Metric:
+    """指标基类：按标签值保存子指标"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        REGISTRY.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """取得（不存在时创建）指定标签值的子指标"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+            child = self._children.setdefault(tuple(str(value) for value in values), self._new_child())
+        return child
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._children[()].inc(amount)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            yield f"{self.name}_total{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Gauge(_Metric):
+    """可任意设置的数值（抓取时更新）"""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def set(self, value: float) -> None:
+        self._children[()].set(value)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        # 最后一个桶对应 +Inf；各桶分别计数，输出时再累加
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def total(self, **labels: str) -> Tuple[int, float]:
+        """标签值与 labels 一致的子直方图合计的（次数, 总和）；未指定的标签不限（基准测试使用）"""
+        count, total = 0, 0.0
+        for values, child in list(self._children.items()):
+            named = dict(zip(self.labelnames, values))
+            if all(named.get(name) == value for name, value in labels.items()):
+                count += sum(child.counts)
+                total += child.sum
+        return count, total
+
+    def _samples(self) -> Iterable[str]:
+        bucket_labels = self.labelnames + ("le",)
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds + (float("inf"),), list(child.counts)):
+                cumulative += count
+                labels = _format_labels(bucket_labels, values + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class StageTimer:
+    """
+    依次记录各阶段耗时：每次 lap 记录从上一次 lap（或创建）到现在的时间。
+    当前请求开启了 profile 时同时写入耗时分解
+    """
+
+    __slots__ = ("stages", "profile", "last")
+
+    def __init__(self, stages: Dict[str, _HistogramValue]):
+        # stages 为预先取得的 {阶段名: 子直方图}，热路径上不再按标签查找
+        self.stages = stages
+        self.profile = stage_profile.get()
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        elapsed = now - self.last
+        self.stages[stage].observe(elapsed)
+        if self.profile is not None:
+            self.profile[stage] = self.profile.get(stage, 0.0) + elapsed
+        self.last = now
+
+
+# ---- 指标定义 ----
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP 请求耗时（流式响应计到最后一个分块发送完）",
+    ("method", "route", "status"),
+)
+TEXT_LENGTH_CHARS = Histogram(
+    "script_text_length_chars", "校验通过的脚本文本长度（字符）", buckets=LENGTH_BUCKETS,
+)
+RULE_STAGE_SECONDS = Histogram(
+    "rule_engine_stage_seconds",
+    "规则引擎各阶段耗时：document（断句和信号扫描）、rhythm、emotion_curve、retention（规则表中各维度的评分项）、evidence、response",
+    ("stage",),
+    buckets=STAGE_BUCKETS,
+)
+RULE_STAGES = {
+    stage: RULE_STAGE_SECONDS.labels(stage)
+    for stage in ("document", "rhythm", "emotion_curve", "retention", "evidence", "response")
+}
+RESPONSE_SERIALIZE_SECONDS = Histogram(
+    "response_serialize_seconds", "已构造的响应模型序列化为 JSON 的耗时", ("route",), buckets=STAGE_BUCKETS,
+)
+LLM_UPSTREAM_SECONDS = Histogram(
+    "llm_upstream_seconds", "通义千问上游调用耗时（不含排队）", ("outcome",),
+)
+LLM_PARSE_SECONDS = Histogram(
+    "llm_parse_seconds", "模型输出解析为 AnalyzeResponse 的耗时", buckets=STAGE_BUCKETS,
+)
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "llm_queue_wait_seconds", "等待 LLM 并发名额的时间", ("priority",),
+)
+LLM_FALLBACKS = Counter(
+    "llm_fallback",
+    "LLM 未给出结果、回退规则引擎的次数：breaker_open、queue_full、http_error、timeout、json_parse、schema_validation",
+    ("reason",),
+)
+ENGINE_RESULTS = Counter("analyze_engine", "返回结果的引擎（meta.engine）", ("engine",))
+CACHE_LOOKUPS = Counter("result_cache_lookups", "结果缓存查询：hit、miss，以及复用近似重复结果的 near_hit", ("result",))
+
+LLM_BREAKER_STATE = Gauge("llm_breaker_state", "LLM 熔断器状态（当前状态为 1）", ("state",))
+LLM_BREAKER_FAILURE_RATE = Gauge("llm_breaker_failure_rate", "熔断器窗口内的失败率")
+LLM_ADMISSION_ACTIVE = Gauge("llm_admission_active", "正在进行的 LLM 调用数")
+LLM_ADMISSION_WAITING = Gauge("llm_admission_waiting", "等待 LLM 名额的请求数", ("priority",))
+LLM_ADMISSION_REJECTED = Counter("llm_admission_rejected", "因 LLM 排队已满被拒绝的请求数")
+RATE_LIMITED = Counter("rate_limit_rejected", "因客户端限流被拒绝的请求数（HTTP 请求和 WebSocket 握手）")
+LIVE_SESSIONS = Gauge("live_sessions", "在线的实时评分会话（WebSocket）数")
+STARTUP_SECONDS = Gauge("startup_seconds", "进程启动到各启动阶段（lifespan、ready、first_response）的耗时（秒）", ("phase",))
+
+
+class MetricsMiddleware:
+    """
+    ASGI 中间件：按路由模板、方法和状态码记录请求耗时
+
+    on_response(路由模板, 状态码, 耗时秒) 在每个请求结束时调用（启动报告用它记录第一个成功响应）；
+    启动预热发出的请求（scope 的 extensions 中有 warmup）不记录。
+    """
+
+    def __init__(self, app, on_response: Optional[Callable[[str, int, float], None]] = None):
+        self.app = app
+        self.on_response = on_response
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or "warmup" in scope.get("extensions", ()):
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code: Optional[int] = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            path = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], path, str(status_code or 500)).observe(elapsed)
+            if self.on_response is not None:
+                self.on_response(path, status_code or 500, elapsed)
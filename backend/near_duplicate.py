@@ -0,0 +1,174 @@
+"""
+近似重复脚本的 LLM 结果复用（MinHash + LSH 分桶）
+
+说明：
+- 创作者常常只改几个字就重新提交；与最近 LLM 评分过的脚本足够相似时，直接复用那次的 LLM 结果，不再调用上游
+- 相似度为字符 3-gram 集合的 Jaccard 系数：MinHash 签名按 LSH 分桶找出候选，再用精确的 Jaccard 复核
+- 规则对开头和结尾（各 NEAR_DUP_EDGE_CHARS 个字符）权重很高，改动涉及这两段时不复用
+- 只索引真实的 LLM 结果（复用得到的结果不再进入索引，避免一次次偏离原始分析）
+- 复用时去掉在新脚本中已找不到的证据片段，meta.reused 中记录来源和相似度
+- 索引只在事件循环线程中访问，不加锁；按条目数 LRU 淘汰，条目与结果缓存使用相同的 TTL
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config import (
+    CACHE_TTL_SECONDS,
+    NEAR_DUP_EDGE_CHARS,
+    NEAR_DUP_ENABLED,
+    NEAR_DUP_MAX_ENTRIES,
+    NEAR_DUP_THRESHOLD,
+)
+from schema import AnalyzeResponse
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# 哈希排列 (a * x + b) mod p，p = 2^31 - 1：a < 2^31、x < 2^32，乘积和加上 b 都不超过 2^64，uint64 运算不会溢出
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+def shingles(text: str) -> Set[str]:
+    """字符 3-gram 集合；短于 3 个字符的文本整体作为一个元素"""
+    if len(text) < SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def edges_unchanged(old: str, new: str, edge: int) -> bool:
+    """两段文本的开头和结尾 edge 个字符都相同（改动只在中间）"""
+    if len(old) <= 2 * edge or len(new) <= 2 * edge:
+        return False
+    return old[:edge] == new[:edge] and old[-edge:] == new[-edge:]
+
+
+def adapt_result(result: AnalyzeResponse, text: str, source_key: str, similarity: float) -> AnalyzeResponse:
+    """把复用的结果调整到新脚本：去掉找不到的证据片段，meta 中标注复用来源"""
+    evidence = [item for item in result.evidence if item.text in text]
+    return result.model_copy(update={
+        "evidence": evidence,
+        "meta": {**result.meta, "reused": {"source": source_key[:16], "similarity": round(similarity, 4)}},
+    })
+
+
+@dataclass
+class _Entry:
+    key: str
+    mode: str
+    text: str
+    result: AnalyzeResponse
+    expires_at: float
+    bands: List[Tuple[int, int]] = field(default_factory=list)
+
+
+class NearDuplicateIndex:
+    """最近 LLM 评分过的脚本的近似重复索引"""
+
+    def __init__(
+        self,
+        max_entries: int,
+        threshold: float,
+        edge_chars: int,
+        ttl_seconds: float,
+        seed: int = 1,
+    ):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.edge_chars = edge_chars
+        self.ttl_seconds = ttl_seconds
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_MERSENNE_PRIME), size=(NUM_PERM, 1), dtype=np.uint64)
+        self._b = rng.integers(0, int(_MERSENNE_PRIME), size=(NUM_PERM, 1), dtype=np.uint64)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, int], Set[str]] = {}
+        self._stats: Dict[str, int] = {"lookups": 0, "reused": 0, "rejected_edges": 0, "rejected_similarity": 0}
+
+    def _band_keys(self, items: Set[str]) -> List[Tuple[int, int]]:
+        """MinHash 签名分成 BANDS 段，每段的哈希作为分桶键"""
+        # 进程内索引，使用内置 hash 即可（不需要跨进程稳定）
+        values = np.fromiter((hash(item) & 0xFFFFFFFF for item in items), dtype=np.uint64, count=len(items))
+        permuted = (self._a * values + self._b) % _MERSENNE_PRIME
+        signature = permuted.min(axis=1)
+        return [(band, hash(signature[band * ROWS:(band + 1) * ROWS].tobytes())) for band in range(BANDS)]
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in entry.bands:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def add(self, key: str, mode: str, text: str, result: AnalyzeResponse) -> None:
+        """索引一次 LLM 评分结果（复用得到的结果不索引）"""
+        if "reused" in result.meta:
+            return
+        self._remove(key)
+        entry = _Entry(key, mode, text, result, time.time() + self.ttl_seconds, self._band_keys(shingles(text)))
+        self._entries[key] = entry
+        for band_key in entry.bands:
+            self._buckets.setdefault(band_key, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def lookup(self, key: str, mode: str, text: str) -> Optional[AnalyzeResponse]:
+        """查找可复用的结果：相似度不低于阈值且开头结尾未改动，返回调整后的结果"""
+        self._stats["lookups"] += 1
+        if len(text) <= 2 * self.edge_chars:
+            return None
+        items = shingles(text)
+        candidates: Set[str] = set()
+        for band_key in self._band_keys(items):
+            candidates |= self._buckets.get(band_key, set())
+
+        now = time.time()
+        best: Optional[Tuple[float, _Entry]] = None
+        edge_rejected = False
+        for candidate in candidates:
+            entry = self._entries.get(candidate)
+            if entry is None or entry.mode != mode or candidate == key:
+                continue
+            if entry.expires_at < now:
+                self._remove(candidate)
+                continue
+            if not edges_unchanged(entry.text, text, self.edge_chars):
+                edge_rejected = True
+                continue
+            similarity = jaccard(shingles(entry.text), items)
+            if similarity >= self.threshold and (best is None or similarity > best[0]):
+                best = (similarity, entry)
+
+        if best is None:
+            if edge_rejected:
+                self._stats["rejected_edges"] += 1
+            elif candidates:
+                self._stats["rejected_similarity"] += 1
+            return None
+        similarity, entry = best
+        self._entries.move_to_end(entry.key)
+        self._stats["reused"] += 1
+        return adapt_result(entry.result, text, entry.key, similarity)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "entries": len(self._entries)}
+
+
+# 进程内共享的索引；NEAR_DUP_ENABLED=false 时为 None
+near_duplicates: Optional[NearDuplicateIndex] = (
+    NearDuplicateIndex(NEAR_DUP_MAX_ENTRIES, NEAR_DUP_THRESHOLD, NEAR_DUP_EDGE_CHARS, CACHE_TTL_SECONDS)
+    if NEAR_DUP_ENABLED else None
+)
@@ -0,0 +1,91 @@
+"""
+单个请求的耗时分解（管理员排查慢请求使用）
+
+说明：
+- 请求开启 profile 时，在 contextvar 中放一个 dict，规则引擎各阶段、LLM 网络和解析耗时累加到其中；
+  未开启时各处只多一次 contextvar 读取
+- LLM 调用在独立任务中执行，任务创建时复制 context，耗时仍写入同一个 dict；
+  LLM 结果晚于截止时间到达时，响应中不包含 LLM 的耗时
+- 可选 cProfile：开启期间统计事件循环线程上的所有调用（包括同时进行的其他请求），
+  同一时间只允许一个请求使用 cProfile
+"""
+import contextvars
+import cProfile
+import os
+import pstats
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# 当前请求的阶段耗时（秒）；None 表示未开启
+stage_profile: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "stage_profile", default=None,
+)
+
+_cprofile_busy = False
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """开启了 profile 时累加阶段耗时"""
+    profile = stage_profile.get()
+    if profile is not None:
+        profile[stage] = profile.get(stage, 0.0) + seconds
+
+
+def _is_event_loop(filename: str, name: str) -> bool:
+    """事件循环自身和等待 I/O 的调用（累计耗时主要是空闲等待，不参与排序）"""
+    if filename == "~":
+        return "poll" in name or "select" in name or "control" in name
+    return filename.endswith("selectors.py") or f"{os.sep}asyncio{os.sep}" in filename
+
+
+def _top_entries(profiler: cProfile.Profile, limit: int) -> List[Dict[str, object]]:
+    """按自身耗时（tottime）取前 limit 个函数，忽略事件循环"""
+    stats = pstats.Stats(profiler).stats
+    entries = [item for item in stats.items() if not _is_event_loop(item[0][0], item[0][2])]
+    ranked = sorted(entries, key=lambda item: item[1][2], reverse=True)[:limit]
+    return [
+        {
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "calls": primitive_calls,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3),
+        }
+        for (filename, line, name), (primitive_calls, _, tottime, cumtime, _) in ranked
+    ]
+
+
+@contextmanager
+def profile_request(cprofile_top: int = 0) -> Iterator[Dict[str, object]]:
+    """
+    收集本请求的耗时分解，退出时填充返回的 dict：
+
+    - timings_ms：各阶段耗时（毫秒）
+    - total_ms：整个 with 块的耗时
+    - cprofile：cprofile_top > 0 时自身耗时最高的若干个函数；已有其他请求在使用时为 None
+    """
+    global _cprofile_busy
+    report: Dict[str, object] = {}
+    timings: Dict[str, float] = {}
+    token = stage_profile.set(timings)
+
+    profiler: Optional[cProfile.Profile] = None
+    if cprofile_top > 0 and not _cprofile_busy:
+        _cprofile_busy = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    started = time.perf_counter()
+    try:
+        yield report
+    finally:
+        total = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+            _cprofile_busy = False
+        stage_profile.reset(token)
+
+        report["timings_ms"] = {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+        report["total_ms"] = round(total * 1000, 3)
+        if cprofile_top > 0:
+            report["cprofile"] = _top_entries(profiler, cprofile_top) if profiler is not None else None
@@ -0,0 +1,158 @@
+"""
+分析结果缓存（按内容寻址）
+
+说明：
+- 缓存键 = sha256(API 版本 + 引擎 + 模式 + 词库版本 + 规范化后的文本)；词库热加载后旧结果自然不再命中
+- 第一层：进程内 LRU，按条目数淘汰，每条带过期时间（TTL）
+- 第二层（可选）：SQLite 文件，进程重启后仍然有效；设置 CACHE_SQLITE_PATH 启用
+- SQLite 读写放到线程池执行，不阻塞事件循环
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from config import (
+    API_VERSION,
+    CACHE_ENABLED,
+    CACHE_MAX_ENTRIES,
+    CACHE_SQLITE_PATH,
+    CACHE_TTL_SECONDS,
+)
+from schema import AnalyzeResponse
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """规范化脚本文本：统一 Unicode 形式和换行符，去掉首尾空白"""
+    text = unicodedata.normalize("NFC", text)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text.strip()
+
+
+def make_cache_key(text: str, engine: str, mode: str, lexicon_version: str) -> str:
+    """根据规范化文本、引擎、模式、词库版本和 API 版本生成缓存键"""
+    digest = hashlib.sha256()
+    for part in (API_VERSION, engine, mode, lexicon_version, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """两级结果缓存：内存 LRU + 可选 SQLite"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, sqlite_path: str = ""):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[float, AnalyzeResponse]]" = OrderedDict()
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0}
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, payload TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    # ---- 内存层 ----
+
+    def _memory_get(self, key: str) -> Optional[AnalyzeResponse]:
+        item = self._memory.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.time():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_set(self, key: str, value: AnalyzeResponse, expires_at: float) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    # ---- SQLite 层 ----
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, AnalyzeResponse]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT expires_at, payload FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] < time.time():
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+        try:
+            return row[0], AnalyzeResponse.model_validate_json(row[1])
+        except Exception as e:  # noqa: BLE001
+            logger.warning("缓存记录无法解析，已忽略：%s", e)
+            return None
+
+    def _disk_set(self, key: str, value: AnalyzeResponse, expires_at: float) -> None:
+        payload = value.model_dump_json()
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, expires_at, payload) VALUES (?, ?, ?)",
+                (key, expires_at, payload),
+            )
+            self._db.commit()
+
+    # ---- 对外接口 ----
+
+    async def get(self, key: str) -> Optional[AnalyzeResponse]:
+        """读取缓存，未命中返回 None"""
+        value = self._memory_get(key)
+        if value is None and self._db is not None:
+            try:
+                found = await asyncio.to_thread(self._disk_get, key)
+            except Exception as e:  # noqa: BLE001
+                logger.error("读取 SQLite 缓存失败：%s", e)
+                found = None
+            if found is not None:
+                expires_at, value = found
+                self._memory_set(key, value, expires_at)
+                self._stats["disk_hits"] += 1
+        self._stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    async def set(self, key: str, value: AnalyzeResponse) -> None:
+        """写入缓存（两级都写）"""
+        expires_at = time.time() + self.ttl_seconds
+        self._memory_set(key, value, expires_at)
+        if self._db is not None:
+            try:
+                await asyncio.to_thread(self._disk_set, key, value, expires_at)
+            except Exception as e:  # noqa: BLE001
+                logger.error("写入 SQLite 缓存失败：%s", e)
+
+    def stats(self) -> Dict[str, int]:
+        """命中/未命中等计数"""
+        return {**self._stats, "entries": len(self._memory)}
+
+
+# 进程内共享的缓存实例；CACHE_ENABLED=false 时为 None
+result_cache: Optional[ResultCache] = (
+    ResultCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_SQLITE_PATH) if CACHE_ENABLED else None
+)
+
+
+def with_cache_status(result: AnalyzeResponse, status: str) -> AnalyzeResponse:
+    """返回在 meta 中标注缓存状态（hit/miss/bypass）的副本，不修改缓存中的对象"""
+    return result.model_copy(update={"meta": {**result.meta, "cache": status}})
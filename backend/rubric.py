@@ -0,0 +1,487 @@
+"""
+声明式评分规则表（A1-C3）及其编译
+
+说明：
+- 规则表是一个 JSON 文件（默认 rubric.json，可用 RUBRIC_PATH 指定）：维度满分、区段窗口、
+  每个评分项的变量（信号来源）、档位条件、扣分和问题文案；调整阈值或文案不需要改代码
+- 启动时编译：所有评分项用到的特征（类别 × 区段的信号计数、成对句式、不同词数）去重后各计算一次，
+  变量和档位条件生成为一个直线形式的 Python 函数，逐条规则只做整数比较
+- 同一份编译结果也提供数组版本（evaluate_arrays），供 scorer_rules_batch 做语料级向量化评分
+- 规则表有误（未知类别/区段、条件无法解析、文案引用了不存在的变量等）时抛出 RubricError
+
+变量写法（同一变量的各项相加）：
+- conflict@head：类别在区段内的信号数（与 SignalIndex.signals 一致）
+- any:conflict_strong@head：区段内是否出现该类别的词（0/1）
+- distinct:emotion@full：区段内出现的不同词数
+- pair@head：区段内是否有完整的反差句式（0/1）
+- 同一规则中前面定义的变量名；项前加 - 表示减去，项内用 * 连接表示相乘
+"""
+import json
+import os
+import re
+import string
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from schema import IssueItem
+from signal_matcher import SignalMatcher
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 维度顺序与 score_by_rules 一致，规则表中的维度必须恰好是这三个
+DIMENSIONS = ("rhythm", "emotion_curve", "retention")
+DEFAULT_RUBRIC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rubric.json")
+
+_CONDITION_RE = re.compile(r"^\s*([A-Za-z_]\w*)\s*(==|!=|<=|>=|<|>)\s*(-?\d+)\s*$")
+_FEATURE_KINDS = {"": "signals", "any": "occurrences", "distinct": "distinct"}
+
+
+def _no_lap(stage: str) -> None:
+    pass
+
+
+class RubricError(ValueError):
+    """规则表无法编译"""
+
+
+class Feature(NamedTuple):
+    """一个共享特征：kind 为 signals / occurrences / distinct / pair（pair 的 category 为空）"""
+    kind: str
+    category: str
+    segment: str
+
+    @property
+    def name(self) -> str:
+        if self.kind == "pair":
+            return f"pair@{self.segment}"
+        return f"{self.kind}:{self.category}@{self.segment}"
+
+
+class Band(NamedTuple):
+    """一个档位：conditions 为 (槽位, 运算符, 阈值)，全部满足时扣分"""
+    conditions: Tuple[Tuple[int, str, int], ...]
+    deduct: int
+    issue: str
+    reason: str
+
+
+class Rule(NamedTuple):
+    id: str
+    title: str
+    dimension: int
+    guard: Optional[str]                    # 该区段为空时整条规则不适用
+    variables: Tuple[Tuple[str, int], ...]  # (变量名, 槽位)
+    bands: Tuple[Band, ...]
+
+
+class RubricArrays(NamedTuple):
+    """evaluate_arrays 的结果，第 i 行对应第 i 个脚本"""
+    levels: "np.ndarray"      # N × 规则数，命中的档位，-1 表示不扣分
+    deductions: "np.ndarray"  # N × 规则数
+    variables: "np.ndarray"   # N × 变量数，列顺序见 CompiledRubric.variable_names
+    dimensions: "np.ndarray"  # N × 3，DIMENSIONS 顺序的维度分
+
+
+def _parse_position(spec: Any, where: str) -> Tuple[str, float]:
+    """区段端点：{"chars": n} 前 n 个字符处，{"from_end": n} 距结尾 n 个字符处，{"ratio": r} 为 int(长度 × r)"""
+    if isinstance(spec, dict) and len(spec) == 1:
+        (kind, value), = spec.items()
+        if kind in ("chars", "from_end") and type(value) is int and value >= 0:
+            return kind, value
+        if kind == "ratio" and isinstance(value, (int, float)) and 0 <= value <= 1:
+            return kind, float(value)
+    raise RubricError(f"{where} 需要 chars / from_end / ratio 之一：{spec!r}")
+
+
+def _position_expr(position: Tuple[str, float]) -> str:
+    """端点在生成代码中的表达式"""
+    kind, value = position
+    if kind == "chars":
+        return "0" if value == 0 else f"min({value}, length)"
+    if kind == "from_end":
+        return "length" if value == 0 else f"max(0, length - {value})"
+    return f"int(length * {value!r})"
+
+
+def _position_array(position: Tuple[str, float], lengths: "np.ndarray") -> "np.ndarray":
+    """端点的数组版本；int(length * r) 用同样的 float64 乘法后向零截断"""
+    import numpy as np
+
+    kind, value = position
+    if kind == "chars":
+        return np.minimum(value, lengths)
+    if kind == "from_end":
+        return np.maximum(0, lengths - value)
+    return (lengths * value).astype(np.int64)
+
+
+class CompiledRubric:
+    """编译后的规则表"""
+
+    def __init__(self, table: Dict[str, Any], matcher: SignalMatcher):
+        self.version = table.get("version")
+        dimensions = table.get("dimensions") or {}
+        if tuple(dimensions) != DIMENSIONS:
+            raise RubricError(f"dimensions 必须依次为 {', '.join(DIMENSIONS)}")
+        self.dimension_scores = tuple(int(dimensions[name]) for name in DIMENSIONS)
+
+        self._segments: Dict[str, Tuple[Tuple[str, float], Tuple[str, float]]] = {}
+        for name, spec in (table.get("segments") or {}).items():
+            if not name.isidentifier():
+                raise RubricError(f"区段名 {name!r} 必须是标识符")
+            if not isinstance(spec, dict):
+                raise RubricError(f"区段 {name} 格式错误")
+            self._segments[name] = (
+                _parse_position(spec.get("start"), f"区段 {name}.start"),
+                _parse_position(spec.get("end"), f"区段 {name}.end"),
+            )
+
+        self._matcher = matcher
+        self.features: List[Feature] = []
+        self._feature_slots: Dict[Feature, int] = {}
+        # 变量：(名称, [(符号, [(槽位, 是否取 >0)])])，槽位在全部特征之后编号
+        self._variable_terms: List[Tuple[str, List[Tuple[int, List[Tuple[int, bool]]]]]] = []
+        rules = table.get("rules") or []
+        if not rules:
+            raise RubricError("rules 不能为空")
+        parsed = [self._parse_rule(rule) for rule in rules]
+        # 特征数量在全部规则解析后才确定，变量槽位整体后移
+        offset = len(self.features)
+        self.rules: Tuple[Rule, ...] = tuple(
+            rule._replace(
+                variables=tuple((name, slot + offset) for name, slot in rule.variables),
+                bands=tuple(
+                    band._replace(conditions=tuple((slot + offset, op, value) for slot, op, value in band.conditions))
+                    for band in rule.bands
+                ),
+            )
+            for rule in parsed
+        )
+        self._variable_terms = [
+            (name, [(sign, [(slot if is_feature else slot + offset, presence) for slot, presence, is_feature in factors])
+                    for sign, factors in terms])
+            for name, terms in self._variable_terms
+        ]
+        self.variable_names = tuple(name for name, _ in self._variable_terms)
+        # 特征矩阵的列名（特征行的顺序）和评分项编号，批量评分的数组结果按这两个顺序排列
+        self.feature_names = tuple(feature.name for feature in self.features)
+        self.rule_ids = tuple(rule.id for rule in self.rules)
+
+        self.source = self._generate()
+        namespace: Dict[str, Any] = {}
+        exec(compile(self.source, f"<rubric v{self.version}>", "exec"), namespace)
+        self._evaluate: Callable = namespace["evaluate"]
+        self._features: Callable = namespace["features"]
+
+    # ---- 解析 ----
+
+    def _feature_slot(self, feature: Feature) -> int:
+        slot = self._feature_slots.get(feature)
+        if slot is None:
+            slot = self._feature_slots[feature] = len(self.features)
+            self.features.append(feature)
+        return slot
+
+    def _parse_factor(self, factor: str, local: Dict[str, int], where: str) -> Tuple[int, bool, bool]:
+        """返回 (槽位, 是否取 >0, 是否为特征槽位)"""
+        if "@" not in factor:
+            if factor not in local:
+                raise RubricError(f"{where}：未定义的变量 {factor}")
+            return local[factor], False, False
+        source, _, segment = factor.rpartition("@")
+        if segment not in self._segments:
+            raise RubricError(f"{where}：未知区段 {segment}")
+        if source == "pair":
+            return self._feature_slot(Feature("pair", "", segment)), False, True
+        prefix, _, category = source.rpartition(":")
+        kind = _FEATURE_KINDS.get(prefix)
+        if kind is None:
+            raise RubricError(f"{where}：未知的来源前缀 {prefix}")
+        if category not in self._matcher.categories:
+            raise RubricError(f"{where}：未知类别 {category}")
+        return self._feature_slot(Feature(kind, category, segment)), kind == "occurrences", True
+
+    def _parse_rule(self, spec: Dict[str, Any]) -> Rule:
+        rule_id = spec.get("id")
+        if not isinstance(rule_id, str) or not rule_id.isidentifier():
+            raise RubricError(f"规则 id {rule_id!r} 必须是标识符")
+        where = f"规则 {rule_id}"
+        if not isinstance(spec.get("title", ""), str):
+            raise RubricError(f"{where}：title 必须是字符串")
+        if spec.get("dimension") not in DIMENSIONS:
+            raise RubricError(f"{where}：未知维度 {spec.get('dimension')}")
+        guard = spec.get("requires_segment")
+        if guard is not None and guard not in self._segments:
+            raise RubricError(f"{where}：未知区段 {guard}")
+
+        local: Dict[str, int] = {}
+        for name, terms in (spec.get("vars") or {}).items():
+            if not name.isidentifier() or not isinstance(terms, list) or not terms:
+                raise RubricError(f"{where}：变量 {name} 格式错误")
+            parsed_terms = []
+            for term in terms:
+                sign = -1 if term.lstrip().startswith("-") else 1
+                factors = [part.strip() for part in term.strip().lstrip("+-").split("*")]
+                parsed_terms.append((sign, [self._parse_factor(factor, local, where) for factor in factors]))
+            # 变量槽位先按变量序号记录，编译结束时再加上特征数
+            local[name] = len(self._variable_terms)
+            self._variable_terms.append((f"{rule_id}.{name}", parsed_terms))
+
+        bands = []
+        raw_bands = spec.get("bands") or []
+        for position, band in enumerate(raw_bands):
+            conditions = []
+            for condition in band.get("when") or []:
+                match = _CONDITION_RE.match(condition)
+                if match is None or match.group(1) not in local:
+                    raise RubricError(f"{where}：无法解析的条件 {condition!r}")
+                conditions.append((local[match.group(1)], match.group(2), int(match.group(3))))
+            if not conditions and position != len(raw_bands) - 1:
+                raise RubricError(f"{where}：无条件的档位只能放在最后")
+            reason = band.get("reason", "")
+            fields = {field for _, field, _, _ in string.Formatter().parse(reason) if field is not None}
+            if not fields <= set(local):
+                raise RubricError(f"{where}：原因文案引用了未定义的变量 {sorted(fields - set(local))}")
+            if not isinstance(band.get("deduct"), int) or not isinstance(band.get("issue"), str):
+                raise RubricError(f"{where}：档位需要整数 deduct 和字符串 issue")
+            bands.append(Band(tuple(conditions), band["deduct"], band["issue"], reason))
+
+        return Rule(
+            id=rule_id,
+            title=spec.get("title", ""),
+            dimension=DIMENSIONS.index(spec["dimension"]),
+            guard=guard,
+            variables=tuple(local.items()),
+            bands=tuple(bands),
+        )
+
+    # ---- 代码生成 ----
+
+    def _generate(self) -> str:
+        """
+        生成 features(index, length) 和 evaluate(index, length, IssueItem, lap) 两个函数的源码
+
+        规则表中的文本（标题、类别名、文案）只以 repr() 写入生成代码，不会改变代码结构；
+        规则 id、区段名和变量名在解析时已校验为标识符
+
+        evaluate 按规则顺序展开，每个特征在第一个用到它的规则之前计算；维度切换时调用 lap(维度名)，
+        耗时按维度记账（与 analyze_* 逐维度评分时的阶段一致），共享特征计入第一个用到它的维度；
+        规则表中同一维度的规则不连续时，该维度会分几次记录。
+        """
+        segments = sorted({feature.segment for feature in self.features} | {rule.guard for rule in self.rules if rule.guard})
+        segment_ids = {name: i for i, name in enumerate(segments)}
+        bounds_lines = []
+        for name in segments:
+            start, end = self._segments[name]
+            bounds_lines.append(f"    s{segment_ids[name]} = {_position_expr(start)}  # {name}")
+            bounds_lines.append(f"    e{segment_ids[name]} = {_position_expr(end)}")
+        feature_lines = []
+        for slot, feature in enumerate(self.features):
+            bounds = f"s{segment_ids[feature.segment]}, e{segment_ids[feature.segment]}"
+            if feature.kind == "pair":
+                expr = f"1 if index.has_pair({bounds}) else 0"
+            elif feature.kind == "distinct":
+                expr = f"len(index.distinct({feature.category!r}, {bounds}))"
+            else:
+                expr = f"index.{feature.kind}({feature.category!r}, {bounds})"
+            feature_lines.append(f"    v{slot} = {expr}  # {feature.name!r}")
+
+        lines = ["def features(index, length):"] + bounds_lines + feature_lines
+        lines.append(f"    return ({''.join(f'v{slot}, ' for slot in range(len(self.features))).rstrip()})")
+        lines.append("")
+        lines.append("def evaluate(index, length, IssueItem, lap):")
+        lines.extend(bounds_lines)
+        offset = len(self.features)
+        lines.append("    issues = []")
+        for j in range(len(DIMENSIONS)):
+            lines.append(f"    d{j} = 0")
+        emitted = set()
+        dimension = None
+        for rule in self.rules:
+            if dimension is not None and rule.dimension != dimension:
+                lines.append(f"    lap({DIMENSIONS[dimension]!r})")
+            dimension = rule.dimension
+            lines.append(f"    # {rule.id} {rule.title!r}")
+            # 本规则的变量（按定义顺序）和其中尚未计算的特征
+            variables = [slot - offset for _, slot in rule.variables]
+            needed = sorted({
+                slot
+                for i in variables
+                for _, factors in self._variable_terms[i][1]
+                for slot, _ in factors
+                if slot < offset and slot not in emitted
+            })
+            for slot in needed:
+                lines.append(feature_lines[slot])
+                emitted.add(slot)
+            for i in variables:
+                name, terms = self._variable_terms[i]
+                expr = ""
+                for sign, factors in terms:
+                    product = " * ".join(f"(1 if v{slot} > 0 else 0)" if presence else f"v{slot}" for slot, presence in factors)
+                    expr += (" - " if sign < 0 else " + ") + product
+                expr = expr[3:] if expr.startswith(" + ") else "-" + expr[3:]
+                lines.append(f"    v{offset + i} = {expr}  # {name}")
+            indent = "    "
+            if rule.guard:
+                lines.append(f"    if e{segment_ids[rule.guard]} > s{segment_ids[rule.guard]}:")
+                indent += "    "
+            names = dict(rule.variables)
+            for position, band in enumerate(rule.bands):
+                test = " and ".join(f"v{slot} {op} {value}" for slot, op, value in band.conditions)
+                keyword = "if" if position == 0 else "elif"
+                lines.append(f"{indent}{keyword} {test}:" if test else f"{indent}else:")
+                fields = sorted({field for _, field, _, _ in string.Formatter().parse(band.reason) if field is not None})
+                reason = repr(band.reason)
+                if fields:
+                    reason += ".format(" + ", ".join(f"{field}=v{names[field]}" for field in fields) + ")"
+                lines.append(f"{indent}    d{rule.dimension} += {band.deduct}")
+                lines.append(f"{indent}    issues.append(IssueItem(text={band.issue!r}, reason={reason}))")
+        lines.append(f"    lap({DIMENSIONS[dimension]!r})")
+        scores = ", ".join(f"max(0, {total} - d{j})" for j, total in enumerate(self.dimension_scores))
+        lines.append(f"    return ({scores}), issues")
+        return "\n".join(lines) + "\n"
+
+    # ---- 评估 ----
+
+    def evaluate(
+        self, doc, lap: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[Tuple[int, int, int], List[IssueItem]]:
+        """
+        对一个 ScriptDocument 评分，返回（DIMENSIONS 顺序的维度分, 按规则顺序的问题列表）
+
+        lap 为 StageTimer.lap 时按维度记录耗时（rhythm、emotion_curve、retention）
+        """
+        return self._evaluate(doc.signals, doc.length, IssueItem, lap or _no_lap)
+
+    def feature_values(self, doc) -> Tuple[int, ...]:
+        """一个脚本的全部特征值（features 顺序）"""
+        return self._features(doc.signals, doc.length)
+
+    def segment_arrays(self, lengths: "np.ndarray") -> Dict[str, Tuple["np.ndarray", "np.ndarray"]]:
+        """各区段 [start, end) 的数组版本"""
+        return {
+            name: (_position_array(start, lengths), _position_array(end, lengths))
+            for name, (start, end) in self._segments.items()
+        }
+
+    def evaluate_arrays(self, lengths: "np.ndarray", features: "np.ndarray") -> RubricArrays:
+        """由（长度, N × 特征数矩阵）计算全部档位、扣分、变量和维度分"""
+        # NumPy 只在批量评分时导入，规则引擎本身不依赖它
+        import numpy as np
+
+        values: List[np.ndarray] = [features[:, slot] for slot in range(len(self.features))]
+        for _, terms in self._variable_terms:
+            total = np.zeros(len(lengths), dtype=np.int64)
+            for sign, factors in terms:
+                product = np.ones(len(lengths), dtype=np.int64)
+                for slot, presence in factors:
+                    product = product * ((values[slot] > 0).astype(np.int64) if presence else values[slot])
+                total = total + sign * product
+            values.append(total)
+
+        compare = {
+            "==": np.equal, "!=": np.not_equal, "<=": np.less_equal,
+            ">=": np.greater_equal, "<": np.less, ">": np.greater,
+        }
+        bounds = self.segment_arrays(lengths)
+        levels, deductions = [], []
+        for rule in self.rules:
+            applies = np.ones(len(lengths), dtype=bool)
+            if rule.guard:
+                applies = bounds[rule.guard][1] > bounds[rule.guard][0]
+            conditions = []
+            for band in rule.bands:
+                matched = applies.copy()
+                for slot, op, value in band.conditions:
+                    matched &= compare[op](values[slot], value)
+                conditions.append(matched)
+            level = np.select(conditions, np.arange(len(conditions)), -1)
+            levels.append(level)
+            # 档位 -> 扣分的查找表，末尾的 0 对应 -1（不扣分）
+            deductions.append(np.array([band.deduct for band in rule.bands] + [0])[level])
+
+        levels_matrix = np.stack(levels, axis=1)
+        deductions_matrix = np.stack(deductions, axis=1)
+        dimension_columns = []
+        for j, total in enumerate(self.dimension_scores):
+            columns = [i for i, rule in enumerate(self.rules) if rule.dimension == j]
+            dimension_columns.append(np.maximum(0, total - deductions_matrix[:, columns].sum(axis=1)))
+        offset = len(self.features)
+        return RubricArrays(
+            levels=levels_matrix,
+            deductions=deductions_matrix,
+            variables=np.stack(values[offset:], axis=1) if len(values) > offset else np.zeros((len(lengths), 0), dtype=np.int64),
+            dimensions=np.stack(dimension_columns, axis=1),
+        )
+
+    def issues(self, levels: Sequence[int], variables: Sequence[int]) -> List[IssueItem]:
+        """由一行档位和变量值生成问题列表（与 evaluate 的输出一致）"""
+        offset = len(self.features)
+        issues = []
+        for rule, level in zip(self.rules, levels):
+            if level < 0:
+                continue
+            band = rule.bands[level]
+            values = {name: variables[slot - offset] for name, slot in rule.variables}
+            issues.append(IssueItem(text=band.issue, reason=band.reason.format(**values)))
+        return issues
+
+
+def load_rubric(path: str, matcher: SignalMatcher) -> CompiledRubric:
+    """读取并编译规则表；path 为空时使用内置的 rubric.json"""
+    path = path or DEFAULT_RUBRIC_PATH
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            table = json.load(handle)
+    except (OSError, ValueError) as e:
+        raise RubricError(f"无法读取规则表 {path}：{e}") from e
+    return CompiledRubric(table, matcher)
+
+
+def main() -> int:
+    """规则表编译结果与 analyze_* 参考实现的差分校验和耗时对比"""
+    import argparse
+    import time
+
+    from lexicon_registry import lexicons
+    from scorer_rules import analyze_emotion_curve, analyze_retention_triggers, analyze_rhythm, build_document
+    from synthetic import random_scripts
+
+    parser = argparse.ArgumentParser(description="规则表编译结果与 analyze_* 的差分校验")
+    parser.add_argument("path", nargs="?", default="", help="规则表路径，默认内置 rubric.json")
+    parser.add_argument("--count", type=int, default=2000, help="随机脚本数量")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rubric = load_rubric(args.path, lexicons.get().matcher)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    docs = [build_document(text) for text in random_scripts(args.count, args.seed)]
+
+    def legacy(doc):
+        results = (analyze_rhythm(doc), analyze_emotion_curve(doc), analyze_retention_triggers(doc))
+        return tuple(result[0] for result in results), [issue for result in results for issue in result[1]]
+
+    started = time.perf_counter()
+    expected = [legacy(doc) for doc in docs]
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = [rubric.evaluate(doc) for doc in docs]
+    rubric_seconds = time.perf_counter() - started
+
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+    print(f"编译：{compile_ms:.1f}ms，特征 {len(rubric.features)} 个，变量 {len(rubric.variable_names)} 个")
+    print(f"脚本数：{len(docs)}，不一致：{len(mismatches)}")
+    print(f"analyze_*：{legacy_seconds * 1e6 / len(docs):.1f}µs/条；规则表：{rubric_seconds * 1e6 / len(docs):.1f}µs/条")
+    for i in mismatches[:5]:
+        print(f"--- 第 {i} 条不一致：{docs[i].text[:40]!r}")
+        print("analyze_*:", expected[i])
+        print("规则表:", actual[i])
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+"""
+规则引擎进程池
+
+说明：
+- 规则引擎是纯 CPU 计算，在事件循环里执行会受 GIL 限制；批量评分时放到进程池并行
+- 子进程只返回可序列化的 dict（或错误描述），由主进程还原为 AnalyzeResponse
+- RULE_WORKERS=0 时不创建进程池，直接在当前进程计算
+- 子进程有自己的词库注册表：主进程传入（模式, 版本），子进程版本落后时先重新加载（词库热加载后无需重建进程池）
+"""
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional, Tuple
+
+from config import DEFAULT_MODE, RULE_WORKERS
+from lexicon_registry import Lexicon, lexicons
+from schema import AnalyzeResponse
+from scorer_rules import score_by_rules
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class RuleEngineError(Exception):
+    """子进程中规则引擎评分失败"""
+
+
+def _score_in_worker(text: str, mode: str = DEFAULT_MODE, version: Optional[str] = None) -> Tuple[bool, Any]:
+    """子进程入口：返回 (是否成功, 结果 dict 或错误描述)"""
+    try:
+        lexicon = lexicons.get(mode) if version is None else lexicons.get_version(mode, version)
+        return True, score_by_rules(text, lexicon).model_dump()
+    except Exception as e:  # noqa: BLE001
+        # 异常对象不一定能跨进程序列化，只传回描述
+        return False, f"{type(e).__name__}: {e}"
+
+
+def score_chunk_in_worker(texts: List[str]) -> List[Tuple[bool, Any]]:
+    """子进程入口：一次评分多条，减少进程间往返（离线批量评分使用）"""
+    return [_score_in_worker(text) for text in texts]
+
+
+def get_rule_pool() -> Optional[ProcessPoolExecutor]:
+    """懒加载进程池；RULE_WORKERS=0 时返回 None"""
+    global _pool
+    if _pool is None and RULE_WORKERS > 0:
+        _pool = ProcessPoolExecutor(max_workers=RULE_WORKERS)
+        logger.info("规则引擎进程池已创建，进程数=%d", RULE_WORKERS)
+    return _pool
+
+
+def shutdown_rule_pool() -> None:
+    """
+    关闭进程池（应用退出时调用）
+
+    等待子进程退出：fork 出的子进程继承了 uvicorn 的信号处理，不会响应 SIGTERM，
+    主进程不等待就退出时它们会一直留在后台。排队中的评分直接取消，进行中的只需几毫秒。
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+async def score_by_rules_pooled(text: str, lexicon: Lexicon) -> AnalyzeResponse:
+    """在进程池中执行规则评分；失败抛出 RuleEngineError"""
+    pool = get_rule_pool()
+    if pool is None:
+        try:
+            return score_by_rules(text, lexicon)
+        except Exception as e:  # noqa: BLE001
+            raise RuleEngineError(f"{type(e).__name__}: {e}") from e
+
+    ok, payload = await asyncio.get_running_loop().run_in_executor(
+        pool, _score_in_worker, text, lexicon.mode, lexicon.version,
+    )
+    if not ok:
+        raise RuleEngineError(payload)
+    return AnalyzeResponse.model_validate(payload)
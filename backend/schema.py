@@ -1,14 +1,20 @@
 """
 请求和响应的数据模型
 """
-from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Any, List, Literal, Optional
+
+from config import BATCH_MAX_ITEMS, DEFAULT_MODE
 
 
 class AnalyzeRequest(BaseModel):
     """分析请求模型"""
     text: str = Field(..., description="要分析的脚本文本")
-    mode: str = Field(default="drama_emotion", description="分析模式")
+    mode: str = Field(default=DEFAULT_MODE, description="分析模式（对应 LEXICON_DIR 中的词库文件）")
+    use_cache: bool = Field(default=True, description="是否读取结果缓存（false 时强制重新分析并刷新缓存）")
+    deadline_ms: Optional[int] = Field(default=None, ge=0, description="LLM 结果的截止时间（毫秒），默认取 LLM_DEADLINE_MS")
+    profile: bool = Field(default=False, description="在 meta.profile 中返回耗时分解（仅管理员，不读取缓存）")
+    profile_top: int = Field(default=0, ge=0, le=50, description="profile 时附带 cProfile 累计耗时最高的函数数，0 表示不使用 cProfile")
 
 
 class EvidenceItem(BaseModel):
@@ -37,19 +43,51 @@ class AnalyzeResponse(BaseModel):
     evidence: List[EvidenceItem] = Field(default_factory=list, max_length=6, description="证据片段（最多6条）")
     meta: dict = Field(..., description="元数据")
 
-    @field_validator("summary")
-    @classmethod
-    def validate_summary(cls, v):
-        if len(v) > 4:
-            return v[:4]
-        return v
-
-    @field_validator("evidence")
-    @classmethod
-    def validate_evidence(cls, v):
-        if len(v) > 6:
-            return v[:6]
-        return v
+
+class BatchAnalyzeRequest(BaseModel):
+    """批量分析请求模型"""
+    items: List[AnalyzeRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS, description="待分析的脚本列表")
+    stream: bool = Field(default=False, description="是否以 NDJSON 流式返回（按完成顺序，每行一条）")
+
+
+class BatchItemError(BaseModel):
+    """批量分析中单条的错误信息"""
+    status_code: int = Field(..., description="与单条接口一致的 HTTP 状态码")
+    detail: str = Field(..., description="错误描述")
+
+
+class BatchItemResult(BaseModel):
+    """批量分析中单条的结果"""
+    index: int = Field(..., description="在请求 items 中的下标")
+    ok: bool = Field(..., description="是否成功")
+    result: Optional[AnalyzeResponse] = Field(None, description="分析结果（成功时）")
+    error: Optional[BatchItemError] = Field(None, description="错误信息（失败时）")
+
+
+class BatchAnalyzeResponse(BaseModel):
+    """批量分析响应模型"""
+    results: List[BatchItemResult] = Field(..., description="与请求 items 顺序一致的结果")
+    meta: dict = Field(..., description="元数据：成功/失败条数、总耗时")
+
+
+class JobCreateRequest(BaseModel):
+    """异步任务提交请求"""
+    kind: Literal["analyze", "batch"] = Field(default="analyze", description="任务类型：单条分析或批量分析")
+    payload: dict = Field(..., description="kind=analyze 时为 AnalyzeRequest，kind=batch 时为 BatchAnalyzeRequest")
+
+
+class JobResponse(BaseModel):
+    """异步任务状态"""
+    id: str = Field(..., description="任务 id")
+    kind: str = Field(..., description="任务类型")
+    status: str = Field(..., description="状态：queued/running/succeeded/failed")
+    attempts: int = Field(..., description="已执行次数（进程重启后重新执行会增加）")
+    created_at: float = Field(..., description="提交时间（Unix 时间戳，秒）")
+    started_at: Optional[float] = Field(None, description="最近一次开始执行的时间")
+    finished_at: Optional[float] = Field(None, description="完成时间")
+    expires_at: Optional[float] = Field(None, description="结果过期时间，过期后任务不可查询")
+    result: Optional[Any] = Field(None, description="成功时为 AnalyzeResponse 或 BatchAnalyzeResponse")
+    error: Optional[dict] = Field(None, description="失败时的 {status_code, detail}")
 
 
 class HealthResponse(BaseModel):
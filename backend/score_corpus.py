@@ -0,0 +1,313 @@
+"""
+离线语料评分命令行工具
+
+用法：
+    python score_corpus.py corpus.jsonl results.jsonl
+    python score_corpus.py corpus.jsonl results.csv --engine both --text-field body --id-field request_id
+
+说明：
+- 逐行流式读取 JSONL（每行一个脚本对象），按块提交评分，内存占用与语料规模无关
+- 规则引擎在进程池中并行（默认使用全部核心）；LLM 调用在线程池中并发（受 --llm-concurrency 限制）
+- 结果按输入顺序增量写出（JSONL 或 CSV），每个引擎一行
+- 定期写检查点（输出文件旁的 .ckpt），中断后重新执行同一命令即从检查点继续；
+  检查点之后写出的残余内容会被截掉，避免重复
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from config import LLM_API_KEY, LLM_MAX_CONCURRENCY, MAX_TEXT_LENGTH, MIN_TEXT_LENGTH
+from result_cache import normalize_text
+from rule_pool import score_chunk_in_worker
+
+logger = logging.getLogger("score_corpus")
+
+CSV_COLUMNS = ["id", "line", "engine", "ok", "score", "risk_level", "risky_section", "summary", "error"]
+
+# (行号, 记录 id, 规范化文本；无法评分时为 None, 错误描述)
+Record = Tuple[int, Any, Optional[str], Optional[str]]
+
+
+def read_records(path: str, skip: int, text_field: str, id_field: str) -> Iterator[Record]:
+    """逐行读取语料，跳过前 skip 行（已处理部分）"""
+    with open(path, "rb") as handle:
+        for line_no, raw in enumerate(handle, start=1):
+            if line_no <= skip:
+                continue
+            if not raw.strip():
+                yield line_no, None, None, "空行"
+                continue
+            try:
+                obj = json.loads(raw)
+            except ValueError as e:
+                yield line_no, None, None, f"JSON 解析失败：{e}"
+                continue
+            if not isinstance(obj, dict):
+                yield line_no, None, None, "行内容不是 JSON 对象"
+                continue
+            record_id = obj.get(id_field, line_no)
+            text = obj.get(text_field)
+            if not isinstance(text, str):
+                yield line_no, record_id, None, f"缺少文本字段 {text_field}"
+                continue
+            text = normalize_text(text)
+            if len(text) < MIN_TEXT_LENGTH:
+                yield line_no, record_id, None, f"文本长度过短，至少需要 {MIN_TEXT_LENGTH} 个字符"
+            elif len(text) > MAX_TEXT_LENGTH:
+                yield line_no, record_id, None, f"文本长度超过限制，最多支持 {MAX_TEXT_LENGTH} 个字符"
+            else:
+                yield line_no, record_id, text, None
+
+
+def chunked(records: Iterator[Record], size: int) -> Iterator[List[Record]]:
+    chunk: List[Record] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _llm_in_thread(text: str) -> Tuple[bool, Any]:
+    """线程池入口：同步调用 LLM，返回 (是否成功, 结果 dict 或错误描述)"""
+    from llm_scorer import score_by_llm  # 只有使用 LLM 时才加载网络相关依赖
+
+    try:
+        result = score_by_llm(text)
+    except Exception as e:  # noqa: BLE001
+        return False, f"{type(e).__name__}: {e}"
+    if result is None:
+        return False, "LLM 评分失败"
+    return True, result.model_dump()
+
+
+class Checkpoint:
+    """检查点：已处理的输入行数 + 对应的输出文件字节数"""
+
+    def __init__(self, path: str, input_path: str):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+        self.lines = 0
+        self.output_bytes = 0
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as handle:
+            state = json.load(handle)
+        if state.get("input") != self.input_path:
+            raise SystemExit(f"检查点 {self.path} 属于另一个输入文件：{state.get('input')}")
+        self.lines = state["lines"]
+        self.output_bytes = state["output_bytes"]
+        return True
+
+    def save(self) -> None:
+        """先写临时文件再替换，保证检查点本身不会写坏"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump({"input": self.input_path, "lines": self.lines, "output_bytes": self.output_bytes}, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_path, self.path)
+
+
+class ResultWriter:
+    """按块写出结果（二进制追加，便于记录字节偏移）"""
+
+    def __init__(self, path: str, fmt: str, resume_at: int):
+        self.fmt = fmt
+        if os.path.exists(path) and resume_at:
+            os.truncate(path, resume_at)
+        elif os.path.exists(path):
+            os.truncate(path, 0)
+        self.handle = open(path, "ab")
+        if fmt == "csv" and self.handle.tell() == 0:
+            self._write_csv([dict(zip(CSV_COLUMNS, CSV_COLUMNS))])
+
+    @property
+    def offset(self) -> int:
+        return self.handle.tell()
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        if self.fmt == "csv":
+            self._write_csv([self._flatten(row) for row in rows])
+        else:
+            self.handle.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8"))
+
+    def _write_csv(self, rows: List[Dict[str, Any]]) -> None:
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, fieldnames=CSV_COLUMNS).writerows(rows)
+        self.handle.write(buffer.getvalue().encode("utf-8"))
+
+    @staticmethod
+    def _flatten(row: Dict[str, Any]) -> Dict[str, Any]:
+        result = row.get("result") or {}
+        return {
+            "id": row["id"],
+            "line": row["line"],
+            "engine": row["engine"],
+            "ok": row["ok"],
+            "score": result.get("score"),
+            "risk_level": result.get("risk_level"),
+            "risky_section": result.get("risky_section"),
+            "summary": "；".join(result.get("summary") or []),
+            "error": row.get("error"),
+        }
+
+    def sync(self) -> None:
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+
+    def close(self) -> None:
+        self.handle.close()
+
+
+# 一个已提交的块：记录 + 规则引擎 future（整块一个）+ LLM futures（每条一个）
+Pending = Tuple[List[Record], Optional[Future], List[Optional[Future]]]
+
+
+def submit_chunk(
+    chunk: List[Record],
+    engines: List[str],
+    rule_pool: Optional[ProcessPoolExecutor],
+    llm_pool: Optional[ThreadPoolExecutor],
+) -> Pending:
+    texts = [text for _, _, text, _ in chunk if text is not None]
+    rule_future = rule_pool.submit(score_chunk_in_worker, texts) if "rule" in engines and texts else None
+    llm_futures = [
+        llm_pool.submit(_llm_in_thread, text) if "llm" in engines and text is not None else None
+        for _, _, text, _ in chunk
+    ]
+    return chunk, rule_future, llm_futures
+
+
+def collect_chunk(pending: Pending, engines: List[str]) -> List[Dict[str, Any]]:
+    """等待一个块完成，按输入顺序生成输出行"""
+    chunk, rule_future, llm_futures = pending
+    rule_outcomes = iter(rule_future.result()) if rule_future is not None else iter(())
+    rows: List[Dict[str, Any]] = []
+    for (line_no, record_id, text, error), llm_future in zip(chunk, llm_futures):
+        outcomes = {}
+        if "rule" in engines and text is not None:
+            outcomes["rule"] = next(rule_outcomes)
+        if llm_future is not None:
+            outcomes["llm"] = llm_future.result()
+        for engine in engines:
+            if text is None:
+                ok, payload = False, error
+            else:
+                ok, payload = outcomes[engine]
+            rows.append({
+                "id": record_id,
+                "line": line_no,
+                "engine": engine,
+                "ok": ok,
+                "result": payload if ok else None,
+                "error": None if ok else payload,
+            })
+    return rows
+
+
+def run(args: argparse.Namespace) -> int:
+    engines = ["rule", "llm"] if args.engine == "both" else [args.engine]
+    fmt = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+
+    checkpoint = Checkpoint(args.output + ".ckpt", args.input)
+    if args.restart and os.path.exists(checkpoint.path):
+        os.remove(checkpoint.path)
+    if checkpoint.load():
+        logger.info("从检查点继续：已处理 %d 行", checkpoint.lines)
+    writer = ResultWriter(args.output, fmt, checkpoint.output_bytes)
+
+    rule_pool = ProcessPoolExecutor(max_workers=args.workers) if "rule" in engines else None
+    llm_pool = ThreadPoolExecutor(max_workers=args.llm_concurrency) if "llm" in engines else None
+    # 同时在途的块数：保证各进程始终有活干，同时限制内存
+    window = max(2, args.workers * 2)
+    pending: Deque[Pending] = deque()
+
+    started = time.monotonic()
+    processed = 0
+    since_checkpoint = 0
+
+    # 最近一个完整写出的块对应的（输入行号, 输出字节数）；中途中断时写了一半的块不计入
+    committed = (checkpoint.lines, writer.offset)
+
+    def drain_one() -> None:
+        nonlocal processed, since_checkpoint, committed
+        item = pending.popleft()
+        writer.write(collect_chunk(item, engines))
+        committed = (item[0][-1][0], writer.offset)
+        processed += len(item[0])
+        since_checkpoint += len(item[0])
+        if since_checkpoint >= args.checkpoint_every:
+            flush_checkpoint()
+
+    def flush_checkpoint() -> None:
+        nonlocal since_checkpoint
+        writer.sync()
+        checkpoint.lines, checkpoint.output_bytes = committed
+        checkpoint.save()
+        since_checkpoint = 0
+        elapsed = time.monotonic() - started
+        logger.info("已处理 %d 行（本次 %d 行，%.1f 行/秒）", checkpoint.lines, processed, processed / max(elapsed, 1e-9))
+
+    try:
+        records = read_records(args.input, checkpoint.lines, args.text_field, args.id_field)
+        for chunk in chunked(records, args.chunk_size):
+            if len(pending) >= window:
+                drain_one()
+            pending.append(submit_chunk(chunk, engines, rule_pool, llm_pool))
+        while pending:
+            drain_one()
+    except KeyboardInterrupt:
+        logger.warning("已中断，保存检查点后退出；重新执行同一命令即可继续")
+        return 130
+    finally:
+        # 只有完整写出的块才计入检查点
+        flush_checkpoint()
+        writer.close()
+        for pool in (rule_pool, llm_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    logger.info("完成：共 %d 行，结果已写入 %s", checkpoint.lines, args.output)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="离线批量评分 JSONL 语料（支持断点续跑）")
+    parser.add_argument("input", help="输入 JSONL 文件，每行一个 JSON 对象")
+    parser.add_argument("output", help="输出文件（.jsonl 或 .csv）")
+    parser.add_argument("--engine", choices=["rule", "llm", "both"], default="rule", help="评分引擎（默认 rule）")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="输出格式，默认按输出文件扩展名判断")
+    parser.add_argument("--text-field", default="text", help="脚本文本字段名（默认 text）")
+    parser.add_argument("--id-field", default="id", help="记录 id 字段名（默认 id，缺失时使用行号）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="规则引擎进程数（默认 CPU 核数）")
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_MAX_CONCURRENCY, help="LLM 并发调用数")
+    parser.add_argument("--chunk-size", type=int, default=64, help="每次提交给进程池的条数")
+    parser.add_argument("--checkpoint-every", type=int, default=1000, help="每处理多少行写一次检查点")
+    parser.add_argument("--restart", action="store_true", help="忽略已有检查点，从头开始")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.engine != "rule" and not LLM_API_KEY:
+        parser.error("使用 LLM 引擎需要设置 LLM_API_KEY")
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,18 +2,15 @@
 基于规则的评分引擎
 """
 import re
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+from lexicon_registry import Lexicon, lexicons
+from metrics import RULE_STAGES, StageTimer
 from schema import AnalyzeResponse, IssueItem, EvidenceItem
+from script_document import ScriptDocument
 
 
-# 信号词库
-CONFLICT_WORDS = ["但是", "可是", "然而", "竟然", "居然", "没想到", "突然", "竟然", "居然", "却", "但"]
-EMOTION_WORDS = ["愤怒", "震惊", "崩溃", "绝望", "惊喜", "激动", "紧张", "害怕", "开心", "难过", "伤心", "高兴", "兴奋", "焦虑", "担心"]
-SUSPENSE_PATTERNS = ["为什么", "怎么会", "到底", "究竟", "原来", "竟然", "居然", "怎么", "如何"]
-CONTRAST_PATTERNS = ["明明.*?却", "本来.*?结果", "以前.*?现在", "之前.*?现在"]
-TURNING_POINTS = ["但是", "可是", "然而", "突然", "一下子", "瞬间", "终于", "原来"]
-PROGRESSIVE_WORDS = ["越来越", "逐渐", "慢慢", "突然", "一下子", "瞬间"]
-EMPTY_WORDS = ["然后", "接着", "之后", "后来", "接下来"]
+# 信号词库、反差句式和评分规则表按分析模式由 lexicon_registry 加载（lexicons/<mode>.json + rubric.json），
+# analyze_* 保留为逐项手写的参照实现（差分校验和基准测试使用），评分使用词库中编译好的规则表
 
 
 def extract_first_n_chars(text: str, n: int) -> str:
@@ -34,49 +31,50 @@ def count_signals(text: str, patterns: List[str]) -> int:
     return count
 
 
-def find_evidence_snippets(text: str, max_length: int = 12, max_count: int = 6) -> List[EvidenceItem]:
+def build_document(text: str, lexicon: Optional[Lexicon] = None) -> ScriptDocument:
+    """构建脚本文档（断句 + 信号位置索引），每个请求只构建一次；默认使用默认模式的当前词库"""
+    return ScriptDocument(text, (lexicon or lexicons.get()).matcher)
+
+
+def find_evidence_snippets(doc: ScriptDocument, max_length: int = 12, max_count: int = 6) -> List[EvidenceItem]:
     """查找证据片段"""
+    text = doc.text
+    index = doc.signals
     evidence = []
     
-    # 按句子分割
-    sentences = re.split(r'[。！？\n]', text)
-    
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence or len(sentence) > max_length:
+    # 按句子遍历（断句结果带有原文偏移量）
+    for char_index, sentence_end in doc.sentences():
+        if len(evidence) >= max_count:
+            break
+        if char_index == sentence_end or sentence_end - char_index > max_length:
             continue
         
         # 判断位置
-        position = "中段"
-        char_index = text.find(sentence)
-        if char_index < len(text) * 0.3:
-            position = "前段"
-        elif char_index > len(text) * 0.7:
-            position = "后段"
+        position = doc.section_of(char_index)
         
         # 检查是否包含信号词
         has_signal = False
         reason = ""
         
-        if any(word in sentence for word in CONFLICT_WORDS):
+        if index.occurrences("conflict", char_index, sentence_end):
             has_signal = True
             reason = "包含冲突词"
-        elif any(word in sentence for word in EMOTION_WORDS):
+        elif index.occurrences("emotion", char_index, sentence_end):
             has_signal = True
             reason = "包含情绪词"
-        elif any(pattern in sentence for pattern in SUSPENSE_PATTERNS):
+        elif index.occurrences("suspense", char_index, sentence_end):
             has_signal = True
             reason = "包含悬念句式"
-        elif re.search("|".join(CONTRAST_PATTERNS), sentence):
+        elif index.has_pair(char_index, sentence_end):
             has_signal = True
             reason = "包含反差对比"
-        elif all(word in sentence for word in EMPTY_WORDS[:2]):
+        elif all(index.has(word, char_index, sentence_end) for word in index.matcher.categories["flat_narration"]):
             has_signal = True
             reason = "平铺直叙"
         
-        if has_signal and len(evidence) < max_count:
+        if has_signal:
             evidence.append(EvidenceItem(
-                text=sentence[:max_length],
+                text=text[char_index:sentence_end],
                 position=position,
                 reason=reason
             ))
@@ -84,19 +82,21 @@ def find_evidence_snippets(text: str, max_length: int = 12, max_count: int = 6)
     return evidence[:max_count]
 
 
-def analyze_rhythm(text: str) -> Tuple[int, List[IssueItem], List[str]]:
+def analyze_rhythm(doc: ScriptDocument) -> Tuple[int, List[IssueItem], List[str]]:
     """分析节奏维度（35分）"""
+    text = doc.text
+    index = doc.signals
     score = 35
     issues = []
     evidence_texts = []
     
     # A1. 前5秒信息密度（12分）
-    first_part = extract_first_n_chars(text, min(50, len(text)))
+    first_end = min(50, len(text))
     signal_count = (
-        count_signals(first_part, CONFLICT_WORDS) +
-        count_signals(first_part, EMOTION_WORDS) +
-        count_signals(first_part, SUSPENSE_PATTERNS) +
-        (1 if re.search("|".join(CONTRAST_PATTERNS), first_part) else 0)
+        index.signals("conflict", 0, first_end) +
+        index.signals("emotion", 0, first_end) +
+        index.signals("suspense", 0, first_end) +
+        (1 if index.has_pair(0, first_end) else 0)
     )
     
     if signal_count == 0:
@@ -105,7 +105,7 @@ def analyze_rhythm(text: str) -> Tuple[int, List[IssueItem], List[str]]:
             text="前5秒缺乏明确冲突或悬念，容易让人划走",
             reason="前5秒内无任何冲突词、情绪词、悬念句式、反差对比"
         ))
-        evidence_texts.append(first_part[:12] if len(first_part) >= 12 else first_part)
+        evidence_texts.append(text[:min(12, first_end)])
     elif signal_count == 1:
         score -= 7
         issues.append(IssueItem(
@@ -122,12 +122,11 @@ def analyze_rhythm(text: str) -> Tuple[int, List[IssueItem], List[str]]:
     # A2. 中段推进速度（12分）
     mid_start = int(len(text) * 0.2)
     mid_end = int(len(text) * 0.7)
-    mid_text = text[mid_start:mid_end] if mid_end > mid_start else ""
     
-    if mid_text:
+    if mid_end > mid_start:
         # 检查连续平铺直叙
-        empty_count = sum(1 for word in EMPTY_WORDS if word in mid_text)
-        turning_count = count_signals(mid_text, TURNING_POINTS)
+        empty_count = index.signals("empty", mid_start, mid_end)
+        turning_count = index.signals("turning", mid_start, mid_end)
         
         if empty_count >= 3 and turning_count == 0:
             score -= 9
@@ -136,10 +135,10 @@ def analyze_rhythm(text: str) -> Tuple[int, List[IssueItem], List[str]]:
                 reason="中段存在连续3句以上平铺直叙，无转折"
             ))
             # 找一段平铺直叙的证据
-            for word in EMPTY_WORDS:
-                idx = mid_text.find(word)
+            for word in index.matcher.categories["empty"]:
+                idx = index.first(word, mid_start, mid_end)
                 if idx >= 0:
-                    snippet = mid_text[idx:idx+20]
+                    snippet = text[idx:min(idx + 20, mid_end)]
                     if len(snippet) <= 12:
                         evidence_texts.append(snippet)
                     break
@@ -158,9 +157,9 @@ def analyze_rhythm(text: str) -> Tuple[int, List[IssueItem], List[str]]:
     
     # A3. 整体信息密度（11分）
     total_signals = (
-        count_signals(text, CONFLICT_WORDS) +
-        count_signals(text, EMOTION_WORDS) +
-        count_signals(text, TURNING_POINTS)
+        index.signals("conflict") +
+        index.signals("emotion") +
+        index.signals("turning")
     )
     
     if total_signals == 0:
@@ -185,15 +184,17 @@ def analyze_rhythm(text: str) -> Tuple[int, List[IssueItem], List[str]]:
     return max(0, score), issues, evidence_texts
 
 
-def analyze_emotion_curve(text: str) -> Tuple[int, List[IssueItem], List[str]]:
+def analyze_emotion_curve(doc: ScriptDocument) -> Tuple[int, List[IssueItem], List[str]]:
     """分析情绪曲线维度（35分）"""
+    text = doc.text
+    index = doc.signals
     score = 35
     issues = []
     evidence_texts = []
     
     # B1. 情绪转折点（15分）
-    turning_count = count_signals(text, TURNING_POINTS)
-    emotion_count = count_signals(text, EMOTION_WORDS)
+    turning_count = index.signals("turning")
+    emotion_count = index.signals("emotion")
     
     if turning_count == 0 and emotion_count <= 1:
         score -= 12
@@ -202,10 +203,9 @@ def analyze_emotion_curve(text: str) -> Tuple[int, List[IssueItem], List[str]]:
             reason="全文无任何情绪转折"
         ))
         # 找一段无转折的证据
-        sentences = re.split(r'[。！？]', text)
-        for s in sentences[:3]:
-            if len(s) <= 12 and s.strip():
-                evidence_texts.append(s.strip())
+        for start, end in doc.terminal_sentences(3):
+            if end - start <= 12 and text[start:end].strip():
+                evidence_texts.append(text[start:end].strip())
                 break
     elif turning_count == 1 and emotion_count <= 2:
         score -= 8
@@ -221,7 +221,7 @@ def analyze_emotion_curve(text: str) -> Tuple[int, List[IssueItem], List[str]]:
         ))
     
     # B2. 情绪递进（10分）
-    progressive_count = count_signals(text, PROGRESSIVE_WORDS)
+    progressive_count = index.signals("progressive")
     
     if progressive_count == 0:
         score -= 8
@@ -243,11 +243,7 @@ def analyze_emotion_curve(text: str) -> Tuple[int, List[IssueItem], List[str]]:
         ))
     
     # B3. 情绪多样性（10分）
-    unique_emotions = set()
-    for word in EMOTION_WORDS:
-        if word in text:
-            unique_emotions.add(word)
-    
+    unique_emotions = index.distinct("emotion")
     emotion_variety = len(unique_emotions)
     
     if emotion_variety == 0:
@@ -272,22 +268,24 @@ def analyze_emotion_curve(text: str) -> Tuple[int, List[IssueItem], List[str]]:
     return max(0, score), issues, evidence_texts
 
 
-def analyze_retention_triggers(text: str) -> Tuple[int, List[IssueItem], List[str]]:
+def analyze_retention_triggers(doc: ScriptDocument) -> Tuple[int, List[IssueItem], List[str]]:
     """分析留存钩子维度（30分）"""
+    text = doc.text
+    index = doc.signals
     score = 30
     issues = []
     evidence_texts = []
     
     # C1. 前5秒吸引力（15分）
-    first_part = extract_first_n_chars(text, min(50, len(text)))
+    first_end = min(50, len(text))
     strong_signals = (
-        (1 if any(cw in first_part for cw in CONFLICT_WORDS[:3]) and any(ew in first_part for ew in EMOTION_WORDS[:5]) else 0) +
-        (1 if any(sp in first_part for sp in SUSPENSE_PATTERNS[:4]) else 0) +
-        (1 if re.search("|".join(CONTRAST_PATTERNS), first_part) else 0)
+        (1 if index.occurrences("conflict_strong", 0, first_end) and index.occurrences("emotion_strong", 0, first_end) else 0) +
+        (1 if index.occurrences("suspense_strong", 0, first_end) else 0) +
+        (1 if index.has_pair(0, first_end) else 0)
     )
     weak_signals = (
-        count_signals(first_part, EMOTION_WORDS) +
-        (1 if any(word in first_part for word in ["今天", "昨天", "刚才"]) else 0)
+        index.signals("emotion", 0, first_end) +
+        (1 if index.occurrences("time_hook", 0, first_end) else 0)
     ) - strong_signals
     
     if strong_signals == 0 and weak_signals == 0:
@@ -296,7 +294,7 @@ def analyze_retention_triggers(text: str) -> Tuple[int, List[IssueItem], List[st
             text="前5秒缺乏吸引力，容易被划走",
             reason="前5秒无冲突、无悬念、无反差、无强情绪"
         ))
-        evidence_texts.append(first_part[:12] if len(first_part) >= 12 else first_part)
+        evidence_texts.append(text[:min(12, first_end)])
     elif strong_signals == 0 and weak_signals == 1:
         score -= 9
         issues.append(IssueItem(
@@ -319,13 +317,12 @@ def analyze_retention_triggers(text: str) -> Tuple[int, List[IssueItem], List[st
     # C2. 中段留存点（10分）
     mid_start = int(len(text) * 0.2)
     mid_end = int(len(text) * 0.8)
-    mid_text = text[mid_start:mid_end] if mid_end > mid_start else ""
     
-    if mid_text:
+    if mid_end > mid_start:
         mid_signals = (
-            count_signals(mid_text, CONFLICT_WORDS) +
-            count_signals(mid_text, TURNING_POINTS) +
-            count_signals(mid_text, SUSPENSE_PATTERNS)
+            index.signals("conflict", mid_start, mid_end) +
+            index.signals("turning", mid_start, mid_end) +
+            index.signals("suspense", mid_start, mid_end)
         )
         
         if mid_signals == 0:
@@ -348,11 +345,11 @@ def analyze_retention_triggers(text: str) -> Tuple[int, List[IssueItem], List[st
             ))
     
     # C3. 结尾落点（5分）
-    last_part = text[-min(50, len(text)):] if len(text) > 50 else text
+    last_start = max(0, len(text) - 50)
     ending_signals = (
-        (1 if any(word in last_part for word in ["终于", "释然", "明白", "懂了"]) else 0) +
-        (1 if any(word in last_part for word in ["原来", "其实"]) else 0) +
-        (1 if any(word in last_part for word in ["每个人", "我们都", "生活"]) else 0)
+        (1 if index.occurrences("ending_release", last_start) else 0) +
+        (1 if index.occurrences("ending_reveal", last_start) else 0) +
+        (1 if index.occurrences("ending_resonance", last_start) else 0)
     )
     
     if ending_signals == 0:
@@ -371,19 +368,8 @@ def analyze_retention_triggers(text: str) -> Tuple[int, List[IssueItem], List[st
     return max(0, score), issues, evidence_texts
 
 
-def score_by_rules(text: str) -> AnalyzeResponse:
-    """基于规则进行评分"""
-    # 分析三个维度
-    rhythm_score, rhythm_issues, rhythm_evidence = analyze_rhythm(text)
-    emotion_score, emotion_issues, emotion_evidence = analyze_emotion_curve(text)
-    retention_score, retention_issues, retention_evidence = analyze_retention_triggers(text)
-    
-    # 计算总分
-    total_score = rhythm_score + emotion_score + retention_score
-    
-    # 合并所有问题
-    all_issues = rhythm_issues + emotion_issues + retention_issues
-    
+def split_issues(all_issues: List[IssueItem]) -> Tuple[List[IssueItem], List[IssueItem], List[str]]:
+    """按扣分原因把问题分为高风险/可优化两类（各最多3条），并生成总结（最多4条）"""
     # 分离高风险和中等风险问题
     high_risk_issues = []
     mid_risk_issues = []
@@ -406,7 +392,57 @@ def score_by_rules(text: str) -> AnalyzeResponse:
         summary.extend([issue.text for issue in high_risk_issues[:2]])
     if mid_risk_issues:
         summary.extend([issue.text for issue in mid_risk_issues[:2]])
-    summary = summary[:4]
+    return high_risk_issues, mid_risk_issues, summary[:4]
+
+
+def collect_evidence(doc: ScriptDocument, all_issues: List[IssueItem]) -> List[EvidenceItem]:
+    """证据片段：先从原文句子中查找，不足3条时从问题中补充（最多6条）"""
+    evidence = find_evidence_snippets(doc, max_length=12, max_count=6)
+    
+    # 如果证据不足，从问题中提取
+    if len(evidence) < 3:
+        for issue in all_issues[:3]:
+            if issue.reason and len(issue.reason) <= 12:
+                char_index = doc.text.find(issue.reason[:6]) if len(issue.reason) >= 6 else -1
+                position = doc.section_of(char_index) if char_index >= 0 else "中段"
+                evidence.append(EvidenceItem(
+                    text=issue.reason[:12],
+                    position=position,
+                    reason=issue.text[:30]
+                ))
+    
+    return evidence[:6]
+
+
+def score_by_rules(text: str, lexicon: Optional[Lexicon] = None) -> AnalyzeResponse:
+    """基于规则进行评分；lexicon 默认为默认模式的当前词库"""
+    lexicon = lexicon or lexicons.get()
+    # 各阶段耗时记入 rule_engine_stage_seconds
+    timer = StageTimer(RULE_STAGES)
+    # 断句和信号扫描各只做一次，三个维度和证据提取共享同一个文档
+    doc = build_document(text, lexicon)
+    timer.lap("document")
+    return score_document(doc, lexicon, timer)
+
+
+def score_document(
+    doc: ScriptDocument,
+    lexicon: Optional[Lexicon] = None,
+    timer: Optional[StageTimer] = None,
+) -> AnalyzeResponse:
+    """基于已构建的脚本文档评分（实时评分会话增量更新文档后直接调用）；doc 须由同一个词库构建"""
+    lexicon = lexicon or lexicons.get()
+    if timer is None:
+        timer = StageTimer(RULE_STAGES)
+
+    # 三个维度：规则表中的共享特征各计算一次，再逐条评估 A1-C3（问题按规则顺序排列），每个维度结束时记录一次耗时
+    (rhythm_score, emotion_score, retention_score), all_issues = lexicon.rubric.evaluate(doc, timer.lap)
+    
+    # 计算总分
+    total_score = rhythm_score + emotion_score + retention_score
+    
+    # 合并所有问题
+    high_risk_issues, mid_risk_issues, summary = split_issues(all_issues)
     
     # 确定风险等级
     if total_score >= 75:
@@ -446,29 +482,10 @@ def score_by_rules(text: str) -> AnalyzeResponse:
     directions = directions[:3]
     
     # 收集证据
-    all_evidence_texts = list(set(rhythm_evidence + emotion_evidence + retention_evidence))
-    evidence = find_evidence_snippets(text, max_length=12, max_count=6)
-    
-    # 如果证据不足，从问题中提取
-    if len(evidence) < 3:
-        for issue in all_issues[:3]:
-            if issue.reason and len(issue.reason) <= 12:
-                char_index = text.find(issue.reason[:6]) if len(issue.reason) >= 6 else -1
-                position = "中段"
-                if char_index >= 0:
-                    if char_index < len(text) * 0.3:
-                        position = "前段"
-                    elif char_index > len(text) * 0.7:
-                        position = "后段"
-                evidence.append(EvidenceItem(
-                    text=issue.reason[:12],
-                    position=position,
-                    reason=issue.text[:30]
-                ))
-    
-    evidence = evidence[:6]
-    
-    return AnalyzeResponse(
+    evidence = collect_evidence(doc, all_issues)
+    timer.lap("evidence")
+
+    response = AnalyzeResponse(
         score=total_score,
         risk_level=risk_level,
         summary=summary,
@@ -480,7 +497,11 @@ def score_by_rules(text: str) -> AnalyzeResponse:
         evidence=evidence,
         meta={
             "version": "1.0.0",
-            "engine": "rule"
+            "engine": "rule",
+            "mode": lexicon.mode,
+            "lexicon": lexicon.version,
         }
     )
+    timer.lap("response")
+    return response
 
@@ -0,0 +1,375 @@
+"""
+向量化的批量规则评分（语料级重新评分使用）
+
+说明：
+- 把 N 个脚本拼接成一个码点数组，用 NumPy 一次找出所有信号词的全部位置，
+  再按脚本和区段统计规则表用到的每个特征，得到 N × K 的特征矩阵（corpus_features）
+- 特征、变量、各评分项（A1-C3）的档位和扣分都来自词库中编译好的规则表（Lexicon.rubric）的数组版本，
+  维度分之后的总分、风险等级等用数组运算得出；修改规则表后两条路径同时生效
+- 各函数的 lexicon 参数默认为默认模式的当前词库；同一批次内使用同一个词库版本
+- 问题文案、证据片段等文本字段按档位查表生成，与 score_by_rules 共用 split_issues / collect_evidence
+- 完整响应（score_by_rules_batch）同样只扫描一次整批文本：证据提取只查看不超过 12 字的短句，
+  每个脚本的文档由同一次扫描得到的分隔符位置和短句内的命中组装（evidence_documents），不再逐条断句和扫描全文
+- 结果与 score_by_rules 逐字段一致（包括其抛出的校验错误），用下面的命令做差分校验：
+
+    python scorer_rules_batch.py --count 5000
+    python scorer_rules_batch.py corpus.jsonl --text-field text
+"""
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from lexicon_registry import Lexicon, lexicons
+from schema import AnalyzeResponse
+from script_document import ScriptDocument
+from scorer_rules import build_document, collect_evidence, split_issues
+from signal_matcher import SignalHit, SignalIndex, SignalMatcher
+
+RISK_LEVELS = ("safe", "warn", "bad")
+RISKY_SECTIONS = ("前段", "中段", "后段")
+VIEWER_REACTIONS = (
+    "如果我是观众，我会在前5秒觉得没什么意思就划走了",
+    "如果我是观众，我会在中段觉得节奏太慢就划走了",
+    "如果我是观众，我会看完但可能不会点赞",
+)
+DIRECTIONS = ("在开头建立明确的冲突或悬念", "增加至少一次情绪或剧情转折", "提升中段的信息密度和节奏感")
+DEFAULT_DIRECTION = "强化结尾的情绪收束或思考点"
+
+# 证据提取（find_evidence_snippets）只查看去掉首尾空白后不超过这个长度的句子
+EVIDENCE_SENTENCE_LENGTH = 12
+# 与 script_document.SENTENCE_BREAK_RE 相同的分隔符
+_SENTENCE_BREAKS = np.array([ord(char) for char in "。！？\n"], dtype=np.uint32)
+_WHITESPACE = np.array([code for code in range(0x3001) if chr(code).isspace()], dtype=np.uint32)
+
+
+class RuleScoreArrays(NamedTuple):
+    """批量评分的数组结果，第 i 行对应第 i 个脚本"""
+    features: np.ndarray     # N × K 特征矩阵，列名见 Lexicon.rubric.feature_names
+    levels: np.ndarray       # N × 规则数 各评分项命中的档位，-1 表示不扣分，列顺序见 Lexicon.rubric.rule_ids
+    deductions: np.ndarray   # N × 规则数 各评分项扣分
+    variables: np.ndarray    # N × 变量数 规则表中的变量值（问题原因文案使用），列名见 Lexicon.rubric.variable_names
+    rhythm: np.ndarray
+    emotion: np.ndarray
+    retention: np.ndarray
+    total: np.ndarray
+    risk_level: np.ndarray   # RISK_LEVELS 下标
+    risky_section: np.ndarray  # RISKY_SECTIONS 下标
+    viewer_reaction: np.ndarray  # VIEWER_REACTIONS 下标
+    directions: np.ndarray   # N × 3 是否给出 DIRECTIONS 中对应的优化方向
+
+
+def extract_features(doc: ScriptDocument, lexicon: Optional[Lexicon] = None) -> List[int]:
+    """一个脚本的特征行（lexicon.rubric.feature_names 顺序），基于已构建的文档索引"""
+    return list((lexicon or lexicons.get()).rubric.feature_values(doc))
+
+
+def _find_all(codes: np.ndarray, candidates: np.ndarray, word: str) -> np.ndarray:
+    """word 在码点数组中全部出现的起点（包含重叠出现）"""
+    positions = candidates[codes[candidates] == ord(word[0])]
+    last = len(codes) - 1
+    for offset, char in enumerate(word[1:], start=1):
+        ahead = positions + offset
+        positions = positions[(ahead <= last) & (codes[np.minimum(ahead, last)] == ord(char))]
+    return positions
+
+
+class CorpusScan(NamedTuple):
+    """整批脚本的一次扫描结果：脚本之间用换行拼接成一个码点数组"""
+    lengths: np.ndarray   # 各脚本长度
+    offsets: np.ndarray   # 各脚本在拼接数组中的起点
+    codes: np.ndarray     # 拼接后的码点数组
+    global_starts: Dict[str, np.ndarray]  # 词 -> 拼接数组中的全部起点（有序）
+    located: Dict[str, Tuple[np.ndarray, np.ndarray]]  # 词 -> (所属脚本下标, 脚本内起点)
+
+
+def scan_corpus(texts: Sequence[str], matcher: SignalMatcher) -> CorpusScan:
+    """
+    找出整批脚本中所有信号词的全部位置。
+
+    脚本之间用换行拼接：换行本身就是成对句式和句子的分隔符，不会产生跨脚本的命中。
+    """
+    count = len(texts)
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=count)
+    offsets = np.zeros(count, dtype=np.int64)
+    np.cumsum(lengths[:-1] + 1, out=offsets[1:])
+    codes = np.frombuffer("\n".join(texts).encode("utf-32-le"), dtype=np.uint32)
+
+    first_chars = np.array(sorted({ord(word[0]) for word in matcher.weights}), dtype=np.uint32)
+    candidates = np.flatnonzero(np.isin(codes, first_chars))
+    global_starts = {word: _find_all(codes, candidates, word) for word in matcher.weights}
+    located = {}
+    for word, starts in global_starts.items():
+        docs = np.searchsorted(offsets, starts, side="right") - 1
+        located[word] = (docs, starts - offsets[docs])
+    return CorpusScan(lengths, offsets, codes, global_starts, located)
+
+
+def corpus_features(
+    texts: Sequence[str],
+    lexicon: Optional[Lexicon] = None,
+    scan: Optional[CorpusScan] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    不逐条构建文档，直接对整批脚本计算（长度数组, 特征矩阵）；scan 为同一批脚本已有的扫描结果时直接使用。
+
+    occurrences 特征只以「是否大于 0」参与评分，这里与 signals 一样按出现的词条计数。
+    """
+    lexicon = lexicon or lexicons.get()
+    matcher, rubric = lexicon.matcher, lexicon.rubric
+    scan = scan or scan_corpus(texts, matcher)
+    count = len(texts)
+    lengths, offsets, global_starts, located = scan.lengths, scan.offsets, scan.global_starts, scan.located
+
+    bounds = rubric.segment_arrays(lengths)
+
+    def present(word: str, segment: str) -> np.ndarray:
+        """每个脚本的该区段内是否完整出现 word"""
+        docs, starts = located[word]
+        low, high = bounds[segment]
+        inside = (starts >= low[docs]) & (starts + len(word) <= high[docs])
+        flags = np.zeros(count, dtype=bool)
+        flags[docs[inside]] = True
+        return flags
+
+    def has_pair(segment: str) -> np.ndarray:
+        """成对句式：起始词之后最近的结束词，中间不能有分隔符，起始词和闭合位置都需落在区段内"""
+        flags = np.zeros(count, dtype=bool)
+        barriers = global_starts.get(matcher.barrier, np.zeros(0, dtype=np.int64))
+        low, high = bounds[segment]
+        for head, tail in matcher.pairs:
+            head_docs, head_starts = located[head]
+            head_ends = global_starts[head] + len(head)
+            tail_starts = global_starts[tail]
+            i = np.searchsorted(tail_starts, head_ends, side="left")
+            found = i < len(tail_starts)
+            closing = tail_starts[np.minimum(i, len(tail_starts) - 1)] if len(tail_starts) else head_ends
+            b = np.searchsorted(barriers, head_ends, side="left")
+            blocked = (b < len(barriers)) & (barriers[np.minimum(b, len(barriers) - 1)] < closing) if len(barriers) else False
+            closing_local = closing + len(tail) - offsets[head_docs]
+            hits = found & ~blocked & (head_starts >= low[head_docs]) & (closing_local <= high[head_docs])
+            flags[head_docs[hits]] = True
+        return flags
+
+    columns = []
+    for feature in rubric.features:
+        if feature.kind == "pair":
+            columns.append(has_pair(feature.segment).astype(np.int64))
+        elif feature.kind == "distinct":
+            columns.append(sum(
+                (present(word, feature.segment).astype(np.int64) for word in matcher.categories[feature.category]),
+                np.zeros(count, dtype=np.int64),
+            ))
+        else:
+            column = np.zeros(count, dtype=np.int64)
+            for word, weight in matcher.categories[feature.category].items():
+                column += weight * present(word, feature.segment)
+            columns.append(column)
+
+    return lengths, np.stack(columns, axis=1) if count else np.zeros((0, len(rubric.features)), dtype=np.int64)
+
+
+def evidence_documents(texts: Sequence[str], scan: CorpusScan, matcher: SignalMatcher) -> List[ScriptDocument]:
+    """
+    由整批扫描结果组装每个脚本的文档，供 collect_evidence 使用（不能用于评分）。
+
+    断句与 ScriptDocument 一致；信号索引只包含完整落在短句内的命中：去掉首尾空白后可能不超过
+    EVIDENCE_SENTENCE_LENGTH 字的句子（原始长度不超过该值，或首尾是空白）。证据提取只在这些句子内查询，
+    句子之间互不重叠，结果与完整索引相同。
+    """
+    codes, offsets = scan.codes, scan.offsets
+    # 拼接用的换行也是分隔符：全局的第 k 个句子位于第 k-1 与第 k 个分隔符之间，各脚本的句子互不跨越
+    breaks = np.flatnonzero(np.isin(codes, _SENTENCE_BREAKS))
+    sentence_starts = np.concatenate(([0], breaks + 1))
+    sentence_ends = np.concatenate((breaks, [len(codes)]))
+    nonempty = sentence_ends > sentence_starts
+    last = max(len(codes) - 1, 0)
+    edge_space = nonempty & (
+        np.isin(codes[np.minimum(sentence_starts, last)], _WHITESPACE)
+        | np.isin(codes[np.maximum(sentence_ends - 1, 0)], _WHITESPACE)
+    ) if len(codes) else nonempty
+    short = (sentence_ends - sentence_starts <= EVIDENCE_SENTENCE_LENGTH) | edge_space
+
+    words = list(scan.global_starts)
+    hit_starts, hit_ends, hit_words = [], [], []
+    for w, word in enumerate(words):
+        starts = scan.global_starts[word]
+        sentence = np.searchsorted(breaks, starts, side="left")
+        # 起点和终点之间没有分隔符（命中完整落在一个句子内），且该句子是短句
+        inside = (np.searchsorted(breaks, starts + len(word), side="left") == sentence) & short[sentence]
+        hit_starts.append(starts[inside])
+        hit_ends.append(starts[inside] + len(word))
+        hit_words.append(np.full(int(inside.sum()), w, dtype=np.int64))
+    starts = np.concatenate(hit_starts) if hit_starts else np.zeros(0, dtype=np.int64)
+    ends = np.concatenate(hit_ends) if hit_ends else np.zeros(0, dtype=np.int64)
+    word_ids = np.concatenate(hit_words) if hit_words else np.zeros(0, dtype=np.int64)
+    # 与 SignalMatcher.scan 的顺序一致：按起点，同一起点按终点
+    order = np.lexsort((ends, starts))
+    starts, ends, word_ids = starts[order], ends[order], word_ids[order]
+
+    doc_ends = offsets + scan.lengths
+    hit_bounds = np.searchsorted(starts, np.stack((offsets, doc_ends)))
+    break_bounds = np.searchsorted(breaks, np.stack((offsets, doc_ends)))
+    documents = []
+    for i, text in enumerate(texts):
+        base = int(offsets[i])
+        lo, hi = hit_bounds[0, i], hit_bounds[1, i]
+        hits = [
+            SignalHit(start - base, end - base, words[w])
+            for start, end, w in zip(starts[lo:hi].tolist(), ends[lo:hi].tolist(), word_ids[lo:hi].tolist())
+        ]
+        local_breaks = array("i", (breaks[break_bounds[0, i]:break_bounds[1, i]] - base).tolist())
+        documents.append(ScriptDocument(text, matcher, SignalIndex(matcher, text, hits), local_breaks))
+    return documents
+
+
+def score_arrays(lengths: np.ndarray, features: np.ndarray, lexicon: Optional[Lexicon] = None) -> RuleScoreArrays:
+    """由（长度, 特征矩阵）计算全部扣分、维度分、总分和风险等级"""
+    rubric = (lexicon or lexicons.get()).rubric.evaluate_arrays(lengths, features)
+    rhythm, emotion, retention = (rubric.dimensions[:, j] for j in range(3))
+    total = rhythm + emotion + retention
+
+    return RuleScoreArrays(
+        features=features,
+        levels=rubric.levels,
+        deductions=rubric.deductions,
+        variables=rubric.variables,
+        rhythm=rhythm,
+        emotion=emotion,
+        retention=retention,
+        total=total,
+        risk_level=np.select([total >= 75, total >= 60], [0, 1], 2),
+        risky_section=np.select([total < 50, rhythm < 20], [0, 1], 2),
+        viewer_reaction=np.select([total < 50, total < 70], [0, 1], 2),
+        directions=np.stack([rhythm < 25, emotion < 25, retention < 20], axis=1),
+    )
+
+
+def build_response(doc: ScriptDocument, arrays: RuleScoreArrays, i: int, lexicon: Optional[Lexicon] = None) -> AnalyzeResponse:
+    """由第 i 行的数组结果组装 AnalyzeResponse（与 score_by_rules 的输出一致）"""
+    lexicon = lexicon or lexicons.get()
+    all_issues = lexicon.rubric.issues(arrays.levels[i].tolist(), arrays.variables[i].tolist())
+    high_risk_issues, mid_risk_issues, summary = split_issues(all_issues)
+    directions = [direction for direction, given in zip(DIRECTIONS, arrays.directions[i].tolist()) if given]
+    return AnalyzeResponse(
+        score=int(arrays.total[i]),
+        risk_level=RISK_LEVELS[arrays.risk_level[i]],
+        summary=summary,
+        issues_high=high_risk_issues,
+        issues_mid=mid_risk_issues,
+        risky_section=RISKY_SECTIONS[arrays.risky_section[i]],
+        viewer_reaction=VIEWER_REACTIONS[arrays.viewer_reaction[i]],
+        directions=directions or [DEFAULT_DIRECTION],
+        evidence=collect_evidence(doc, all_issues),
+        meta={
+            "version": "1.0.0",
+            "engine": "rule",
+            "mode": lexicon.mode,
+            "lexicon": lexicon.version,
+        }
+    )
+
+
+def score_texts(texts: Sequence[str], lexicon: Optional[Lexicon] = None) -> RuleScoreArrays:
+    """只需要分数时的批量入口：整批向量化扫描，不构建文档、不生成文本字段"""
+    lexicon = lexicon or lexicons.get()
+    return score_arrays(*corpus_features(texts, lexicon), lexicon)
+
+
+def score_by_rules_batch(
+    texts: Sequence[str],
+    return_exceptions: bool = False,
+    lexicon: Optional[Lexicon] = None,
+) -> List[Union[AnalyzeResponse, Exception]]:
+    """
+    批量评分，返回与 texts 顺序一致的 AnalyzeResponse 列表。
+
+    return_exceptions=True 时，score_by_rules 会抛出异常的条目在对应位置返回异常对象；
+    否则遇到第一个异常直接抛出。
+    """
+    # 分数来自整批扫描的特征矩阵，证据提取使用同一次扫描组装的文档
+    lexicon = lexicon or lexicons.get()
+    scan = scan_corpus(texts, lexicon.matcher)
+    arrays = score_arrays(*corpus_features(texts, lexicon, scan), lexicon)
+    docs = evidence_documents(texts, scan, lexicon.matcher)
+    results: List[Union[AnalyzeResponse, Exception]] = []
+    for i, doc in enumerate(docs):
+        try:
+            results.append(build_response(doc, arrays, i, lexicon))
+        except Exception as e:  # noqa: BLE001
+            if not return_exceptions:
+                raise
+            results.append(e)
+    return results
+
+
+# ---- 差分校验 ----
+
+def _outcome(value: Union[AnalyzeResponse, Exception]):
+    if isinstance(value, Exception):
+        return ("error", type(value).__name__, str(value))
+    return ("ok", value.model_dump())
+
+
+def main() -> int:
+    import argparse
+    import json
+    import time
+
+    from scorer_rules import analyze_emotion_curve, analyze_retention_triggers, analyze_rhythm, score_by_rules
+    from synthetic import random_scripts
+
+    parser = argparse.ArgumentParser(description="批量规则评分与 score_by_rules 的差分校验")
+    parser.add_argument("corpus", nargs="?", help="JSONL 语料；不指定时使用随机生成的脚本")
+    parser.add_argument("--text-field", default="text", help="JSONL 中的文本字段名")
+    parser.add_argument("--count", type=int, default=2000, help="随机脚本数量")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as handle:
+            texts = [json.loads(line)[args.text_field] for line in handle if line.strip()]
+    else:
+        texts = random_scripts(args.count, args.seed)
+
+    started = time.perf_counter()
+    expected = []
+    for text in texts:
+        try:
+            expected.append(score_by_rules(text))
+        except Exception as e:  # noqa: BLE001
+            expected.append(e)
+    single_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = score_by_rules_batch(texts, return_exceptions=True)
+    batch_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    arrays = score_texts(texts)
+    arrays_seconds = time.perf_counter() - started
+
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if _outcome(a) != _outcome(b)]
+    # 向量化扫描的分数与 score_by_rules 比较（抛出异常的条目比较同样输入下 analyze_* 的维度分）
+    for i, text in enumerate(texts):
+        doc = build_document(text)
+        dimensions = (analyze_rhythm(doc)[0], analyze_emotion_curve(doc)[0], analyze_retention_triggers(doc)[0])
+        if dimensions != (arrays.rhythm[i], arrays.emotion[i], arrays.retention[i]) and i not in mismatches:
+            mismatches.append(i)
+        elif isinstance(expected[i], AnalyzeResponse) and (
+            expected[i].score != arrays.total[i] or expected[i].risk_level != RISK_LEVELS[arrays.risk_level[i]]
+        ) and i not in mismatches:
+            mismatches.append(i)
+
+    print(f"脚本数：{len(texts)}，不一致：{len(mismatches)}")
+    print(f"score_by_rules 逐条：{single_seconds:.2f}s；批量（完整响应）：{batch_seconds:.2f}s；批量（仅分数数组）：{arrays_seconds:.2f}s")
+    for i in mismatches[:5]:
+        print(f"--- 第 {i} 条不一致：{texts[i][:40]!r}")
+        print("score_by_rules:", _outcome(expected[i]))
+        print("批量:", _outcome(actual[i]))
+        print("分数数组（节奏, 情绪, 留存, 总分）:", arrays.rhythm[i], arrays.emotion[i], arrays.retention[i], arrays.total[i])
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
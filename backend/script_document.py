@@ -0,0 +1,97 @@
+"""
+脚本文档表示
+
+说明：
+- 每个请求只构建一次：一次断句 + 一次信号扫描
+- 句子边界以偏移量存放在 array 中，不保存子串副本
+- 证据提取和三个维度的分析函数都基于同一个 ScriptDocument
+- edit 返回局部修改后的新文档：只重新断句和扫描编辑区，原文档不变（实时评分会话使用）
+"""
+import re
+from array import array
+from bisect import bisect_left
+from typing import Iterator, Optional, Tuple
+
+from signal_matcher import SignalIndex, SignalMatcher
+
+# 断句分隔符（证据提取使用，包含换行）
+SENTENCE_BREAK_RE = re.compile(r"[。！？\n]")
+
+
+class ScriptDocument:
+    """一段脚本的紧凑表示"""
+
+    __slots__ = (
+        "text", "length", "signals",
+        "break_positions", "sentence_starts", "sentence_ends",
+    )
+
+    def __init__(
+        self,
+        text: str,
+        matcher: SignalMatcher,
+        signals: Optional[SignalIndex] = None,
+        breaks: Optional[array] = None,
+    ):
+        """signals / breaks 已知时（局部修改）直接使用，不再扫描全文"""
+        self.text = text
+        self.length = len(text)
+        self.signals: SignalIndex = matcher.index(text) if signals is None else signals
+
+        # 分隔符位置；第 i 个句子位于第 i-1 与第 i 个分隔符之间（与 re.split 的切分一致）
+        if breaks is None:
+            breaks = array("i", (match.start() for match in SENTENCE_BREAK_RE.finditer(text)))
+        self.break_positions = breaks
+        self.sentence_starts = array("i", [0]) + array("i", (position + 1 for position in breaks))
+        self.sentence_ends = breaks + array("i", [self.length])
+
+    def edit(self, start: int, end: int, replacement: str) -> "ScriptDocument":
+        """把 [start, end) 替换为 replacement 后的新文档；编辑区之外的分隔符和信号命中平移复用"""
+        text = self.text[:start] + replacement + self.text[end:]
+        inserted_end = start + len(replacement)
+        delta = inserted_end - end
+        breaks = self.break_positions
+        tail = breaks[bisect_left(breaks, end):]
+        spliced = breaks[:bisect_left(breaks, start)]
+        spliced.extend(match.start() for match in SENTENCE_BREAK_RE.finditer(text, start, inserted_end))
+        spliced.extend(array("i", (position + delta for position in tail)) if delta else tail)
+        signals = self.signals.edited(text, start, end, len(replacement))
+        return ScriptDocument(text, signals.matcher, signals, spliced)
+
+    def sentences(self) -> Iterator[Tuple[int, int]]:
+        """按顺序返回每个句子去掉首尾空白后的 [start, end)，空句子的起止相同"""
+        text = self.text
+        for start, end in zip(self.sentence_starts, self.sentence_ends):
+            if start < end and (text[start].isspace() or text[end - 1].isspace()):
+                piece = text[start:end]
+                stripped = piece.lstrip()
+                start += len(piece) - len(stripped)
+                end = start + len(stripped.rstrip())
+            yield start, end
+
+    def terminal_sentences(self, limit: int) -> Iterator[Tuple[int, int]]:
+        """
+        只按句末标点（。！？）切分的前 limit 个原始句子 [start, end)，
+        换行不作为分隔符，等价于 re.split(r'[。！？]', text)[:limit]
+        """
+        text = self.text
+        start = 0
+        produced = 0
+        for position in self.break_positions:
+            if produced >= limit:
+                return
+            if text[position] == "\n":
+                continue
+            yield start, position
+            produced += 1
+            start = position + 1
+        if produced < limit:
+            yield start, self.length
+
+    def section_of(self, offset: int) -> str:
+        """根据偏移量判断所在位置：前段（<30%）/中段/后段（>70%）"""
+        if offset < self.length * 0.3:
+            return "前段"
+        if offset > self.length * 0.7:
+            return "后段"
+        return "中段"
@@ -0,0 +1,282 @@
+"""
+多模式信号词匹配器
+
+说明：
+- 在模块导入时把所有词库编译成一棵字典树（trie），每段脚本只扫描一遍
+- 先用首字字符集的正则（C 实现）定位候选起点，再沿字典树向下走，
+  因此扫描成本只与文本长度和最长词长有关，与词库大小无关
+- 每个命中都带有起止位置和所属类别，供评分函数复用
+- SignalIndex 把一次扫描的结果整理成按位置有序的数组，区间查询均为二分，
+  不需要切片或重新扫描
+- 文本局部修改后（实时评分），SignalIndex.edited 只重新扫描编辑区附近的窗口，其余命中平移复用
+"""
+import re
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+
+class SignalHit(NamedTuple):
+    """一次信号词命中"""
+    start: int
+    end: int
+    word: str
+
+
+class SignalMatcher:
+    """把多个词库编译成一次扫描的匹配器"""
+
+    __slots__ = ("categories", "weights", "pairs", "barrier", "max_length", "_trie", "_first_chars")
+
+    def __init__(
+        self,
+        lexicons: Dict[str, Iterable[str]],
+        pairs: Sequence[Tuple[str, str]] = (),
+        barrier: Optional[str] = None,
+    ):
+        """
+        - lexicons：类别 -> 词表
+        - pairs：成对出现的（起始词, 结束词），如“明明…却”
+        - barrier：成对词之间不允许跨越的分隔符（如换行）
+        """
+        self.pairs = tuple(pairs)
+        self.barrier = barrier
+
+        # 类别 -> {词: 在词表中出现的次数}，保留重复项的计数语义
+        self.categories: Dict[str, Dict[str, int]] = {}
+        # 词 -> ((类别, 次数), ...)
+        self.weights: Dict[str, Tuple[Tuple[str, int], ...]] = {}
+
+        for category, words in lexicons.items():
+            counts: Dict[str, int] = {}
+            for word in words:
+                if word:
+                    counts[word] = counts.get(word, 0) + 1
+            self.categories[category] = counts
+
+        per_word: Dict[str, List[Tuple[str, int]]] = {}
+        for category, counts in self.categories.items():
+            for word, count in counts.items():
+                per_word.setdefault(word, []).append((category, count))
+        self.weights = {word: tuple(items) for word, items in per_word.items()}
+        # 成对词和分隔符也需要被扫描到，但不属于任何类别
+        for word in [w for pair in self.pairs for w in pair] + ([barrier] if barrier else []):
+            self.weights.setdefault(word, ())
+
+        self.max_length = max(map(len, self.weights), default=0)
+
+        # 字典树：每个节点是 {字符: 子节点}，键 None 表示到此为一个完整的词
+        self._trie: dict = {}
+        for word in self.weights:
+            node = self._trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[None] = word
+
+        first_chars = "".join(sorted(self._trie))
+        self._first_chars = re.compile(f"[{re.escape(first_chars)}]") if first_chars else None
+
+    def scan(self, text: str, start: int = 0, end: Optional[int] = None) -> List[SignalHit]:
+        """
+        扫描一遍文本，按起点顺序返回全部命中（包含重叠的命中）。
+        指定 [start, end) 时只返回起点在区间内的命中，命中本身可以延伸到 end 之后
+        """
+        hits: List[SignalHit] = []
+        if self._first_chars is None:
+            return hits
+
+        trie = self._trie
+        length = len(text)
+        for match in self._first_chars.finditer(text, start, length if end is None else end):
+            start = match.start()
+            node = trie
+            pos = start
+            while pos < length:
+                node = node.get(text[pos])
+                if node is None:
+                    break
+                pos += 1
+                word = node.get(None)
+                if word is not None:
+                    hits.append(SignalHit(start, pos, word))
+        return hits
+
+    def index(self, text: str) -> "SignalIndex":
+        """扫描文本并建立位置索引"""
+        return SignalIndex(self, text)
+
+
+class SignalIndex:
+    """
+    单段脚本的信号位置索引
+
+    - 每个词：按起点排序的命中位置数组
+    - 每个类别：按起点排序的命中位置数组 + 权重前缀和
+    - 成对句式：按起始词位置排序的最早闭合位置 + 后缀最小值
+    所有区间查询都是 O(log n)，区间均为 [start, end)，命中需完整落在区间内。
+    """
+
+    __slots__ = (
+        "matcher", "length", "hits",
+        "_word_starts", "_present",
+        "_category_starts", "_category_ends", "_category_sums",
+        "_pair_starts", "_pair_min_ends",
+    )
+
+    def __init__(self, matcher: SignalMatcher, text: str, hits: Optional[List[SignalHit]] = None):
+        """hits 为已知的全部命中（按起点有序）时不再扫描文本"""
+        self.matcher = matcher
+        self.length = len(text)
+        self.hits = matcher.scan(text) if hits is None else hits
+
+        word_starts: Dict[str, array] = {}
+        category_starts: Dict[str, array] = {}
+        category_ends: Dict[str, array] = {}
+        category_sums: Dict[str, array] = {}
+        weights = matcher.weights
+        for start, end, word in self.hits:
+            starts = word_starts.get(word)
+            if starts is None:
+                starts = word_starts[word] = array("i")
+            starts.append(start)
+            for category, count in weights[word]:
+                if category not in category_starts:
+                    category_starts[category] = array("i")
+                    category_ends[category] = array("i")
+                    category_sums[category] = array("i", [0])
+                category_starts[category].append(start)
+                category_ends[category].append(end)
+                sums = category_sums[category]
+                sums.append(sums[-1] + count)
+        self._word_starts = word_starts
+        self._category_starts = category_starts
+        self._category_ends = category_ends
+        self._category_sums = category_sums
+
+        # 类别 -> 本文中出现过的 (词, 权重)
+        present: Dict[str, List[Tuple[str, int]]] = {}
+        for word in word_starts:
+            for category, count in weights[word]:
+                present.setdefault(category, []).append((word, count))
+        self._present = present
+
+        self._build_pairs()
+
+    def _build_pairs(self) -> None:
+        """为每个起始词找到最早的合法结束词，并计算后缀最小值"""
+        pair_starts = array("i")
+        pair_ends: List[int] = []
+        barriers = self._word_starts.get(self.matcher.barrier) if self.matcher.barrier else None
+        heads: Dict[str, List[str]] = {}
+        for head, tail in self.matcher.pairs:
+            heads.setdefault(head, []).append(tail)
+
+        for start, end, word in self.hits:
+            tails = heads.get(word)
+            if not tails:
+                continue
+            closing = -1
+            for tail in tails:
+                tail_starts = self._word_starts.get(tail)
+                if not tail_starts:
+                    continue
+                i = bisect_left(tail_starts, end)
+                if i == len(tail_starts):
+                    continue
+                tail_start = tail_starts[i]
+                if barriers:
+                    b = bisect_left(barriers, end)
+                    if b < len(barriers) and barriers[b] < tail_start:
+                        continue
+                tail_end = tail_start + len(tail)
+                if closing < 0 or tail_end < closing:
+                    closing = tail_end
+            if closing >= 0:
+                pair_starts.append(start)
+                pair_ends.append(closing)
+
+        min_ends = array("i", pair_ends)
+        for i in range(len(min_ends) - 2, -1, -1):
+            if min_ends[i + 1] < min_ends[i]:
+                min_ends[i] = min_ends[i + 1]
+        self._pair_starts = pair_starts
+        self._pair_min_ends = min_ends
+
+    def edited(self, text: str, start: int, end: int, inserted: int) -> "SignalIndex":
+        """
+        原文 [start, end) 被替换为 inserted 个字符后的索引，text 为修改后的全文。
+
+        起点早于 start - max_length + 1 的命中不可能触及编辑区，原样保留；
+        原文中起点不早于 end 的命中内容不变，只平移位置；只有两者之间的窗口需要重新扫描。
+        """
+        rescan_from = max(0, start - self.matcher.max_length + 1)
+        rescan_to = start + inserted
+        delta = rescan_to - end
+        hits = self.hits
+        # 命中按 (start, end, word) 有序，(位置,) 排在同一起点的所有命中之前
+        head = bisect_left(hits, (rescan_from,))
+        tail = bisect_left(hits, (end,))
+        spliced = hits[:head]
+        spliced += self.matcher.scan(text, rescan_from, rescan_to)
+        if delta:
+            spliced += [SignalHit(hit_start + delta, hit_end + delta, word) for hit_start, hit_end, word in hits[tail:]]
+        else:
+            spliced += hits[tail:]
+        return SignalIndex(self.matcher, text, spliced)
+
+    def first(self, word: str, start: int = 0, end: Optional[int] = None) -> int:
+        """词在区间内第一次完整出现的位置，不存在返回 -1"""
+        starts = self._word_starts.get(word)
+        if not starts:
+            return -1
+        if end is None:
+            end = self.length
+        i = bisect_left(starts, start)
+        if i < len(starts) and starts[i] + len(word) <= end:
+            return starts[i]
+        return -1
+
+    def has(self, word: str, start: int = 0, end: Optional[int] = None) -> bool:
+        """词是否完整出现在区间内"""
+        return self.first(word, start, end) >= 0
+
+    def signals(self, category: str, start: int = 0, end: Optional[int] = None) -> int:
+        """类别词表中有多少词条出现在区间内（与逐词 `word in 片段` 计数一致）"""
+        if not self.occurrences(category, start, end):
+            return 0
+        total = 0
+        for word, count in self._present.get(category, ()):
+            if self.first(word, start, end) >= 0:
+                total += count
+        return total
+
+    def distinct(self, category: str, start: int = 0, end: Optional[int] = None) -> Set[str]:
+        """区间内出现过的该类别的不同词"""
+        return {word for word, _ in self._present.get(category, ()) if self.first(word, start, end) >= 0}
+
+    def occurrences(self, category: str, start: int = 0, end: Optional[int] = None) -> int:
+        """区间内该类别的命中次数（按词表权重累计，前缀和相减）"""
+        starts = self._category_starts.get(category)
+        if not starts:
+            return 0
+        if end is None:
+            end = self.length
+        ends = self._category_ends[category]
+        sums = self._category_sums[category]
+        lo = bisect_left(starts, start)
+        hi = bisect_left(starts, end)
+        total = sums[hi] - sums[lo]
+        # 起点在区间内、终点越界的命中只可能出现在区间末尾附近
+        i = hi - 1
+        while i >= lo and starts[i] > end - self.matcher.max_length:
+            if ends[i] > end:
+                total -= sums[i + 1] - sums[i]
+            i -= 1
+        return total
+
+    def has_pair(self, start: int = 0, end: Optional[int] = None) -> bool:
+        """区间内是否存在完整的成对句式（起始词在前、结束词在后、中间不跨分隔符）"""
+        if end is None:
+            end = self.length
+        i = bisect_left(self._pair_starts, start)
+        return i < len(self._pair_starts) and self._pair_min_ends[i] <= end
@@ -0,0 +1,40 @@
+"""
+相同请求的并发合并（single-flight）
+
+说明：
+- 同一个键同时只执行一次上游调用，其余并发请求等待同一个任务的结果
+- 成功则所有等待者拿到同一个结果；失败则所有等待者收到同一个异常
+- 共享任务用 asyncio.shield 保护，某个等待者被取消不会影响其他人
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """按键合并并发中的相同调用"""
+
+    def __init__(self):
+        self._inflight: Dict[str, "asyncio.Task"] = {}
+        self._stats: Dict[str, int] = {"calls": 0, "coalesced": 0}
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """执行 factory()；若相同键的调用正在进行，则等待它的结果"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self._stats["calls"] += 1
+        else:
+            self._stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: "asyncio.Task") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        """实际调用数、被合并的请求数和当前进行中的键数"""
+        return {**self._stats, "inflight": len(self._inflight)}
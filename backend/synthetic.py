@@ -0,0 +1,58 @@
+"""
+合成脚本与分位数（基准测试、压测和差分校验共用）
+
+说明：
+- 合成脚本由词库中的信号词（含成对句式的两端）、普通汉字和标点随机拼接，density 为每个片段是信号词的概率
+- 传入同一个 random.Random 时结果可复现；benchmark.py、loadgen.py 和各差分校验都用这里的生成器
+- percentile 返回样本原值（与样本同单位），由调用方决定换算和取整
+"""
+import random
+from typing import List, Optional, Sequence
+
+from lexicon_registry import Lexicon, lexicons
+
+FILLERS = "我他她你们的了是在有一个这那说看走去来做想要会天人事家里"
+BREAKS = "。！？\n，"
+
+
+def signal_words(lexicon: Optional[Lexicon] = None) -> List[str]:
+    """词库中的全部信号词，按固定顺序排列（保证同一种子生成的脚本相同）"""
+    lexicon = lexicon or lexicons.get()
+    words = sorted({word for category in lexicon.categories.values() for word in category})
+    return words + [word for pair in lexicon.pairs for word in pair]
+
+
+def synthetic_script(rng: random.Random, length: int, density: float, words: Sequence[str]) -> str:
+    """按给定信号词密度随机拼接一段长度为 length 的脚本"""
+    parts: List[str] = []
+    size = 0
+    while size < length:
+        roll = rng.random()
+        if roll < density:
+            piece = rng.choice(words)
+        elif roll < density + 0.1:
+            piece = rng.choice(BREAKS)
+        else:
+            piece = "".join(rng.choice(FILLERS) for _ in range(rng.randint(1, 6)))
+        parts.append(piece)
+        size += len(piece)
+    return "".join(parts)[:length]
+
+
+def random_scripts(count: int, seed: int, lexicon: Optional[Lexicon] = None) -> List[str]:
+    """长度 10-5000、信号词密度 0-0.3 的随机脚本，覆盖各评分档位（差分校验使用）"""
+    rng = random.Random(seed)
+    words = signal_words(lexicon)
+    scripts = []
+    for _ in range(count):
+        length = rng.choice([rng.randint(10, 80), rng.randint(80, 600), rng.randint(600, 5000)])
+        scripts.append(synthetic_script(rng, length, rng.random() * 0.3, words))
+    return scripts
+
+
+def percentile(samples: Sequence[float], q: float) -> Optional[float]:
+    """q 分位数（取排序后第 int(n * q) 个样本），没有样本时返回 None"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
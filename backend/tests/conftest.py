@@ -0,0 +1,11 @@
+"""
+测试公共设置
+
+说明：
+- 后端模块按脚本方式平铺导入（from scorer_rules import ...），测试时把 backend 目录加入 sys.path
+- 在 backend 目录下运行：python -m pytest -q
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,73 @@
+"""规则表编译结果（CompiledRubric）与 analyze_* 参考实现的差分测试"""
+import json
+
+import pytest
+
+from lexicon_registry import lexicons
+from rubric import DEFAULT_RUBRIC_PATH, DIMENSIONS, CompiledRubric, RubricError
+from scorer_rules import analyze_emotion_curve, analyze_retention_triggers, analyze_rhythm, build_document
+from synthetic import random_scripts
+
+SEED = 20240601
+COUNT = 1000
+
+
+def _legacy(doc):
+    results = (analyze_rhythm(doc), analyze_emotion_curve(doc), analyze_retention_triggers(doc))
+    return tuple(result[0] for result in results), [issue for result in results for issue in result[1]]
+
+
+@pytest.fixture(scope="module")
+def docs():
+    texts = random_scripts(COUNT, SEED) + ["", "。", "但是", "如果你知道真相"]
+    return [build_document(text) for text in texts]
+
+
+def test_compiled_rubric_matches_analyze_functions(docs):
+    rubric = lexicons.get().rubric
+    mismatches = [
+        (doc.text[:40], _legacy(doc), rubric.evaluate(doc))
+        for doc in docs
+        if rubric.evaluate(doc) != _legacy(doc)
+    ]
+    assert not mismatches, f"{len(mismatches)} 条不一致，前 3 条：{mismatches[:3]}"
+
+
+def test_evaluate_laps_each_dimension_in_order(docs):
+    rubric = lexicons.get().rubric
+    laps = []
+    for doc in docs[:20]:
+        laps.clear()
+        rubric.evaluate(doc, laps.append)
+        assert laps == list(DIMENSIONS)
+
+
+def _table(**rule_overrides):
+    with open(DEFAULT_RUBRIC_PATH, encoding="utf-8") as handle:
+        table = json.load(handle)
+    table["rules"][0].update(rule_overrides)
+    return table
+
+
+def test_table_text_is_not_compiled_as_code(docs, tmp_path):
+    marker = tmp_path / "executed"
+    title = f"标题\n    open({str(marker)!r}, 'w').close()\n    # \r "
+    table = _table(title=title)
+    table["rules"][0]["bands"][0]["issue"] = "\n    raise SystemExit\n"
+    rubric = CompiledRubric(table, lexicons.get().matcher)
+    rubric.evaluate(docs[0])
+    assert not marker.exists()
+    assert rubric.rules[0].title == title
+
+
+@pytest.mark.parametrize("overrides", [{"id": "A1\n    x = 1"}, {"id": "A 1"}, {"id": 1}, {"title": ["x"]}])
+def test_rule_id_must_be_identifier(overrides):
+    with pytest.raises(RubricError):
+        CompiledRubric(_table(**overrides), lexicons.get().matcher)
+
+
+def test_segment_name_must_be_identifier():
+    table = _table()
+    table["segments"]["bad\nname"] = {"start": {"chars": 0}, "end": {"chars": 10}}
+    with pytest.raises(RubricError):
+        CompiledRubric(table, lexicons.get().matcher)
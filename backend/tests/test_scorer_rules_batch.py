@@ -0,0 +1,114 @@
+"""批量规则评分（scorer_rules_batch）与 score_by_rules 的差分测试"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+from config import LEXICON_DIR
+from lexicon_registry import build_lexicon, lexicons
+from rubric import DEFAULT_RUBRIC_PATH
+from scorer_rules import analyze_emotion_curve, analyze_retention_triggers, analyze_rhythm, build_document, score_by_rules
+from scorer_rules_batch import (
+    RISK_LEVELS,
+    _outcome,
+    corpus_features,
+    extract_features,
+    score_by_rules_batch,
+    score_texts,
+)
+from synthetic import random_scripts
+
+SEED = 20240602
+COUNT = 1000
+
+
+@pytest.fixture(scope="module")
+def texts():
+    # 末尾的条目覆盖证据提取的边界：首尾带空白的长句、句内的反差句式、平铺直叙、恰好 12 字的短句
+    return random_scripts(COUNT, SEED) + [
+        "", "。", "\n\n", "但是", "如果你知道真相",
+        "   但是他没有回来，大家都很着急   。明明很好却哭了！然后接着走。",
+        "\u3000\u3000\u3000可是她终于明白了\u3000\u3000\u3000\n本来想走结果留下了？然后接着走。",
+        "  真相到底是什么    \n" + "他们一家人坐在桌前吃饭。" * 5 + "可是她哭了！",
+        "他们一家人坐在桌前吃饭但是。" + "我他她你们的了是在有一个这那说看走去" * 20 + "\n以前很穷现在很富。",
+    ]
+
+
+@pytest.fixture(scope="module")
+def expected(texts):
+    results = []
+    for text in texts:
+        try:
+            results.append(score_by_rules(text))
+        except Exception as e:  # noqa: BLE001
+            results.append(e)
+    return results
+
+
+def _comparable(row):
+    """occurrences 特征只以「是否大于 0」参与评分，两条路径的计数方式不同，只比较是否出现"""
+    kinds = [feature.kind for feature in lexicons.get().rubric.features]
+    return [int(value > 0) if kind == "occurrences" else int(value) for kind, value in zip(kinds, row)]
+
+
+def test_corpus_features_match_document_index(texts):
+    lengths, features = corpus_features(texts)
+    assert lengths.tolist() == [len(text) for text in texts]
+    mismatches = [
+        (i, features[i].tolist(), row)
+        for i, row in enumerate(extract_features(build_document(text)) for text in texts)
+        if _comparable(features[i]) != _comparable(row)
+    ]
+    assert not mismatches, f"{len(mismatches)} 条特征不一致，前 3 条：{mismatches[:3]}"
+
+
+def test_batch_responses_match_score_by_rules(texts, expected):
+    actual = score_by_rules_batch(texts, return_exceptions=True)
+    assert len(actual) == len(texts)
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if _outcome(a) != _outcome(b)]
+    assert not mismatches, f"{len(mismatches)} 条不一致，前 5 条下标：{mismatches[:5]}"
+
+
+def test_batch_raises_first_error_without_return_exceptions(texts, expected):
+    errors = [e for e in expected if isinstance(e, Exception)]
+    if not errors:
+        pytest.skip("语料中没有 score_by_rules 抛出异常的条目")
+    with pytest.raises(type(errors[0])):
+        score_by_rules_batch(texts)
+
+
+def test_score_texts_matches_score_by_rules(texts, expected):
+    arrays = score_texts(texts)
+    mismatches = []
+    for i, text in enumerate(texts):
+        doc = build_document(text)
+        dimensions = (analyze_rhythm(doc)[0], analyze_emotion_curve(doc)[0], analyze_retention_triggers(doc)[0])
+        if dimensions != (arrays.rhythm[i], arrays.emotion[i], arrays.retention[i]):
+            mismatches.append(i)
+        elif not isinstance(expected[i], Exception) and (
+            expected[i].score != arrays.total[i] or expected[i].risk_level != RISK_LEVELS[arrays.risk_level[i]]
+        ):
+            mismatches.append(i)
+    assert not mismatches, f"{len(mismatches)} 条不一致，前 5 条下标：{mismatches[:5]}"
+
+
+def test_score_texts_empty_batch():
+    arrays = score_texts([])
+    assert arrays.features.shape[0] == 0
+    assert np.array_equal(arrays.total, np.zeros(0, dtype=np.int64))
+
+
+def test_empty_batch_shape_follows_lexicon():
+    with open(DEFAULT_RUBRIC_PATH, encoding="utf-8") as handle:
+        table = json.load(handle)
+    with open(os.path.join(LEXICON_DIR, "drama_emotion.json"), encoding="utf-8") as handle:
+        data = json.load(handle)
+    table["rules"] = table["rules"][:1]
+    lexicon = build_lexicon("single_rule", data, table, "0" * 8)
+    assert len(lexicon.rubric.features) < len(lexicons.get().rubric.features)
+
+    _, features = corpus_features([], lexicon)
+    assert features.shape == (0, len(lexicon.rubric.feature_names))
+    arrays = score_texts([], lexicon)
+    assert arrays.levels.shape == (0, len(lexicon.rubric.rule_ids))
@@ -0,0 +1,266 @@
+"""
+冷启动：预热、就绪信号和启动耗时报告
+
+说明：
+- 按需启停的托管平台（休眠后被请求唤醒）上，唤醒后的第一个请求要承担解释器启动、导入和各处首次调用的开销；
+  能提前做的都放到 lifespan 中、开始接收请求之前（STARTUP_WARMUP=false 时跳过）：
+  - lexicons：每个模式的词库对样例脚本评分并序列化一次（匹配器和规则表在加载词库时已编译，这里走一遍完整评分路径）
+  - routes：业务路由各发一个进程内请求。FastAPI 在路由第一次被调用时才生成请求体模型的字段信息，
+    这些请求的文本为空，在校验阶段就返回 4xx，不调用引擎、不写缓存和任务队列，也不计入请求指标
+  - rule_pool：创建规则引擎进程池，每个子进程各评分一次（否则第一个批量请求要等待创建子进程）
+  - llm_client：LLM 模式下创建共享的 HTTP 客户端（TLS 上下文）；不向上游发请求
+- 任一步骤失败只记录日志，服务照常就绪；预热结束后 ready 才变为 True，/ready 在此之前返回 503，
+  托管平台的健康检查应指向 /ready（/health 只表示进程存活）
+- 启动报告：进程启动时间取自 /proc（取不到时用本模块导入的时间），记录到 lifespan 开始、就绪、
+  第一个成功的业务响应（/api/ 下的 2xx）的耗时，同时输出到日志和 startup_seconds 指标
+- 命令行（python warmup.py）启动一个 uvicorn 子进程，测量从启动到 /ready 和到第一个成功的 /api/analyze 的耗时
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic_core import to_json
+
+from config import DEFAULT_ENGINE, DEFAULT_MODE, RULE_WORKERS, STARTUP_WARMUP
+from lexicon_registry import Lexicon, lexicons
+from metrics import STARTUP_SECONDS
+from rule_pool import get_rule_pool, score_by_rules_pooled
+from scorer_rules import score_by_rules
+
+logger = logging.getLogger(__name__)
+
+# 预热请求：(方法, 路径, 请求体)；文本为空，在校验阶段返回 4xx
+WARMUP_REQUESTS: Tuple[Tuple[str, str, Dict[str, Any]], ...] = (
+    ("POST", "/api/analyze", {"text": "", "mode": DEFAULT_MODE}),
+    ("POST", "/api/analyze/stream", {"text": "", "mode": DEFAULT_MODE}),
+    ("POST", "/api/analyze/batch", {"items": []}),
+    ("POST", "/api/jobs", {"kind": "analyze", "payload": {"text": ""}}),
+)
+
+
+def _process_age() -> Optional[float]:
+    """进程已运行的秒数（/proc/self/stat 的 starttime）；非 Linux 返回 None"""
+    try:
+        with open("/proc/self/stat") as handle:
+            stat = handle.read()
+        with open("/proc/uptime") as handle:
+            uptime = float(handle.read().split()[0])
+        # 进程名可能含空格，从最后一个 ")" 之后数：starttime 是第 22 个字段
+        start_ticks = int(stat.rsplit(")", 1)[1].split()[19])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupReport:
+    """进程启动到各阶段完成的耗时（秒）、预热各步骤的耗时和错误"""
+
+    def __init__(self):
+        age = _process_age()
+        self.clock = "proc" if age is not None else "import"
+        self.process_started = time.monotonic() - (age or 0.0)
+        self.ready = False
+        self.milestones: Dict[str, float] = {}
+        self.steps: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.first_response: Optional[Dict[str, Any]] = None
+
+    def mark(self, milestone: str) -> float:
+        """记录到达某个阶段的时间（相对进程启动）"""
+        elapsed = time.monotonic() - self.process_started
+        self.milestones[milestone] = round(elapsed, 4)
+        STARTUP_SECONDS.labels(milestone).set(elapsed)
+        return elapsed
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        """预热步骤：记录耗时，失败只记录错误"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:  # noqa: BLE001
+            logger.warning("预热步骤 %s 失败：%s", name, e)
+            self.errors[name] = f"{type(e).__name__}: {e}"
+        self.steps[name] = round(time.perf_counter() - started, 4)
+
+    def set_ready(self) -> None:
+        elapsed = self.mark("ready")
+        self.ready = True
+        logger.info("启动完成，进程启动后 %.3f 秒就绪（预热步骤：%s）", elapsed, self.steps)
+
+    def observe_response(self, route: str, status_code: int, seconds: float) -> None:
+        """MetricsMiddleware 的回调：记录就绪后第一个成功的业务响应"""
+        if self.first_response is not None or not self.ready:
+            return
+        if not route.startswith("/api/") or not 200 <= status_code < 300:
+            return
+        self.first_response = {"route": route, "latency_ms": round(seconds * 1000, 3)}
+        elapsed = self.mark("first_response")
+        logger.info("进程启动后 %.3f 秒返回第一个成功响应：%s（请求耗时 %.1f 毫秒）", elapsed, route, seconds * 1000)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "clock": self.clock,
+            "seconds_since_start": dict(self.milestones),
+            "warmup_steps": dict(self.steps),
+            "warmup_errors": dict(self.errors),
+            "first_response": self.first_response,
+        }
+
+
+# 进程内共享的启动报告（导入时开始计时）
+startup_report = StartupReport()
+
+
+def sample_script(lexicon: Lexicon) -> str:
+    """平铺直叙的样例脚本（flat_narration 类别的词各起一句）：各条规则都会扣分，走完整的问题和建议生成路径"""
+    return "".join(f"{word}他回到家里坐下来。" for word in lexicon.categories["flat_narration"])
+
+
+async def _asgi_request(app, method: str, path: str, body: bytes) -> int:
+    """不经过网络直接调用 ASGI 应用，返回状态码"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("warmup", 0),
+        "server": ("warmup", 80),
+        # MetricsMiddleware 据此不记录预热请求
+        "extensions": {"warmup": {}},
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status_code = 0
+
+    async def receive() -> Dict[str, Any]:
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(scope, receive, send)
+    return status_code
+
+
+async def warm_up(app) -> None:
+    """开始接收请求前的预热（lifespan 中调用），结束后标记就绪"""
+    report = startup_report
+    report.mark("lifespan")
+    if STARTUP_WARMUP:
+        with report.step("lexicons"):
+            for mode in sorted(lexicons.versions()):
+                lexicon = lexicons.get(mode)
+                to_json(score_by_rules(sample_script(lexicon), lexicon))
+
+        with report.step("routes"):
+            for method, path, payload in WARMUP_REQUESTS:
+                await _asgi_request(app, method, path, json.dumps(payload).encode())
+
+        if get_rule_pool() is not None:
+            with report.step("rule_pool"):
+                lexicon = lexicons.get()
+                text = sample_script(lexicon)
+                await asyncio.gather(*(score_by_rules_pooled(text, lexicon) for _ in range(RULE_WORKERS)))
+
+        if DEFAULT_ENGINE == "llm":
+            with report.step("llm_client"):
+                from llm_scorer import get_async_client
+
+                get_async_client()
+    report.set_ready()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(url: str, payload: Optional[Dict[str, Any]] = None) -> Tuple[int, Any]:
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def measure_cold_start(timeout: float) -> Dict[str, Any]:
+    """启动 uvicorn 子进程，测量到 /ready 和到第一个成功的 /api/analyze 的耗时（毫秒）"""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    try:
+        ready_ms = None
+        while ready_ms is None:
+            if time.perf_counter() - started > timeout or server.poll() is not None:
+                raise RuntimeError("服务未能在超时前就绪")
+            try:
+                if _request(base + "/ready")[0] == 200:
+                    ready_ms = (time.perf_counter() - started) * 1000
+            except OSError:
+                pass
+            if ready_ms is None:
+                time.sleep(0.01)
+
+        payload = {"text": sample_script(lexicons.get()), "use_cache": False}
+        latencies: List[float] = []
+        for _ in range(2):
+            sent = time.perf_counter()
+            code, _ = _request(base + "/api/analyze", payload)
+            if code != 200:
+                raise RuntimeError(f"/api/analyze 返回 {code}")
+            latencies.append((time.perf_counter() - sent) * 1000)
+            if len(latencies) == 1:
+                first_ms = (time.perf_counter() - started) * 1000
+        report = _request(base + "/ready")[1]
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    return {
+        "ready_ms": round(ready_ms, 1),
+        "first_response_ms": round(first_ms, 1),
+        "first_request_ms": round(latencies[0], 3),
+        "second_request_ms": round(latencies[1], 3),
+        "server": report,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="测量服务冷启动：启动到 /ready、到第一个成功响应的耗时")
+    parser.add_argument("--runs", type=int, default=3, help="启动次数")
+    parser.add_argument("--timeout", type=float, default=60, help="每次等待就绪的最长秒数")
+    args = parser.parse_args(argv)
+
+    runs = [measure_cold_start(args.timeout) for _ in range(args.runs)]
+    print(json.dumps(runs, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())